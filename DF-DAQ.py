@@ -23,6 +23,9 @@ from PyQt5.QtWidgets import QFrame, QTabWidget, QMessageBox
 from functools import partial
 import pyqtgraph as pg
 
+PLOT_FPS = 25       #Live plot redraws per second, whatever the sample rate
+STATS_WINDOW = 10   #Seconds in the rolling window of the live statistics
+
 #==============================================================================
 # Input Parameters: none
 # Output Returns: none
@@ -54,7 +57,7 @@ class QVLine(QFrame):
 # Description: This is the main function for the PyQt application
 #==============================================================================
 class tabdemo(QTabWidget):
-    def __init__(self, parent = None):
+    def __init__(self, parent = None, Replay = None, Speed = 1.0):
         super(tabdemo, self).__init__(parent)
 
         CurrentSoftwareVersion = '1.0.0'                        #Update as needed. Don't forget to update the Revision History as well
@@ -63,10 +66,12 @@ class tabdemo(QTabWidget):
 
         self.setWindowIcon(QIcon('DFIcon-01.ico'))   #Sets the GUI Icon
 
-        self.pressureOptions = ['PSI','HPA','KPA','MBAR','BAR','CMH2O','INH2O','MMHG']
+        self.pressureOptions = list(UNIT_SCALE.keys())
         self.oldRate = 0
         self.dataOutputMultiplier = 1
         self.outputType = ''
+        self.SetupString = 'NA'
+        self.BinaryStream = False          #True once every selected board has binary stream firmware
 
         self.tab1 = QWidget()                       #Define Tab1
         self.tab2 = QWidget()                       #Define Tab2
@@ -83,12 +88,17 @@ class tabdemo(QTabWidget):
         self.tab3UI()
         self.tab4UI()
 
-        self.DAQ = DF_DAQ()                      #Create a DF_DAQ object
+        if(Replay != None):
+            self.DAQ = DF_DAQ_Replay(Replay, Speed)     #Boards of a capture file instead of the attached ones
+        else:
+            self.DAQ = DF_DAQ()                      #Create a DF_DAQ object
  
         self.logMsg('Date: ' + datetime.datetime.now().strftime('%m-%d-%y'), False, 'black')    #Write the Start Date to the Log
         self.logMsg('Software: ' + self.AppName, False, 'black')                                #Write the Software Version to the Log
+        if(Replay != None):
+            self.logMsg('Replay: ' + Replay + (' at ' + str(Speed) + 'x' if (Speed > 0) else ' as fast as possible'), True, 'blue')
  
-        self.SearchCOMs()                       #Search the COM Ports for a Teensy
+        QtCore.QTimer.singleShot(0, self.SearchCOMs)   #Search the COM Ports for a Teensy once the window is up
       
         self.setWindowTitle(self.AppName)
         self.setGeometry(650, 400, 610, 300)    #Sets the X and Y location to start up in and the Width and Height of the GUI (px)
@@ -96,14 +106,18 @@ class tabdemo(QTabWidget):
         self.setMinimumWidth(610)               #Locks the minimum width to 600 (px)
         
 #==============================================================================
-# Input Parameters: none
+# Input Parameters: Refresh (Bool)
 # Output Returns: none 
 #
 # Description: This function searches the COM Ports and populates the COM Port
-# ComboBox with all avaliable Teensy Ports. 
+# ComboBox with all avaliable Teensy Ports. At startup known boards come from
+# the identity table, with Refresh every board is asked again (a board 
+# reflashed on the same port keeps its serial number). The identities are kept
+# in self.Boards, selecting a port does not ask the boards again.
 #==============================================================================
-    def SearchCOMs(self):
+    def SearchCOMs(self, Refresh = False):
         COM = self.DAQ.findPort()   #Use the DF_DAQ 'findPort' method to autodetect the Teensy
+        self.Boards = self.DAQ.Probe(COM, Refresh = Refresh)      #Identify the boards all at once, kept for updateHardware
         self.COMDis.clear()     #Reset the COM Port ComboBox
 
         if(len(COM) < 1):           #Teensy not found, list of COM Ports returned
@@ -128,6 +142,7 @@ class tabdemo(QTabWidget):
             else:                   #Multiple DF Hardware Connected
                 for i in range (0, len(COM)):                           #Loop Through all found COM Ports
                     self.COMDis.addItem(str(COM[i]))                    #Add all items to the COM Port ComboBox
+                self.COMDis.addItem('All Devices')                      #Log every board in one session
                 self.COMDis.setDisabled(False)                          #Enable the COM Port ComboBox
 
             if (self.FirmDis.text() == 'NA'):
@@ -160,15 +175,33 @@ class tabdemo(QTabWidget):
         self.ButtonStart.setDisabled(disabled)
         self.plotWidth.setDisabled(disabled)
     
+#==============================================================================
+# Input Parameters: none
+# Output Returns: Ports (List of Str)
+#
+# Description: Returns the COM Ports to acquire from, every DF Board when 'All
+# Devices' is selected.
+#==============================================================================
+    def SelectedPorts(self):
+        if(self.COMDis.currentText() == 'All Devices'):
+            return [self.COMDis.itemText(i) for i in range(0, self.COMDis.count()) if self.COMDis.itemText(i) != 'All Devices']
+        return [str(self.COMDis.currentText())]
+    
     def updateHardware(self):
         print('Updating Hardware')
-        if(self.COMDis.currentText() != 'NA'): #Do nothing if there is no DF Hardware Detected
+        if(self.COMDis.currentText() != 'NA' and self.COMDis.currentText() != ''): #Do nothing if there is no DF Hardware Detected
             self.logMsg('Searching for Attached Hardware...<br>', False, 'black')
-            self.FirmDis.setText(self.DAQ.getFirmVer(str(self.COMDis.currentText())))      #Use the DF_DAQ 'getFirmVer' method to get the current firmware form the selected Teensy
-            FirmStartup = self.DAQ.getSetup(str(self.COMDis.currentText())).split('-')
+            self.BinaryStream = True
+            Boards = self.Boards        #Firmware, setup, type and info of every board SearchCOMs found
+            for Port in self.SelectedPorts():
+                self.FirmDis.setText(Boards[Port]['Firmware'])      #Firmware of the selected Teensy
+                self.logMsg('DF Board: ' + Port, False, 'black')   #Write the Teensy COM Port to the Log
+                self.logMsg('Firmware: ' + self.FirmDis.text(), False, 'black') #Write the Firmware Version to the Log
+                self.logMsg('Device: ' + Boards[Port]['Type'], False, 'black')
+                self.BinaryStream = self.BinaryStream and SupportsBinary(self.FirmDis.text())  #Binary stream only if every board has it
             
-            self.logMsg('DF Board: ' + str(self.COMDis.currentText()), False, 'black')   #Write the Teensy COM Port to the Log
-            self.logMsg('Firmware: ' + self.FirmDis.text(), False, 'black') #Write the Firmware Version to the Log
+            self.SetupString = Boards[self.SelectedPorts()[0]]['Setup']  #Boards logged together are expected to share a setup
+            FirmStartup = self.SetupString.split('-')
             
             if(FirmStartup[0] == 'P'):
                 self.DataOutput.clear()
@@ -334,6 +367,18 @@ class tabdemo(QTabWidget):
         self.DataRate.setText('10')
         self.DataRate.textChanged.connect(self.SetRate)
         
+        #Filters
+        self.DataFilter = QLineEdit()
+        self.DataFilter.setMaximumWidth(160)
+        self.DataFilter.setPlaceholderText('none')
+        self.DataFilter.setToolTip('Filters for the live plot, Ex: avg 8, lowpass 2, decimate 4\nThe raw samples are always saved')
+        
+        #Trigger
+        self.DataTrigger = QLineEdit()
+        self.DataTrigger.setMaximumWidth(160)
+        self.DataTrigger.setPlaceholderText('none')
+        self.DataTrigger.setToolTip('Only save the samples around events, Ex: rising 0.8 pre 2 post 5\n[level|rising|falling|rate] threshold (Output units, per second for rate), pre and post in seconds')
+        
         #Add a label to the Test Time Grid Point
         h7layout.addWidget(self.DataTime)
         h7layout.addWidget(QLabel('Sec'))    
@@ -356,7 +401,11 @@ class tabdemo(QTabWidget):
         glayout2.addLayout(h7layout, 7, 5)
         glayout2.addWidget(QLabel('Rate'), 9, 3)
         glayout2.addLayout(h8layout, 9, 5)
-        glayout2.addLayout(h10layout, 11, 3, 1, 3)        
+        glayout2.addWidget(QLabel('Filter'), 11, 3)
+        glayout2.addWidget(self.DataFilter, 11, 5)
+        glayout2.addWidget(QLabel('Trigger'), 13, 3)
+        glayout2.addWidget(self.DataTrigger, 13, 5)
+        glayout2.addLayout(h10layout, 15, 3, 1, 3)        
         
         CustomizeDataFrame = QGroupBox()
         CustomizeDataFrame.setTitle('Customize Data')
@@ -419,31 +468,91 @@ class tabdemo(QTabWidget):
         #Set the Tab Layout
         self.tab1.setLayout(hlayout)
 
+#==============================================================================
+# Input Parameters: none
+# Output Returns: none
+#
+# Description: Drains the batch of samples the reader thread collected since the
+# last timer tick and adds them to the plot data. The plot is only updated once
+# per batch. Overruns reported by the reader and the result of a zero
+# (zeroSensor) are written to the Log. Every step
+# is timed in METRICS, the status line under the plot shows them once a second.
+#==============================================================================
     def update_plot_data(self):
-        if(len(self.x) == 0):
-            self.x = [0]
-            self.xAll = []
-            self.y = []
-            self.yAll = []
-        elif(len(self.x) < self.plotFixedWidth.value()):
-            self.x.append(self.x[-1] + 1)
+        tick = time.perf_counter_ns()
+        Times, Samples, Millis = self.Reader.Drain()    #All samples streamed since the last update (one column per board and channel)
+        start = time.perf_counter_ns()
+        METRICS.Add('Drain', start - tick)
+        if(start - self.lastStatus >= 1000000000):
+            self.lastStatus = start
+            self.plotStatus.setText(METRICS.Status())
+            self.updateStats()
+        
+        if(self.zeroing):
+            self.zeroCheck()
+        
+        if(self.Reader.Overruns != self.lastOverruns):
+            self.logMsg('Warning! - ' + str(self.Reader.Overruns - self.lastOverruns) + ' samples dropped (GUI too slow)', True, 'orange')
+            self.lastOverruns = self.Reader.Overruns
+        
+        if(len(Samples) == 0):
+            if(self.Start and self.Reader.Done):     #Every board stopped, or the replay reached the end
+                self.ToggleStartStop()
+            return
+        
+        METRICS.Count('Samples', len(Samples))
+        Received = self.Reader.ReceivedNs(Times)       #A replay releases the recorded times at its own speed
+        if(Received is not None):
+            METRICS.Count('Late', np.count_nonzero(Received < start - LATE_MS * 1000000))
+        y = self.Reader.ToPSI(Samples)      #Raw counts from the binary stream are converted in one step
+        x = np.arange(self.nSamples, self.nSamples + len(y))
+        self.nSamples += len(y)
+        METRICS.Add('Convert', time.perf_counter_ns() - start)
+        start = time.perf_counter_ns()
+        self.Stats.Extend(Times, y, Millis)     #Running totals, the samples are never gone over again (a repeated device time is not a new sample)
+        METRICS.Add('Stats', time.perf_counter_ns() - start)
+        
+        if(y.shape[1] == 1):
+            Millis = Millis[:, 0]
+            Values = Samples[:, 0]
         else:
-            self.x = self.x[1:]
-            self.x.append(self.x[-1] + 1)
-            self.y = self.y[1:]
-        
-        self.xAll.append(self.x[-1])
-        
-        self.y.append(self.DAQ.Read(str(self.COMDis.currentText())) * self.dataOutputMultiplier)
-        self.yAll.append(self.y[-1])
+            Values = Samples
+        if(self.Trigger == None):
+            self.Writer.Write(Sample = x, Time = Times - self.Reader.StartNs, DeviceTime = Millis, Value = Values)    #Full, unconverted history goes straight to the capture file
+        else:
+            start = time.perf_counter_ns()
+            Kept = self.Trigger.Process(y, x, Times, Millis, Values)     #Only the windows around events
+            METRICS.Add('Trigger', time.perf_counter_ns() - start)
+            if(len(Kept[0]) > 0):
+                self.Writer.Write(Sample = Kept[0], Time = Kept[1] - self.Reader.StartNs, DeviceTime = Kept[2], Value = Kept[3])
+            if(self.Trigger.Events != self.lastEvents):
+                self.logMsg('Trigger - event ' + str(self.Trigger.Events) + ' at ' + '{:.2f}'.format((Times[-1] - self.Reader.StartNs) / 1e9) + ' sec', True, '#900090')
+                self.lastEvents = self.Trigger.Events
+        start = time.perf_counter_ns()
+        x, y = self.Filters.Process(x, y)     #Only the plot is filtered
+        METRICS.Add('Filter', time.perf_counter_ns() - start)
+        if(len(y) == 0):
+            return      #Decimating, not a whole block yet
+        start = time.perf_counter_ns()
+        self.xRing.Extend(x)            #Newest samples for the Fixed Width view
+        self.yRing.Extend(y)
+        if(self.Trigger == None):
+            self.yPyramid.Extend(x, y)  #Min/Max summary for the All view, with a trigger it shows the newest samples so memory stays bounded
+        METRICS.Add('Plot Append', time.perf_counter_ns() - start)
     
+        start = time.perf_counter_ns()
         if(self.plotWidth.currentIndex() != 0):
-            self.xLive = self.xAll[-(self.plotFixedWidth.value()):]
-            self.yLive = self.yAll[-(self.plotFixedWidth.value()):]
+            self.xLive = self.xRing.View(self.plotFixedWidth.value())
+            self.yLive = self.yRing.View(self.plotFixedWidth.value())
         else:
-            self.xLive, self.yLive = self.downsample(0, len(self.xAll))
+            self.xLive, self.yLive = self.downsample()
+        METRICS.Add('Downsample', time.perf_counter_ns() - start)
     
-        self.data_line.setData(self.xLive, self.yLive)
+        start = time.perf_counter_ns()
+        for i in range(0, len(self.data_lines)):
+            self.data_lines[i].setData(self.xLive, self.yLive[:, i] * self.dataOutputMultiplier)
+        METRICS.Add('setData', time.perf_counter_ns() - start)
+        METRICS.Add('Tick', time.perf_counter_ns() - tick)
 
     def tab3UI(self): #Live Data Plot
         vlayout = QVBoxLayout()
@@ -456,19 +565,24 @@ class tabdemo(QTabWidget):
         self.plot.showGrid(x=True, y=True)
         self.plot.setLabel('bottom', 'Sample (N)', color = 'gray', size = 40)
         
-        self.pen = pg.mkPen(color=(59,187,228), width=2)
+        self.pens = [pg.mkPen(color=color, width=2) for color in ['#3BBBE4', '#00aa00', '#924900', '#0000ff', '#900090', '#800000']]
         self.penGray = pg.mkPen(color=(180,180,180), width=2)
         
-        self.x = []#list(range(100))
-        self.y = []#[randint(0,100) for _ in range(100)]
-        self.xAll = self.x
-        self.yAll = self.y
+        self.xRing = RingBuffer(100000, np.int64) #Newest samples, sized for the largest Fixed Width
+        self.yRing = RingBuffer(100000, np.float64, 1)
+        self.yPyramid = MinMaxPyramid(Width = 1)
+        self.data_lines = []
+        self.Filters = DF_DAQ_FilterChain()
+        self.Trigger = None
+        self.nSamples = 0
+        self.Stats = DF_DAQ_Stats()
+        self.statsColumns = []
         
         self.testTimer = QtCore.QTimer()
         self.testTimer.timeout.connect(self.ToggleStartStop)
         
         self.timer = QtCore.QTimer()
-        self.timer.setInterval(50)
+        self.timer.setInterval(int(1000 / PLOT_FPS))      #Every tick plots the whole batch streamed since the last one
         self.timer.timeout.connect(self.update_plot_data)
         #self.timer.start()
         
@@ -483,7 +597,7 @@ class tabdemo(QTabWidget):
         self.plotFixedWidth = QSpinBox()
         self.plotFixedWidth.hide()
         self.plotFixedWidth.setMinimum(10)
-        self.plotFixedWidth.setMaximum(100000)
+        self.plotFixedWidth.setMaximum(self.xRing.Size)
         self.plotFixedWidth.setValue(100)
         self.plotFixedWidth.valueChanged.connect(self.plotUpdateData)
         self.plotFixedWidth.setDisabled(True)
@@ -506,8 +620,21 @@ class tabdemo(QTabWidget):
         vlayout.addStretch(1)
         vlayout.addWidget(self.plotStop)
         
+        self.plotStatus = QLabel('')        #Pipeline metrics of the running test
+        self.plotStatus.setToolTip('Slowest 1% of the plot updates, and the samples received, dropped and late. Every stage is saved with the capture file.')
+        self.lastStatus = 0
+        plotlayout = QVBoxLayout()
+        plotlayout.addWidget(self.plot)
+        plotlayout.addWidget(self.plotStatus)
+        
+        self.plotStats = QLabel('')         #Live statistics of the running test
+        self.plotStats.setToolTip('Mean, standard deviation, min and max of every column for the whole test and the last ' + str(STATS_WINDOW) + ' seconds, and the samples per second its board really sent')
+        self.plotStats.setAlignment(QtCore.Qt.AlignTop)
+        self.plotStats.setMinimumWidth(260)
+        
         hlayout.addLayout(vlayout)
-        hlayout.addWidget(self.plot)
+        hlayout.addLayout(plotlayout)
+        hlayout.addWidget(self.plotStats)
         
         self.tab3.setLayout(hlayout)
 
@@ -577,8 +704,37 @@ class tabdemo(QTabWidget):
         HighlightingFrame.setTitle('Highlighting')
         HighlightingFrame.setLayout(glayout)        
         
+        #Columns to plot
+        self.pSelect = QLineEdit('All')
+        self.pSelect.setMaximumWidth(120)
+        self.pSelect.setToolTip('Columns to plot, Ex: 1-16, 33 (All for every column)')
+        
+        #Range to plot, in the x units of the file (row or time)
+        self.pFrom = QLineEdit()
+        self.pFrom.setMaximumWidth(80)
+        self.pFrom.setToolTip('Plot from this x (row or sec), empty for the start of the file')
+        self.pTo = QLineEdit()
+        self.pTo.setMaximumWidth(80)
+        self.pTo.setToolTip('Plot up to this x (row or sec), empty for the end of the file')
+        self.pXName = QLabel('')
+        
+        #Data Selection
+        g2layout = QGridLayout()
+        g2layout.addWidget(QLabel('Columns:'), 1, 1)
+        g2layout.addWidget(self.pSelect, 1, 2, 1, 3)
+        g2layout.addWidget(QLabel('From:'), 2, 1)
+        g2layout.addWidget(self.pFrom, 2, 2)
+        g2layout.addWidget(QLabel('To:'), 2, 3)
+        g2layout.addWidget(self.pTo, 2, 4)
+        g2layout.addWidget(self.pXName, 2, 5)
+        
+        DataFrame = QGroupBox()
+        DataFrame.setTitle('Data')
+        DataFrame.setLayout(g2layout)
+        
         #Left Column
         v2layout.addWidget(HighlightingFrame)
+        v2layout.addWidget(DataFrame)
         v2layout.addStretch(1)        
         
         #Main Horizontal Layout for Columns
@@ -630,41 +786,65 @@ class tabdemo(QTabWidget):
 # Output Returns: none (HTML Plot of Selected Data)
 #
 # Description: This function imports XLSX information, takes a couple user inputs
-# and then plots the file to an HTML file using Bokeh.
+# and then plots the file to an HTML file using Bokeh. Only the selected columns
+# and range are read from the file, each column is drawn as its min/max 
+# envelope at the figure's width (see ColumnEnvelope), so the page stays small
+# however long the capture is, and the lines sharing a legend entry are one 
+# multi_line glyph.
 #==============================================================================
     def PlotData(self):
+        from bokeh.plotting import figure, show     #Only needed here, loaded on first use
+        from bokeh.models import ColumnDataSource
         print ('Plotting Data')
         
-        numlines = len(self.dfData.columns) #Number of Columns
+        Source = self.pSource
+        numlines = len(Source.Names) #Number of Columns
+        try:
+            Columns = ParseColumns(self.pSelect.text(), numlines)
+            Start = Source.IndexAt(float(self.pFrom.text())) if (self.pFrom.text().strip() != '') else 0
+            Stop = Source.IndexAt(float(self.pTo.text())) if (self.pTo.text().strip() != '') else len(Source)
+        except ValueError as e:
+            print ('ERROR - Nothing to plot: ' + str(e))
+            return
+        if(Stop <= Start):
+            print ('ERROR - Nothing to plot between ' + self.pFrom.text() + ' and ' + self.pTo.text())
+            return
             
         if(self.pAllLines.isChecked()):     #Individual Radio Button Selected
             #Palet containing 64 unique colors
             mypalette = ['black','dimgray','lightgrey','rosybrown','brown','maroon','red','salmon','sienna','chocolate','saddlebrown','sandybrown','orange','darkgoldenrod','gold','olivedrab','yellowgreen','darkolivegreen','chartreuse','darkseagreen','limegreen','darkgreen','green','lime','springgreen','mediumspringgreen','mediumaquamarine','aquamarine','turquoise','mediumturquoise','lightseagreen','darkcyan','aqua','cadetblue','deepskyblue','skyblue','lightskyblue','steelblue','royalblue','midnightblue','blue','navy','slateblue','mediumslateblue','darkorchid','mediumpurple','darkviolet','indigo','darkviolet','darkorchid','purple','darkmagenta','orchid','magenta','deeppink','crimson','pink','mediumvioletred','palevioletred','darkorange','peru','tan','coral','dodgerblue']        
             
-            #Legend separating the data by the 'Line' on the MUX
-            #Note: Using a unique legend for each column makes the legend too big 
-            legends = ['Line 1','Line 2','Line 3','Line 4','Line 5','Line 6','Line 7','Line 8'] * 8
+            mypalette = [mypalette[i % len(mypalette)] for i in range(0, numlines)]
+            
+            if(numlines <= 16):     #Few enough columns to name each one
+                legends = list(Source.Names)
+            else:
+                #Legend separating the data by the 'Line' on the MUX
+                #Note: Using a unique legend for each column makes the legend too big 
+                legends = ['Line ' + str(i % 8 + 1) for i in range(0, numlines)]
             
         elif(self.pCupLines.isChecked()):   #By Cup Radio Button Selected
-            Palette1 = ['firebrick'] * 16   #Set Cup 1 to a single color
-            Palette2 = ['seagreen'] * 16    #Set Cup 2 to a single color
-            Palette3 = ['navy'] * 16        #Set Cup 3 to a single color
-            Palette4 = ['darkmagenta'] * 16 #Set Cup 4 to a single color
+            cupColors = ['firebrick', 'seagreen', 'navy', 'darkmagenta']    #One color per cup of 16 lines
             
-            mypalette = Palette1 + Palette2 + Palette3 + Palette4 #Creat a Master List of Colors 
+            mypalette = [cupColors[(i // 16) % len(cupColors)] for i in range(0, numlines)] #Creat a Master List of Colors 
             
             #Give each Cup a legend
-            legends = ['Cup1'] * 16 + ['Cup2'] * 16 + ['Cup3'] * 16 + ['Cup4'] * 16
+            legends = ['Cup' + str(i // 16 + 1) for i in range(0, numlines)]
             
         #Bokeh Plot Object
-        p = figure(toolbar_location = 'above', plot_width = 1650, plot_height = 800, tools = ['box_zoom', 'pan', 'wheel_zoom', 'reset', 'save'])
+        plotWidth = 1650
+        p = figure(toolbar_location = 'above', plot_width = plotWidth, plot_height = 800, tools = ['box_zoom', 'pan', 'wheel_zoom', 'reset', 'save'],
+                   x_axis_label = Source.XName)
         
-        xs=[self.dfData.index.values]*numlines                  #List of a List of X Index values
-        ys = [self.dfData[name].values for name in self.dfData] #List of a List of Y Values
+        x, ys = ColumnEnvelope(Source, Columns, 2 * plotWidth, Start, Stop)     #Min and max for every pixel column
         
-        #Loop through all the data and add a line plot for each Channel
-        for (colr, leg, x, y) in zip(mypalette, legends, xs, ys):
-            p.line(x, y, color = colr, legend = leg)    #Bokeh Line with given color and legend
+        #One multi line per legend entry, in the order the legend entries first appear
+        for leg in sorted(set([legends[i] for i in Columns]), key = legends.index):
+            lines = [k for k in range(0, len(Columns)) if legends[Columns[k]] == leg]
+            source = ColumnDataSource(data = {'xs'    : [x] * len(lines),
+                                              'ys'    : [ys[k] for k in lines],
+                                              'color' : [mypalette[Columns[k]] for k in lines]})
+            p.multi_line('xs', 'ys', line_color = 'color', legend_label = leg, source = source)
         
         p.legend.click_policy = 'hide'  #Allows the legend to be clicked to hide/show data
         
@@ -677,7 +857,8 @@ class tabdemo(QTabWidget):
 # Output Returns: none
 #
 # Description: This function is connected to a 'textChanged' event from the rate
-# and will auto update the firmware rate
+# and will auto update the firmware rate. The plot is redrawn at PLOT_FPS no
+# matter the rate, the firmware paces the samples.
 #==============================================================================
     def SetRate(self):
         rate = self.DataRate.text()        
@@ -690,7 +871,6 @@ class tabdemo(QTabWidget):
         newRate = int(1000 / float(self.DataRate.text()))
 
         if(newRate != self.oldRate):
-            self.timer.setInterval(newRate)
             self.logMsg('<b>Sample Time: ' + str(newRate) + 'ms</b>', False, 'blue')
             self.oldRate = newRate
 
@@ -786,27 +966,26 @@ class tabdemo(QTabWidget):
 # Input Parameters: none
 # Output Returns: none
 #
-# Description: This function opens the window file dialog to open a file and then
-# Reads the Sheet1 of the file into a pandas Data Frame
+# Description: This function opens the window file dialog to open a file (a 
+# workbook with the data on Sheet1, or a capture file) for plotting. Only the
+# first open of a workbook reads it (see OpenColumns), the data itself is only
+# read when it is plotted.
 #==============================================================================
     def OpenExcel(self):
-        fname = QFileDialog.getOpenFileName(self, 'Save file', 'c:\\',"Excel files (*.xlsx)")
+        fname = QFileDialog.getOpenFileName(self, 'Open file', 'c:\\',"Data files (*.xlsx *.dfc)")[0]
         if fname != '':
             self.pFileName.setText(fname)  
         print ('Opening File')
         try:
-            self.dfData = pd.read_excel(open(fname, 'rb'), sheet_name = 'Sheet1')
-            print ('Data Extracted from File!')
-            numlines = len(self.dfData.columns) #Number of Columns
-            if(numlines != 64):
-                self.pPlot.setDisabled(True)
-                print (')ERROR - Plotter can only plot data with 64 Columns!')
-            else:
-                self.pPlot.setDisabled(False)
+            self.pSource = OpenColumns(fname, Units = self.DataOutput.currentText())
+            numlines = len(self.pSource.Names) #Number of Columns
+            print ('Data Extracted from File! ' + str(numlines) + ' Columns, ' + str(len(self.pSource)) + ' Rows')
+            self.pXName.setText(self.pSource.XName)
+            self.pPlot.setDisabled(numlines == 0 or len(self.pSource) == 0)
         except:
             print ('ERROR - Could not Extract data from file!')
             print ('Ensure desired data is on sheet 1 of the file')
-            self.dfData = None 
+            self.pSource = None 
             self.pPlot.setDisabled(True)
 
 #==============================================================================
@@ -817,7 +996,28 @@ class tabdemo(QTabWidget):
 #==============================================================================
     def RefreshCOMs(self):
         self.logMsg('Refresh COM Ports<br>', False, 'black')
-        self.SearchCOMs()
+        self.SearchCOMs(Refresh = True)     #Boards may have been reflashed since they were cached
+
+#==============================================================================
+# Input Parameters: none
+# Output Returns: none
+#
+# Description: Shows the statistics of the running test next to the plot, in
+# the Output units. The statistics themselves are kept up to date by 
+# update_plot_data, this only formats them.
+#==============================================================================
+    def updateStats(self):
+        Run = self.Stats.Run()
+        Window = self.Stats.Windowed()
+        m = self.dataOutputMultiplier
+        Rate = lambda r: ('%.2f' % r) if (np.isfinite(r)) else '-'
+        Value = lambda v: ('%.4f' % (v * m)) if (np.isfinite(v)) else '-'
+        Text = '<table cellspacing="4"><tr><th></th><th>Mean</th><th>Std</th><th>Min</th><th>Max</th></tr>'
+        for i in range(0, len(self.statsColumns)):
+            Text += '<tr><td colspan="5"><b>' + self.statsColumns[i] + '</b> ' + Rate(Run['Rate'][i]) + ' Hz, last ' + str(STATS_WINDOW) + ' s ' + Rate(Window['Rate'][i]) + ' Hz</td></tr>'
+            for Label, Stats in [('Run', Run), (str(STATS_WINDOW) + ' s', Window)]:
+                Text += '<tr><td>' + Label + '</td>' + ''.join(['<td>' + Value(Stats[Key][i]) + '</td>' for Key in ['Mean', 'Std', 'Min', 'Max']]) + '</tr>'
+        self.plotStats.setText(Text + '</table>')
 
 #==============================================================================
 # Input Parameters: none
@@ -828,8 +1028,6 @@ class tabdemo(QTabWidget):
     def plotUpdateData(self):
         if(self.plotWidth.currentIndex() != 0):
             self.plotFixedWidth.show()
-            self.x = self.xAll[(len(self.xAll) - self.plotFixedWidth.value()):]
-            self.y = self.yAll[(len(self.yAll) - self.plotFixedWidth.value()):]
         else:
             self.plotFixedWidth.hide()
 
@@ -837,48 +1035,24 @@ class tabdemo(QTabWidget):
 # Input Parameters: none
 # Output Returns: none
 #
-# Description: downsamples the data for the plot
+# Description: downsamples the data for the plot. Short captures are drawn from 
+# the ring buffer as is, longer ones from the min/max pyramid at about two
+# points per pixel of plot width so spikes are never skipped.
 #==============================================================================
-    def downsample(self, xstart, xend):
-        max_points = self.plotFixedWidth.value()
-        
-        if(len(self.xAll) > max_points):
-            origXData = np.asarray(self.xAll)
-            origYData = np.asarray(self.yAll)
-            mask = (origXData > xstart) & (origXData < xend)
-            mask = np.convolve([1,1], mask, mode='same').astype(bool)
-            ratio = max(np.sum(mask) // max_points, 1)
-    
-            xdata = origXData[mask]
-            ydata = origYData[mask]
-            
-            xdata = xdata[::ratio]
-            ydata = ydata[::ratio]
+    def downsample(self):
+        max_points = max(2 * self.plot.width(), self.plotFixedWidth.minimum())
+        
+        if(len(self.yPyramid) <= min(max_points, self.xRing.Size)):
+            xdata = self.xRing.View()
+            ydata = self.yRing.View()
         else:
-            xdata = self.xAll
-            ydata = self.yAll
+            xdata, ydata = self.yPyramid.Render(max_points)
         
         return xdata, ydata
         
     def convertOutput(self):
         if(self.outputType == 'Pressure'):
-            if(self.DataOutput.currentText() == 'PSI'):
-                self.dataOutputMultiplier = 1.0
-            elif(self.DataOutput.currentText() == 'HPA'):
-                self.dataOutputMultiplier = 6894.7572932
-            elif(self.DataOutput.currentText() == 'BAR'):
-                self.dataOutputMultiplier = 0.068947572932
-            elif(self.DataOutput.currentText() == 'MBAR'):
-                self.dataOutputMultiplier = 68.947572932
-            elif(self.DataOutput.currentText() == 'KPA'):
-                self.dataOutputMultiplier = 6.8947572932
-            elif(self.DataOutput.currentText() == 'CMH2O'):
-                self.dataOutputMultiplier = 70.3069578296
-            elif(self.DataOutput.currentText() == 'INH2O'):
-                self.dataOutputMultiplier = 27.6799048425
-            elif(self.DataOutput.currentText() == 'MMHG'):
-                self.dataOutputMultiplier = 51.71492
-                
+            self.dataOutputMultiplier = UNIT_SCALE.get(str(self.DataOutput.currentText()), 1.0)   #Samples are kept in PSI, only the plot is scaled
             self.plot.setLabel('left', 'Pressure (' + str(self.DataOutput.currentText()) + ')', color = 'gray', size = 40)
 
         self.DataMultiplier.setText("{:.2f}".format(self.dataOutputMultiplier))
@@ -898,10 +1072,18 @@ class tabdemo(QTabWidget):
             self.timer.stop()
             self.testTimer.stop()
             self.DAQ.Abort = True
-            self.DAQ.CloseCOM(str(self.COMDis.currentText()))
+            self.Reader.Stop()                  #Stops the stream and closes the COM Port
+            self.update_plot_data()             #Collect any samples streamed since the last update
+            self.Writer.Close()
+            self.plotStatus.setText(METRICS.Status())
+            self.updateStats()
+            if(self.Reader.Error != None):
+                self.logMsg('ERROR! - ' + self.Reader.Error, True, 'red')
+            if(self.Writer.Error != None):
+                self.logMsg('ERROR! - ' + self.Writer.Error, True, 'red')
             
             self.plot.clear()
-            self.data_line = self.plot.plot(self.xLive, self.yLive, pen=self.penGray)
+            self.data_lines = [self.plot.plot(self.xLive, self.yLive[:, i] * self.dataOutputMultiplier, pen=self.penGray) for i in range(0, self.yLive.shape[1])]
             self.setCurrentIndex(0)
             self.tab1.setDisabled(False)
             
@@ -924,7 +1106,20 @@ class tabdemo(QTabWidget):
                 self.logMsg('...Data Saved!', True, '#00aa00')
             else:
                 self.logMsg('...Data Could Not be Saved', True, 'red')
-                self.logMsg('Check Recovery Files', True, 'red')
+                self.logMsg('Data is in the capture file: ' + self.Writer.fname, True, 'red')
+            
+            Report = TimingReport(self.Writer.fname)    #Effective rate, jitter and gaps of the run
+            for key in Report:
+                self.logMsg(key + ': ' + str(Report[key]), False, 'black')
+            if(self.Trigger != None):
+                self.logMsg('Trigger Events: ' + str(self.Trigger.Events) + ', ' + str(self.Trigger.Kept) + ' of ' + str(self.nSamples) + ' samples saved', True, 'black')
+            elif(Report.get('Gaps', 0) > 0 or Report.get('Device Gaps', 0) > 0):
+                self.logMsg('Warning! - Gaps in the data, see the timing report', True, 'orange')
+            try:
+                METRICS.Save(os.path.splitext(self.Writer.fname)[0] + '.metrics.json')     #Where the time went, stage by stage
+                self.logMsg('Metrics: ' + os.path.splitext(self.Writer.fname)[0] + '.metrics.json', False, 'black')
+            except OSError as e:
+                self.logMsg('ERROR! - Could not save the metrics: ' + str(e), True, 'red')
             
         else:
             print ('Starting Test')
@@ -938,19 +1133,74 @@ class tabdemo(QTabWidget):
             
             self.setCurrentIndex(1)
             
+            Ports = self.SelectedPorts()
+            
+            COMPort = ', '.join(Ports)
+            print (COMPort)
+            self.lastOverruns = 0
+            self.zeroing = False
+            METRICS.Reset()                     #Metrics of this run only
+            self.Reader = self.DAQ.Group(Ports, int(1000 / float(self.DataRate.text())), Binary = self.BinaryStream, Channels = SetupChannels(self.SetupString))  #Firmware paces the samples, one reader per board
+            Columns = self.Reader.Columns       #One per board and channel
+            self.nSamples = 0
+            self.Stats = DF_DAQ_Stats(len(Columns), Window = int(STATS_WINDOW * float(self.DataRate.text())))
+            self.statsColumns = Columns
+            self.plotStats.setText('')
+            try:
+                self.Filters = ParseFilters(self.DataFilter.text(), float(self.DataRate.text()))
+            except ValueError as e:
+                self.logMsg('ERROR! - ' + str(e) + ', plotting the raw data', True, 'red')
+                self.Filters = DF_DAQ_FilterChain()
+            try:
+                Units = str(self.DataOutput.currentText()) if (str(self.DataOutput.currentText()) in UNIT_SCALE) else 'PSI'
+                self.Trigger = ParseTrigger(self.DataTrigger.text(), float(self.DataRate.text()), UNIT_SCALE[Units], len(Columns), Units)
+            except ValueError as e:
+                self.logMsg('ERROR! - ' + str(e) + ', saving every sample', True, 'red')
+                self.Trigger = None
+            self.lastEvents = 0
+            
             self.plot.clear()
-            self.x=[]
-            self.y=[]
-            self.data_line = self.plot.plot(self.x, self.y, pen=self.pen)
+            if(len(Columns) > 1 and self.plot.plotItem.legend == None):
+                self.plot.addLegend()
+            self.xRing = RingBuffer(self.xRing.Size, np.int64)      #One x for every curve
+            self.yRing = RingBuffer(self.yRing.Size, np.float64, len(Columns))
+            self.yPyramid = MinMaxPyramid(Width = len(Columns))
+            self.xLive = self.xRing.View()
+            self.yLive = self.yRing.View()
+            self.data_lines = []
+            for i in range(0, len(Columns)):
+                name = Columns[i] if (len(Columns) > 1) else None
+                self.data_lines.append(self.plot.plot(self.xLive, self.yLive[:, i], pen=self.pens[i % len(self.pens)], name=name))
             
             if(self.DataTime.displayText() != '-'):
                 testTime = int(float(self.DataTime.displayText())*1000)
                 self.testTimer.start(testTime)
                 print('Starting test for: '+str(testTime)+' mSec')
             
+            CaptureInfo = {'Firmware'      : self.FirmDis.text().strip(),
+                           'Setup'         : self.SetupString,
+                           'Units'         : self.Reader.Units,
+                           'Display Units' : self.DataOutput.currentText(),
+                           'Transfer'      : self.Reader.Transfer.Info(),
+                           'Rate'          : float(self.DataRate.text()),
+                           'Channels'      : self.HardChannels.text(),
+                           'Port'          : COMPort,
+                           'Columns'       : Columns,
+                           'Plot Filters'  : str(self.Filters),
+                           'Trigger'       : self.Trigger.Describe() if (self.Trigger != None) else 'none',
+                           'Start'         : datetime.datetime.now().isoformat()}
+            self.Writer = CaptureWriter(os.path.splitext(self.fileUniqueStr)[0] + '.dfc', CaptureInfo, Record = CaptureRecord(len(Columns)), Exclusive = True)     #Never over the capture of an earlier test
+            self.fileUniqueStr = os.path.splitext(self.Writer.fname)[0] + '.xlsx'     #Excel file follows the capture
+            self.FileOutput.setText(self.fileUniqueStr)
+            self.logMsg('Capture File: ' + self.Writer.fname, False, 'black')
+            if(self.Reader.Binary):
+                self.logMsg('Binary Stream', False, 'black')
+            if(len(self.Filters) > 0):
+                self.logMsg('Plot Filters: ' + str(self.Filters), False, 'black')
+            if(self.Trigger != None):
+                self.logMsg('Trigger: ' + self.Trigger.Describe() + ', only the samples around events are saved', False, 'black')
+            self.Reader.start()
             self.timer.start()
-            COMPort = str(self.COMDis.currentText())
-            print (COMPort)
             # if(COMPort != 'NA'):            
             #     if(self.FirmDis.text() != 'NA'):
             #         self.logMsg('--DAQ Settings--<br><br>', True, '#900090')
@@ -1030,28 +1280,42 @@ class tabdemo(QTabWidget):
             # else: # COM Port not found
             #     self.logMsg('ERROR! - Teensy COM Port NOT Found', True, 'red')
     
+#==============================================================================
+# Input Parameters: none
+# Output Returns: none
+#
+# Description: Sends the zero to every board without waiting for it, 
+# update_plot_data logs the result once the boards acknowledged it
+#==============================================================================
     def zeroSensor(self):
         self.logMsg('Zeroing Sensor Output', False, 'blue')
-        if(self.DAQ.zero()):
+        self.plotZero.setDisabled(True)
+        self.Reader.ZeroStart()
+        self.zeroing = True
+
+    def zeroCheck(self):
+        Zeroed = self.Reader.ZeroDone()
+        if(Zeroed == None):
+            return      #Still waiting for an acknowledgement
+        self.zeroing = False
+        self.plotZero.setDisabled(not(self.Start))
+        if(Zeroed):
             self.logMsg('Zero Set', False, 'green')
         else:
             self.logMsg('Zero NOT Set', False, 'red')
     
     def SaveData(self, fname):
         print ("Saving to Excel")
-        timeIndex = [x/float(self.DataRate.displayText()) for x in self.xAll]
-        pressureHeading = 'Pressure ('+self.DataOutput.currentText()+')'
-        data = {'Time (sec)':timeIndex, pressureHeading:self.yAll}
-        self.df = pd.DataFrame(data=data)
         try:
-            self.df.to_excel(str(fname))
+            start = time.perf_counter_ns()
+            ExportExcel(self.Writer.fname, str(fname), self.DataOutput.currentText())   #Built from the capture file written during the test, in the units selected now
+            METRICS.Add('Save', time.perf_counter_ns() - start)
             print ("File Saved!")
             return True
         except:
             print ("ERROR - Could not save Excel File!")
-            RecoveryPath = str(os.getcwd()) + '\Recovery-' + str(datetime.datetime.now().strftime('%H%M%S') + '.xlsx')
-            self.df.to_excel(RecoveryPath)
-            print ("File Recovery avaliable at: " + RecoveryPath)
+            print ("Data is still avaliable in the capture file: " + self.Writer.fname)
+            print ("Rebuild it with: python DF_DAQ_Capture.py " + self.Writer.fname)
             return False
     
     def closeEvent(self, event):
@@ -1101,26 +1365,41 @@ if __name__ == '__main__':
     #Import modules
     splash.showMessage(offset + "Loading Modules: sys\n\n", QtCore.Qt.AlignLeft | QtCore.Qt.AlignBottom)
     import sys
-    splash.showMessage(offset + "Loading Modules: pandas\n\n", QtCore.Qt.AlignLeft | QtCore.Qt.AlignBottom)
-    import pandas as pd
     splash.showMessage(offset + "Loading Modules: datetime\n\n", QtCore.Qt.AlignLeft | QtCore.Qt.AlignBottom)
     import datetime
+    import time
     splash.showMessage(offset + "Loading Modules: pyqt5.widgets\n\n", QtCore.Qt.AlignLeft | QtCore.Qt.AlignBottom)
     from PyQt5.QtWidgets import QWidget, QLineEdit, QHBoxLayout, QLabel, QVBoxLayout, QPushButton, QTextEdit, QGridLayout, QFileDialog, QApplication, QComboBox, QRadioButton, QGroupBox, QSizePolicy, QSpacerItem, QSpinBox
     from PyQt5.QtGui import QIcon, QTextCursor, QFont
-    splash.showMessage(offset + "Loading Modules: bokeh.plotting\n\n", QtCore.Qt.AlignLeft | QtCore.Qt.AlignBottom)
-    from bokeh.plotting import figure, show
     splash.showMessage(offset + "Loading Modules: os\n\n", QtCore.Qt.AlignLeft | QtCore.Qt.AlignBottom)
     import os
     splash.showMessage(offset + "Loading Modules: numpy\n\n", QtCore.Qt.AlignLeft | QtCore.Qt.AlignBottom)
     import numpy as np
     # splash.showMessage(offset + "Loading Modules: scipy\n\n", QtCore.Qt.AlignLeft | QtCore.Qt.AlignBottom)
     # import scipy
+    #pandas (saving/opening Excel files) and bokeh (PlotData) are loaded on first use
+
+    splash.showMessage(offset + "Loading Modules: DF_DAQ\n\n", QtCore.Qt.AlignLeft | QtCore.Qt.AlignBottom)
+    from DF_DAQ_HW_Interface import DF_DAQ, SupportsBinary, SetupChannels
+    from DF_DAQ_Replay import DF_DAQ_Replay
+    from DF_DAQ_Buffers import RingBuffer, MinMaxPyramid
+    from DF_DAQ_Columns import OpenColumns, ColumnEnvelope, ParseColumns
+    from DF_DAQ_Capture import CaptureWriter, CaptureRecord, ExportExcel, TimingReport
+    from DF_DAQ_Units import UNIT_SCALE
+    from DF_DAQ_Metrics import METRICS, LATE_MS
+    from DF_DAQ_Filters import DF_DAQ_FilterChain, ParseFilters
+    from DF_DAQ_Stats import DF_DAQ_Stats
+    from DF_DAQ_Trigger import ParseTrigger
 
-    from DF_DAQ_HW_Interface import DF_DAQ
+    #Replay a capture file instead of the attached boards (python DF-DAQ.py --replay Test-1.dfc --speed 10)
+    import argparse
+    parser = argparse.ArgumentParser(description = 'DroidForge data acquisition')
+    parser.add_argument('--replay', help = 'capture file (.dfc) to stream instead of the attached boards')
+    parser.add_argument('--speed', type = float, default = 1.0, help = 'replay speed (times real time), 0 for as fast as possible')
+    args = parser.parse_known_args(argv[1:])[0]     #Qt takes the rest
 
     #Start the GUI, (tabdemo)
-    form = tabdemo()
+    form = tabdemo(Replay = args.replay, Speed = args.speed)
     form.show()
     #Close the splash screen
     splash.finish(form)
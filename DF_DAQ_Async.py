@@ -0,0 +1,270 @@
+# -*- coding: utf-8 -*-
+"""
+DF_DAQ_Async - asyncio client for DroidForge boards
+
+The same operations as DF_DAQ (getFirmVer, getSetup, Read, zero, streaming)
+as coroutines, so any number of boards and other network or file I/O can
+share one event loop without threads. Usage:
+
+    async with AsyncDF_DAQ(Port) as daq:
+        print (await daq.getFirmVer())
+        await daq.StreamStart(10)
+        async for Times, Samples, Millis in daq.Stream():
+            ...
+
+The serial port is read from the event loop (loop.add_reader on POSIX, a
+short polling task elsewhere). Streamed samples go to a bounded queue that
+Stream consumes. When the consumer falls behind and the queue fills up, the
+port is no longer read until there is room again. The samples wait in the OS
+and USB buffers, and then the firmware's serial output blocks. Nothing is
+dropped on the host.
+
+@author: DroidForge Engineering
+"""
+
+import asyncio
+import os
+import time
+
+import numpy as np
+import serial
+
+from DF_DAQ_HW_Interface import DF_DAQ_TextDecoder, DF_DAQ_FrameDecoder, ParseRead, HostTimes, SendsMillis
+
+#==============================================================================
+# Input Parameters: Com (Str), QueueSize (Int, batches), Timeout (Float, Sec),
+#                   Channels (Int)
+# Output Returns: none
+#
+# Description: Async connection to one board. Commands and their replies are
+# serialized per board, Timeout is how long a reply is waited for (a missing
+# reply returns '' like a serial timeout in DF_DAQ). Error holds the reason if
+# the port failed while open. Samples hold one value per channel (Channels,
+# see SetupChannels), a stream with another channel count is ended with an
+# Error like DF_DAQ_Session.
+#==============================================================================
+class AsyncDF_DAQ():
+    def __init__(self, Com, QueueSize = 64, Timeout = 1.0, Channels = 1):
+        self.Com = Com
+        self.QueueSize = QueueSize
+        self.Timeout = Timeout
+        self.Channels = Channels
+        self.Error = None
+        self.Paused = 0             #Times reading was paused for backpressure
+        self.__ser = None
+        self.__rx = b''
+        self.__data = None
+        self.__lock = None
+        self.__queue = None
+        self.__decoder = None
+        self.__streaming = False
+        self.__paused = False
+        self.__poller = None
+
+    async def __aenter__(self):
+        await self.Open()
+        return self
+
+    async def __aexit__(self, *args):
+        await self.Close()
+
+    async def Open(self):
+        self.__loop = asyncio.get_event_loop()
+        self.__data = asyncio.Event()
+        self.__lock = asyncio.Lock()
+        self.__queue = asyncio.Queue(self.QueueSize + 1)   #One extra slot for the end of stream marker
+        self.__ser = serial.Serial(self.Com, 250000, timeout = 0)   #Non blocking, only read when data is waiting
+        self.__resume()
+        print ('Serial Opened on Port: ' + self.Com)
+
+    async def Close(self):
+        if(self.__ser == None):
+            return
+        if(self.__streaming):
+            await self.StreamStop()
+        self.__pause()
+        if(self.__poller != None):
+            self.__poller.cancel()
+            self.__poller = None
+        self.__ser.close()
+        self.__ser = None
+        print ('Serial on Port: ' + self.Com + ' Closed')
+
+    def __resume(self):
+        self.__paused = False
+        if(os.name == 'posix'):
+            self.__loop.add_reader(self.__ser.fileno(), self.__onReadable)
+        elif(self.__poller == None):
+            self.__poller = self.__loop.create_task(self.__poll())
+
+    def __pause(self):
+        self.__paused = True
+        if(os.name == 'posix' and self.__ser != None):
+            self.__loop.remove_reader(self.__ser.fileno())
+
+    async def __poll(self):
+        #Windows serial ports can not be watched by the event loop, check them instead
+        while(True):
+            if(not(self.__paused) and self.__ser.in_waiting > 0):
+                self.__onReadable()
+            await asyncio.sleep(0.002)
+
+    def __onReadable(self):
+        try:
+            data = self.__ser.read(max(self.__ser.in_waiting, 1))
+        except (serial.SerialException, OSError) as e:
+            print ('ERROR - Port Failed: ' + str(e))
+            self.Error = str(e)
+            self.__pause()
+            self.__endStream()
+            return
+        if(not(self.__streaming)):
+            self.__rx += data
+            self.__data.set()
+            return
+
+        Received = time.perf_counter_ns()
+        if(isinstance(self.__decoder, DF_DAQ_FrameDecoder)):
+            Counts, Millis, Seq = self.__decoder.Decode(data)
+            Samples = Counts.astype(np.float64)
+        else:
+            Samples, Millis = self.__decoder.Decode(data)
+        if(self.__decoder.StreamChannels not in (None, self.Channels)):
+            self.Error = 'board sends ' + str(self.__decoder.StreamChannels) + ' channels, its setup has ' + str(self.Channels)
+            print ('ERROR - Stream Stopped: ' + self.Error)
+            self.__pause()
+            self.__endStream()
+            return
+        if(len(Samples) == 0):
+            return
+        self.__queue.put_nowait((HostTimes(Received, Millis), Samples, Millis))     #Same host times as DF_DAQ_Session
+        if(self.__queue.qsize() >= self.QueueSize):
+            self.Paused += 1
+            self.__pause()      #Consumer is behind, leave the rest in the port until it catches up
+
+    def __endStream(self):
+        if(self.__streaming):
+            self.__streaming = False
+            self.__queue.put_nowait(None)
+
+    async def __readline(self):
+        deadline = self.__loop.time() + self.Timeout
+        while(b'\n' not in self.__rx):
+            self.__data.clear()
+            try:
+                await asyncio.wait_for(self.__data.wait(), max(deadline - self.__loop.time(), 0))
+            except asyncio.TimeoutError:
+                line, self.__rx = self.__rx, b''
+                return line.decode('latin_1')
+        line, self.__rx = self.__rx.split(b'\n', 1)
+        return (line + b'\n').decode('latin_1')
+
+#==============================================================================
+# Input Parameters: Command (Str), Reply (Bool)
+# Output Returns: Reply line (Str), '' when there is none
+#==============================================================================
+    async def Command(self, Command, Reply = True):
+        async with self.__lock:
+            self.__rx = b''
+            self.__ser.write(Command.encode('latin_1'))
+            if(Reply):
+                return await self.__readline()
+            return ''
+
+    async def getFirmVer(self):
+        s = await self.Command('v\n')
+        return s if (len(s) > 0) else 'NA'
+
+    async def getSetup(self):
+        s = await self.Command('x\n')
+        return s if (len(s) > 0) else 'NA'
+
+    async def Read(self):
+        try:
+            return ParseRead(await self.Command('r\n'))     #One value per channel
+        except ValueError:
+            print ('ERROR - Nothing Returned')
+            return np.zeros(self.Channels)
+
+    async def zero(self):
+        await self.Command('z\n', False)
+        return 1
+
+#==============================================================================
+# Input Parameters: Period (Int, mSec), Binary (Bool)
+# Output Returns: none
+#
+# Description: Same sequence as DF_DAQ_Session.StreamStart, samples are then
+# read with Stream. Samples are PSI for the text stream and raw counts for the
+# binary stream (see DF_DAQ_Transfer).
+#==============================================================================
+    async def StreamStart(self, Period, Binary = False):
+        await self.Command('p\n', False)       #Make sure the firmware is not already streaming
+        await asyncio.sleep(0.05)
+        self.__ser.reset_input_buffer()
+        s = await self.Command('o' + str(int(Period)) + '\n')      #Firmware echoes the sample period
+        print ('Sample Period Set: ' + s.strip() + ' mSec')
+        Millis = Binary or SendsMillis(await self.getFirmVer())     #Text lines of firmware before 0.0.2 have no millis
+
+        while(not(self.__queue.empty())):
+            self.__queue.get_nowait()
+        self.__decoder = DF_DAQ_FrameDecoder(int(Period), self.Channels) if Binary else DF_DAQ_TextDecoder(self.Channels, Millis)
+        self.__streaming = True
+        await self.Command('b\n' if Binary else 's\n', False)
+        print ('Streaming Started on Port: ' + self.Com + (' (Binary)' if Binary else ''))
+
+    async def StreamStop(self):
+        if(not(self.__streaming)):
+            return
+        await self.Command('p\n', False)
+        await asyncio.sleep(0.05)      #Samples already sent are still delivered
+        self.__ser.reset_input_buffer()
+        self.__rx = b''
+        if(self.__paused and self.Error == None):
+            self.__resume()
+        self.__endStream()
+        print ('Streaming Stopped')
+
+    @property
+    def LostFrames(self):
+        return getattr(self.__decoder, 'LostFrames', 0)
+
+#==============================================================================
+# Input Parameters: none
+# Output Returns: Async iterator of (Times, Samples, Millis) batches
+#
+# Description: Yields the samples streamed since StreamStart in batches (one
+# per serial read), with the same host times (time.perf_counter_ns) and device
+# times as DF_DAQ_Session. Ends after StreamStop.
+#==============================================================================
+    async def Stream(self):
+        while(True):
+            batch = await self.__queue.get()
+            if(self.__paused and self.__streaming and self.__queue.qsize() < self.QueueSize):
+                self.__resume()
+            if(batch == None):
+                return
+            yield batch
+
+#==============================================================================
+# Input Parameters: Ports (List of Str), Period (Int, mSec), Seconds (Float),
+#                   Binary (Bool), Channels (Int)
+# Output Returns: Results (Dict, Port : (Times, Samples, Millis))
+#
+# Description: Streams every board on one event loop for Seconds and returns
+# all of their samples.
+#==============================================================================
+async def Acquire(Ports, Period, Seconds, Binary = False, Channels = 1):
+    async def board(Port):
+        Times, Samples, Millis = [np.zeros(0, dtype = np.int64)], [np.zeros((0, Channels))], [np.zeros(0, dtype = np.int64)]
+        async with AsyncDF_DAQ(Port, Channels = Channels) as daq:
+            await daq.StreamStart(Period, Binary)
+            asyncio.get_event_loop().call_later(Seconds, lambda: asyncio.ensure_future(daq.StreamStop()))
+            async for batch in daq.Stream():
+                Times.append(batch[0])
+                Samples.append(batch[1])
+                Millis.append(batch[2])
+        return np.concatenate(Times), np.concatenate(Samples), np.concatenate(Millis)
+
+    Results = await asyncio.gather(*[board(Port) for Port in Ports])
+    return dict(zip(Ports, Results))
@@ -0,0 +1,280 @@
+# -*- coding: utf-8 -*-
+"""
+DF_DAQ_Buffers - NumPy sample storage for the live data plot
+
+@author: DroidForge Engineering
+"""
+
+import numpy as np
+
+#==============================================================================
+# Input Parameters: dtype (NumPy dtype), Width (Int), Chunk (Int)
+# Output Returns: none
+#
+# Description: Typed sample store that grows in chunks. Samples are kept in one
+# contiguous NumPy array so View and Tail return slices of it without copying.
+# Width = 0 stores one value per sample, Width = N stores N values per sample
+# (one row per sample).
+#==============================================================================
+class SampleStore():
+    def __init__(self, dtype = np.float64, Width = 0, Chunk = 65536):
+        self.dtype = np.dtype(dtype)
+        self.Width = Width
+        self.Chunk = Chunk
+        self.Clear()
+
+    def __len__(self):
+        return self.__count
+
+    def __shape(self, rows):
+        if(self.Width == 0):
+            return (rows,)
+        return (rows, self.Width)
+
+    def Clear(self):
+        self.__data = np.empty(self.__shape(self.Chunk), dtype = self.dtype)
+        self.__count = 0
+
+#==============================================================================
+# Input Parameters: Values (Array like)
+# Output Returns: none
+#
+# Description: Appends a batch of samples. The array is only reallocated when it
+# is full, growing by at least one chunk (or half its size) each time.
+#==============================================================================
+    def Extend(self, Values):
+        Values = np.asarray(Values, dtype = self.dtype)
+        n = len(Values)
+        needed = self.__count + n
+
+        if(needed > len(self.__data)):
+            capacity = len(self.__data) + max(self.Chunk, len(self.__data) // 2, needed - len(self.__data))
+            data = np.empty(self.__shape(capacity), dtype = self.dtype)
+            data[:self.__count] = self.__data[:self.__count]
+            self.__data = data
+
+        self.__data[self.__count:needed] = Values
+        self.__count = needed
+
+    def View(self):
+        return self.__data[:self.__count]
+
+    def Tail(self, n):
+        return self.__data[max(self.__count - n, 0):self.__count]
+
+#==============================================================================
+# Input Parameters: Size (Int), dtype (NumPy dtype), Width (Int)
+# Output Returns: none
+#
+# Description: Fixed size ring buffer holding the newest 'Size' samples. Every
+# sample is written twice (slot and slot + Size) so the newest n samples are
+# always one contiguous slice, View never has to copy or unwrap the ring.
+#==============================================================================
+class RingBuffer():
+    def __init__(self, Size, dtype = np.float64, Width = 0):
+        self.Size = Size
+        self.dtype = np.dtype(dtype)
+        if(Width == 0):
+            self.__data = np.zeros(2 * Size, dtype = self.dtype)
+        else:
+            self.__data = np.zeros((2 * Size, Width), dtype = self.dtype)
+        self.__head = 0     #Slot the next sample is written to
+        self.__count = 0
+
+    def __len__(self):
+        return self.__count
+
+    def Extend(self, Values):
+        Values = np.asarray(Values, dtype = self.dtype)
+        if(len(Values) > self.Size):
+            Values = Values[-self.Size:]    #Older samples would be overwritten anyway
+        n = len(Values)
+
+        slots = (self.__head + np.arange(n)) % self.Size
+        self.__data[slots] = Values
+        self.__data[slots + self.Size] = Values
+
+        self.__head = (self.__head + n) % self.Size
+        self.__count = min(self.__count + n, self.Size)
+
+    def View(self, n = None):
+        if(n == None or n > self.__count):
+            n = self.__count
+        end = self.__head + self.Size
+        return self.__data[end - n:end]
+
+#==============================================================================
+# Input Parameters: Factor (Int), dtype (NumPy dtype), Width (Int)
+# Output Returns: none
+#
+# Description: Multi level min/max summary of a growing capture, used to draw 
+# the 'All' plot without touching the whole history. Level k holds the min and
+# max of every block of Factor^(k+1) samples along with the first and last x of
+# the block. Each level is only built from the finished blocks of the level 
+# below it, so appending costs O(1) amortized per sample. Render draws the min
+# and max of every block so short pressure spikes stay visible at any zoom.
+#==============================================================================
+class MinMaxPyramid():
+    def __init__(self, Factor = 4, dtype = np.float64, Width = 0):
+        self.Factor = Factor
+        self.dtype = np.dtype(dtype)
+        self.Width = Width
+        self.Clear()
+
+    def __len__(self):
+        return self.__count
+
+    def Clear(self):
+        self.__levels = []
+        self.__xPending = np.empty(0, dtype = np.int64)    #Raw samples that do not fill a block yet
+        if(self.Width == 0):
+            self.__yPending = np.empty(0, dtype = self.dtype)
+        else:
+            self.__yPending = np.empty((0, self.Width), dtype = self.dtype)
+        self.__count = 0
+
+    def __newLevel(self):
+        return {'xStart' : SampleStore(np.int64),
+                'xEnd'   : SampleStore(np.int64),
+                'yMin'   : SampleStore(self.dtype, self.Width),
+                'yMax'   : SampleStore(self.dtype, self.Width)}
+
+    def __addBlocks(self, k, xStart, xEnd, yMin, yMax):
+        if(k == len(self.__levels)):
+            self.__levels.append(self.__newLevel())
+        level = self.__levels[k]
+        level['xStart'].Extend(xStart)
+        level['xEnd'].Extend(xEnd)
+        level['yMin'].Extend(yMin)
+        level['yMax'].Extend(yMax)
+
+#==============================================================================
+# Input Parameters: x (Array like), y (Array like)
+# Output Returns: none
+#
+# Description: Adds a batch of samples and rolls any finished blocks up through
+# the levels. 
+#==============================================================================
+    def Extend(self, x, y):
+        F = self.Factor
+        x = np.concatenate((self.__xPending, np.asarray(x, dtype = np.int64)))
+        y = np.concatenate((self.__yPending, np.asarray(y, dtype = self.dtype)))
+        self.__count += len(x) - len(self.__xPending)
+
+        nb = len(x) // F
+        if(nb > 0):
+            blocks = y[:nb * F].reshape((nb, F) + y.shape[1:])
+            self.__addBlocks(0, x[0:nb * F:F], x[F - 1:nb * F:F], blocks.min(axis = 1), blocks.max(axis = 1))
+        self.__xPending = x[nb * F:]
+        self.__yPending = y[nb * F:]
+
+        k = 0
+        while(nb > 0 and k < len(self.__levels)):
+            lower = self.__levels[k]
+            done = self.__done(k)
+            nb = (len(lower['xStart']) - done) // F
+            if(nb > 0):
+                end = done + nb * F
+                yMin = lower['yMin'].View()[done:end]
+                yMax = lower['yMax'].View()[done:end]
+                self.__addBlocks(k + 1, lower['xStart'].View()[done:end:F], lower['xEnd'].View()[done + F - 1:end:F],
+                                 yMin.reshape((nb, F) + yMin.shape[1:]).min(axis = 1),
+                                 yMax.reshape((nb, F) + yMax.shape[1:]).max(axis = 1))
+            k += 1
+
+    def __done(self, k):
+        #Number of level k blocks already summarised by level k + 1
+        if(k + 1 < len(self.__levels)):
+            return len(self.__levels[k + 1]['xStart']) * self.Factor
+        return 0
+
+#==============================================================================
+# Input Parameters: MaxPoints (Int)
+# Output Returns: x (NumPy Array), y (NumPy Array)
+#
+# Description: Returns at most about MaxPoints points covering the whole capture.
+# The finest level that fits is drawn as min/max pairs, followed by the newer 
+# blocks of the finer levels and the raw samples that are not in a block yet.
+# The amount of work only depends on MaxPoints, not on the capture length.
+#==============================================================================
+    def Render(self, MaxPoints):
+        if(len(self.__levels) == 0):
+            return self.__xPending, self.__yPending
+
+        for L in range(0, len(self.__levels)):
+            points = 2 * len(self.__levels[L]['xStart']) + len(self.__xPending)
+            for k in range(0, L):
+                points += 2 * (len(self.__levels[k]['xStart']) - self.__done(k))
+            if(points <= MaxPoints):
+                break
+
+        xParts = []
+        yParts = []
+        for k in range(L, -1, -1):
+            level = self.__levels[k]
+            start = 0 if (k == L) else self.__done(k)
+            xStart = level['xStart'].View()[start:]
+            nb = len(xStart)
+            x = np.empty(2 * nb, dtype = np.int64)
+            x[0::2] = xStart
+            x[1::2] = level['xEnd'].View()[start:]
+            y = np.empty((2 * nb,) + self.__yPending.shape[1:], dtype = self.dtype)
+            y[0::2] = level['yMin'].View()[start:]
+            y[1::2] = level['yMax'].View()[start:]
+            xParts.append(x)
+            yParts.append(y)
+        xParts.append(self.__xPending)
+        yParts.append(self.__yPending)
+
+        return np.concatenate(xParts), np.concatenate(yParts)
+
+#==============================================================================
+# Input Parameters: x (Array like), y (Array like, Samples or Columns x Samples),
+#                   Block (Int)
+# Output Returns: x (NumPy Array), y (NumPy Array, Points or Columns x Points)
+#
+# Description: Cuts the samples into blocks of Block samples (the last one may
+# be shorter) and draws each block as its first x with its min and its last x
+# with its max, the same pairs MinMaxPyramid.Render draws. Every column is 
+# summarised in the same pass. A block that is all NaN stays NaN so gaps in
+# the data still show. Runs of whole blocks give the same result one piece at
+# a time as all at once, so data larger than memory can be summarised in 
+# pieces.
+#==============================================================================
+def EnvelopeBlocks(x, y, Block):
+    x = np.asarray(x)
+    y = np.asarray(y, dtype = np.float64)
+    n = len(x)
+    starts = np.arange(0, n, Block)
+    xOut = np.empty(2 * len(starts), dtype = x.dtype)
+    xOut[0::2] = x[starts]
+    xOut[1::2] = x[np.minimum(starts + Block, n) - 1]
+    yOut = np.empty(y.shape[:-1] + (2 * len(starts),), dtype = y.dtype)
+    if(n > 0):
+        yOut[..., 0::2] = np.fmin.reduceat(y, starts, axis = -1)
+        yOut[..., 1::2] = np.fmax.reduceat(y, starts, axis = -1)
+    return xOut, yOut
+
+#==============================================================================
+# Input Parameters: n (Int, Samples), MaxPoints (Int)
+# Output Returns: Block (Int)
+#
+# Description: Smallest block size whose envelope of n samples has at most 
+# MaxPoints points
+#==============================================================================
+def EnvelopeBlock(n, MaxPoints):
+    return max(-(-n // max(MaxPoints // 2, 1)), 1)
+
+#==============================================================================
+# Input Parameters: x (Array like), y (Array like, Samples or Columns x Samples),
+#                   MaxPoints (Int)
+# Output Returns: x (NumPy Array), y (NumPy Array, Points or Columns x Points)
+#
+# Description: One shot version of MinMaxPyramid.Render for data that is 
+# already loaded, at most MaxPoints points (see EnvelopeBlocks). Data that 
+# already fits is returned as is.
+#==============================================================================
+def Envelope(x, y, MaxPoints):
+    if(len(x) <= MaxPoints):
+        return np.asarray(x), np.asarray(y, dtype = np.float64)
+    return EnvelopeBlocks(x, y, EnvelopeBlock(len(x), MaxPoints))
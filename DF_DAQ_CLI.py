@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+"""
+DF_DAQ_CLI - Headless acquisition for unattended runs (no PyQt, pandas or bokeh)
+
+    python DF_DAQ_CLI.py list
+    python DF_DAQ_CLI.py capture [--port COM3 ...] [--rate 10] [--seconds 3600]
+                                 [--zero] [--out Test.dfc] [--excel Test.xlsx]
+                                 [--trigger "rising 0.8 pre 2 post 5"]
+
+'list' shows every DroidForge board with its firmware, setup, type and USB serial
+number (from the identity table, --refresh asks the boards again). 'capture'
+streams the selected boards (all of them by default) into a capture file
+(.dfc, see DF_DAQ_Capture) until --seconds have passed or Ctrl+C / SIGTERM.
+Only the newest batch of samples is ever held in memory, so a capture can run
+for weeks. --rotate starts a new capture file every N hours, --trigger only
+saves the samples around events (see DF_DAQ_Trigger). Progress goes to
+stderr, --quiet hides the board interface messages on stdout. The pipeline
+metrics of the run (see DF_DAQ_Metrics) are saved next to the first capture
+file when it ends.
+
+@author: DroidForge Engineering
+"""
+
+import argparse
+import datetime
+import os
+import signal
+import sys
+import time
+
+import numpy as np
+
+from DF_DAQ_HW_Interface import DF_DAQ, DF_DAQ_Group, SupportsBinary, SetupChannels
+from DF_DAQ_Capture import CaptureWriter, CaptureRecord, TimingReport
+from DF_DAQ_Units import UNIT_SCALE
+from DF_DAQ_Metrics import METRICS
+from DF_DAQ_Trigger import ParseTrigger
+
+def Log(msg):
+    sys.stderr.write(datetime.datetime.now().strftime('%H:%M:%S') + ' - ' + msg + '\n')
+    sys.stderr.flush()
+
+#==============================================================================
+# Input Parameters: Ports (List of Str)
+# Output Returns: Boards (List of Dicts with Port, Firmware and Setup)
+#==============================================================================
+def Probe(Ports, Refresh = False):
+    DAQ = DF_DAQ()
+    DAQ.findPort()      #USB serial numbers for the identity table
+    Identities = DAQ.Probe(Ports, Refresh)
+    return [Identities[Port] for Port in Ports]
+
+def CommandList(args):
+    Boards = Probe(DF_DAQ().findPort(), args.refresh)
+    if(len(Boards) == 0):
+        Log('No DroidForge boards found')
+        return 1
+    for Board in Boards:
+        print ('\t'.join([Board['Port'], Board['Firmware'], Board['Setup'], Board['Type'], str(Board['Serial'])]), file = sys.__stdout__)
+    return 0
+
+#==============================================================================
+# Input Parameters: Base (Str), Part (Int)
+# Output Returns: Capture file name (Str)
+#
+# Description: Name of the Part'th file of a rotated capture, Test.dfc,
+# Test-2.dfc, Test-3.dfc, ...
+#==============================================================================
+def PartName(Base, Part):
+    if(Part == 1):
+        return Base
+    root, ext = os.path.splitext(Base)
+    return root + '-' + str(Part) + ext
+
+def CommandCapture(args):
+    Ports = args.port if (args.port) else DF_DAQ().findPort()
+    if(len(Ports) == 0):
+        Log('No DroidForge boards found')
+        return 1
+    Boards = Probe(Ports)
+    for Board in Boards:
+        Log('DF Board: ' + Board['Port'] + ', Firmware: ' + Board['Firmware'] + ', Setup: ' + Board['Setup'])
+    Setup = Boards[0]['Setup'].split('-')      #Boards logged together are expected to share a setup
+
+    Rate = args.rate
+    if(Rate == None):
+        Rate = float(Setup[4]) if (len(Setup) > 4) else 10.0
+    if(len(Setup) > 3 and Rate > float(Setup[3])):
+        Rate = float(Setup[3])
+        Log('Warning! - Maximum rate is ' + str(Rate) + 'Hz')
+    Binary = all([SupportsBinary(Board['Firmware']) for Board in Boards]) if (args.binary == 'auto') else (args.binary == 'on')
+
+    Reader = DF_DAQ_Group(Ports, int(1000 / Rate), Binary = Binary, Channels = SetupChannels(Boards[0]['Setup']))
+    try:
+        Trigger = ParseTrigger(args.trigger or '', Rate, UNIT_SCALE[args.units], len(Reader.Columns), args.units)
+    except ValueError as e:
+        Log('ERROR! - ' + str(e))
+        return 1
+    Base = args.out if (args.out) else datetime.datetime.now().strftime('DF-DAQ-%Y%m%d-%H%M%S.dfc')
+    Info = {'Firmware'      : Boards[0]['Firmware'],
+            'Setup'         : Boards[0]['Setup'],
+            'Units'         : 'Counts' if Binary else 'PSI',
+            'Display Units' : args.units,
+            'Transfer'      : Reader.Transfer.Info(),
+            'Rate'          : Rate,
+            'Channels'      : Setup[2] if (len(Setup) > 2) else 'NA',
+            'Port'          : ', '.join(Ports),
+            'Columns'       : Reader.Columns,       #One per board and channel
+            'Trigger'       : Trigger.Describe() if (Trigger != None) else 'none',
+            'Start'         : datetime.datetime.now().isoformat()}
+    Part = 1
+    Writer = CaptureWriter(Base, Info, Record = CaptureRecord(len(Reader.Columns)), Exclusive = True)
+    Files = [Writer.fname]
+    Log('Capture File: ' + Writer.fname + (' (Binary Stream)' if Binary else ''))
+    if(Trigger != None):
+        Log('Trigger: ' + Trigger.Describe() + ', only the samples around events are saved')
+
+    Stopping = []
+    def stop(signum, frame):
+        Stopping.append(signum)
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    METRICS.Reset()
+    Reader.start()
+    if(args.zero):
+        Log('Zeroing the sensors')
+        if(not(Reader.zero())):      #Boards are streaming, zeroed before the first sample is written
+            Log('Warning! - The sensors did not acknowledge the zero, capturing without it')
+    Start = time.monotonic()
+    Rotated = Start
+    Status = Start
+    Sample = 0
+    Overruns = 0
+    try:
+        while(True):
+            Done = len(Stopping) > 0 or (args.seconds != None and time.monotonic() - Start >= args.seconds) or Reader.Error != None
+            if(Done):
+                Reader.Stop()       #Stops the streams, the last samples are drained below
+            time.sleep(0 if Done else args.interval)
+
+            Times, Samples, Millis = Reader.Drain()
+            if(len(Samples) > 0):
+                y = Reader.ToPSI(Samples) if (Trigger != None) else None      #The trigger watches PSI, the capture gets the samples as streamed
+                if(Samples.shape[1] == 1):
+                    Samples, Millis = Samples[:, 0], Millis[:, 0]
+                Kept = [np.arange(Sample, Sample + len(Samples)), Times, Millis, Samples]
+                if(Trigger != None):
+                    start = time.perf_counter_ns()
+                    Events = Trigger.Events
+                    Kept = Trigger.Process(y, *Kept)     #Only the windows around events
+                    METRICS.Add('Trigger', time.perf_counter_ns() - start)
+                    if(Trigger.Events != Events):
+                        Log('Trigger - event ' + str(Trigger.Events) + ' at %.2f sec' % ((Times[-1] - Reader.StartNs) / 1e9))
+                if(len(Kept[0]) > 0):
+                    Writer.Write(Sample = Kept[0], Time = Kept[1] - Reader.StartNs, DeviceTime = Kept[2], Value = Kept[3])
+                Sample += len(Samples)
+                METRICS.Count('Samples', len(Samples))
+            if(Reader.Overruns != Overruns):
+                Log('Warning! - ' + str(Reader.Overruns - Overruns) + ' samples dropped (disk or CPU too slow)')
+                Overruns = Reader.Overruns
+            if(Writer.Error != None):
+                Log('ERROR! - ' + Writer.Error)
+                Reader.Stop()
+                return 1
+            if(Done):
+                break
+
+            now = time.monotonic()
+            if(args.status > 0 and now - Status >= args.status):
+                Status = now
+                Log('%d samples, %.1f Hz' % (Sample, Sample / (now - Start)))
+            if(args.rotate != None and now - Rotated >= args.rotate * 3600):
+                Rotated = now
+                Writer.Close()
+                Part += 1
+                Info['Start'] = datetime.datetime.now().isoformat()
+                Writer = CaptureWriter(PartName(Base, Part), Info, Record = CaptureRecord(len(Reader.Columns)), Exclusive = True)
+                Files.append(Writer.fname)
+                Log('Capture File: ' + Writer.fname)
+    finally:
+        Writer.Close()
+
+    if(Reader.Error != None):
+        Log('ERROR! - ' + Reader.Error)
+    Log('Stopped, ' + str(Sample) + ' samples')
+    if(Trigger != None):
+        Log('Trigger Events: ' + str(Trigger.Events) + ', ' + str(Trigger.Kept) + ' samples saved')
+    Log('Timing of ' + Writer.fname)
+    for Key, Value in TimingReport(Writer.fname).items():
+        Log(Key + ': ' + str(Value))
+    try:
+        METRICS.Save(os.path.splitext(Files[0])[0] + '.metrics.json')
+        Log('Metrics: ' + os.path.splitext(Files[0])[0] + '.metrics.json')
+    except OSError as e:
+        Log('ERROR! - Could not save the metrics: ' + str(e))
+    if(args.excel):
+        from DF_DAQ_Capture import ExportExcel     #pandas is only loaded here
+        for i in range(0, len(Files)):
+            ExportExcel(Files[i], PartName(args.excel, i + 1), args.units)
+            Log('Saved: ' + PartName(args.excel, i + 1))
+    return 1 if (Reader.Error != None) else 0
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = 'DroidForge headless data acquisition')
+    parser.add_argument('--quiet', '-q', action = 'store_true', help = 'hide the board interface messages')
+    commands = parser.add_subparsers(dest = 'command')
+    boards = commands.add_parser('list', help = 'list the attached boards')
+    boards.add_argument('--refresh', action = 'store_true', help = 'ask every board again instead of using the identity table')
+    capture = commands.add_parser('capture', help = 'stream the boards to a capture file')
+    capture.add_argument('--port', '-p', action = 'append', help = 'board to log (repeat for several), default all')
+    capture.add_argument('--rate', '-r', type = float, help = 'sample rate (Hz), default from the board setup')
+    capture.add_argument('--seconds', '-s', type = float, help = 'capture length, default until Ctrl+C')
+    capture.add_argument('--zero', '-z', action = 'store_true', help = 'zero the sensors once streaming')
+    capture.add_argument('--out', '-o', help = 'capture file, default DF-DAQ-<date>-<time>.dfc')
+    capture.add_argument('--excel', '-e', help = 'also save an Excel file when the capture ends')
+    capture.add_argument('--units', '-u', default = 'PSI', choices = list(UNIT_SCALE.keys()), help = 'units for the Excel file')
+    capture.add_argument('--binary', default = 'auto', choices = ['auto', 'on', 'off'], help = 'binary stream, default when the firmware has it')
+    capture.add_argument('--rotate', type = float, help = 'start a new capture file every ROTATE hours')
+    capture.add_argument('--status', type = float, default = 60, help = 'seconds between progress messages, 0 for none')
+    capture.add_argument('--trigger', '-t', help = 'only save the samples around events, Ex: "rising 0.8 pre 2 post 5" (threshold in --units)')
+    capture.add_argument('--interval', type = float, default = 0.25, help = 'seconds between writes to the capture file')
+    args = parser.parse_args(argv)
+
+    if(args.quiet):
+        sys.stdout = open(os.devnull, 'w')
+    if(args.command == 'list'):
+        return CommandList(args)
+    if(args.command == 'capture'):
+        return CommandCapture(args)
+    parser.print_help(sys.__stdout__)
+    return 1
+
+if __name__ == '__main__':
+    sys.exit(main())
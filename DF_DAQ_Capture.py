@@ -0,0 +1,447 @@
+# -*- coding: utf-8 -*-
+"""
+DF_DAQ_Capture - Binary capture files written while a test is running
+
+**Capture File Format (.dfc)**
+All numbers are little endian.
+
+    Offset  Size  Field
+    0       8     Magic, b'DFDAQCAP'
+    8       4     Format version (uint32, currently 1)
+    12      4     Data offset (uint32), size of the header in bytes
+    16      ...   Metadata, UTF-8 JSON padded with NUL bytes up to the data offset
+    offset  ...   Fixed size records, one per sample
+
+The metadata holds the test settings (Firmware, Setup, Units, Display Units,
+Rate, Channels, Start) and 'Record', the NumPy dtype description of one
+record. The default record is:
+
+    Sample      uint64   Sample number since the start of the test
+    Time        int64    Host time the sample was received (nSec since the
+                         start of the test, time.perf_counter_ns)
+    DeviceTime  int64    Firmware millis() of the sample, -1 if not sent
+    Value       float64  Reading in 'Units', as the board sent it
+
+Captures of several boards store one DeviceTime and Value per board (arrays
+of len('Columns')), 'Columns' in the metadata names each one. Their Time is
+the common row time the boards were aligned to.
+
+Value is stored unconverted, 'Units' is 'PSI' for the text stream and
+'Counts' (raw sensor counts, converted with the 'Transfer' metadata, see
+DF_DAQ_Transfer) for the binary stream. CaptureFile.Values re-expresses it in
+any pressure unit, by default the 'Display Units' selected during the test.
+Captures written before this kept the 'Multiplier' applied in Value.
+
+The number of records is never stored, it is (file size - data offset) //
+record size. A capture cut short by a crash is therefore still valid, the torn
+last record is simply ignored. Records can be opened directly with np.memmap
+(see CaptureFile) for O(1) access by sample index or by time.
+
+Samples are appended in batches and the file is fsync'd periodically, so a
+crash or power loss only loses the last SyncInterval seconds. Usage for
+rebuilding an Excel file from a partial capture:
+
+    python DF_DAQ_Capture.py Test-1.dfc [Test-1.xlsx] [Units]
+
+@author: DroidForge Engineering
+"""
+
+import os
+import re
+import sys
+import time
+import json
+import queue
+import struct
+import threading
+import numpy as np
+
+from DF_DAQ_Units import DF_DAQ_Transfer, UNIT_SCALE, ConvertUnits
+from DF_DAQ_Metrics import METRICS
+
+CAPTURE_MAGIC = b'DFDAQCAP'
+CAPTURE_VERSION = 1
+CAPTURE_HEADER_SIZE = 4096
+CAPTURE_RECORD = np.dtype([('Sample', '<u8'), ('Time', '<i8'), ('DeviceTime', '<i8'), ('Value', '<f8')])
+
+#==============================================================================
+# Input Parameters: Columns (Int)
+# Output Returns: Record (NumPy dtype)
+#
+# Description: Record dtype for a capture with the given number of value columns
+#==============================================================================
+def CaptureRecord(Columns = 1):
+    if(Columns == 1):
+        return CAPTURE_RECORD
+    return np.dtype([('Sample', '<u8'), ('Time', '<i8'), ('DeviceTime', '<i8', (Columns,)), ('Value', '<f8', (Columns,))])
+
+#==============================================================================
+# Input Parameters: Record (NumPy dtype)
+# Output Returns: descr (List)
+#
+# Description: Converts a record dtype to and from the JSON form stored in the
+# metadata header.
+#==============================================================================
+def _DtypeToJSON(Record):
+    return [list(field) for field in np.dtype(Record).descr]
+
+def _DtypeFromJSON(descr):
+    fields = []
+    for field in descr:
+        if(len(field) == 2):
+            fields.append((str(field[0]), str(field[1])))
+        else:
+            fields.append((str(field[0]), str(field[1]), tuple(field[2])))
+    return np.dtype(fields)
+
+#==============================================================================
+# Input Parameters: f (File), Info (Dict), Record (NumPy dtype)
+# Output Returns: none
+#
+# Description: Writes the capture header to an open (binary) file
+#==============================================================================
+def WriteHeader(f, Info, Record = CAPTURE_RECORD):
+    Info = dict(Info)
+    Info['Record'] = _DtypeToJSON(Record)
+    meta = json.dumps(Info).encode('utf-8')
+    if(16 + len(meta) > CAPTURE_HEADER_SIZE):
+        raise ValueError('Capture metadata too large for the header')
+
+    f.write(CAPTURE_MAGIC)
+    f.write(struct.pack('<II', CAPTURE_VERSION, CAPTURE_HEADER_SIZE))
+    f.write(meta.ljust(CAPTURE_HEADER_SIZE - 16, b'\x00'))
+
+#==============================================================================
+# Input Parameters: fname (Str)
+# Output Returns: Info (Dict), Record (NumPy dtype), Offset (Int)
+#
+# Description: Reads the capture header
+#==============================================================================
+def ReadHeader(fname):
+    with open(fname, 'rb') as f:
+        if(f.read(8) != CAPTURE_MAGIC):
+            raise ValueError(fname + ' is not a DF-DAQ capture file')
+        version, offset = struct.unpack('<II', f.read(8))
+        if(version > CAPTURE_VERSION):
+            raise ValueError('Capture format version ' + str(version) + ' is newer than this software')
+        Info = json.loads(f.read(offset - 16).rstrip(b'\x00').decode('utf-8'))
+    return Info, _DtypeFromJSON(Info['Record']), offset
+
+#==============================================================================
+# Input Parameters: fname (Str)
+# Output Returns: fname (Str)
+#
+# Description: Next name in a numbered series, Test-3.dfc -> Test-4.dfc and
+# Test.dfc -> Test-1.dfc
+#==============================================================================
+def NextName(fname):
+    root, ext = os.path.splitext(fname)
+    head, sep, tail = root.rpartition('-')
+    if(sep != '' and tail.isdigit()):
+        return head + '-' + str(int(tail) + 1) + ext
+    return root + '-1' + ext
+
+#==============================================================================
+# Input Parameters: fname (Str), Info (Dict), SyncInterval (Float), Record (NumPy
+#                   dtype), Exclusive (Bool)
+# Output Returns: none
+#
+# Description: Writer stage for a running test. Write only queues the batch, the
+# file is written and fsync'd on the writer thread so the GUI never waits on the
+# disk. Info is the test metadata stored in the header. With Exclusive an
+# existing capture is never overwritten, the next free name (NextName) is used
+# instead and fname holds the name written.
+#==============================================================================
+class CaptureWriter(threading.Thread):
+    def __init__(self, fname, Info, SyncInterval = 1.0, Record = CAPTURE_RECORD, Exclusive = False):
+        super(CaptureWriter, self).__init__()
+        self.daemon = True
+        self.fname = fname
+        self.Info = Info
+        self.Record = np.dtype(Record)
+        self.SyncInterval = SyncInterval
+        self.Samples = 0
+        self.Error = None
+        self.__queue = queue.Queue()
+
+        while(True):
+            try:
+                self.__file = open(self.fname, 'xb' if Exclusive else 'wb')
+                break
+            except FileExistsError:
+                self.fname = NextName(self.fname)
+        WriteHeader(self.__file, self.Info, self.Record)
+        self.__sync()
+        self.start()
+
+    def __sync(self):
+        start = time.perf_counter_ns()
+        self.__file.flush()
+        os.fsync(self.__file.fileno())
+        self.__lastSync = time.monotonic()
+        METRICS.Add('Capture Sync', time.perf_counter_ns() - start)
+
+    def run(self):
+        try:
+            while(True):
+                try:
+                    batch = self.__queue.get(timeout = self.SyncInterval)
+                except queue.Empty:
+                    batch = ()
+                if(batch is None):     #Close was called
+                    break
+                if(len(batch) > 0):
+                    start = time.perf_counter_ns()
+                    self.__file.write(batch.tobytes())
+                    self.Samples += len(batch)
+                    METRICS.Add('Capture Write', time.perf_counter_ns() - start)
+                if(time.monotonic() - self.__lastSync >= self.SyncInterval):
+                    self.__sync()
+        except (OSError, ValueError) as e:
+            print ('ERROR - Capture Writer Stopped: ' + str(e))
+            self.Error = str(e)
+        finally:
+            self.__sync()
+            self.__file.close()
+
+#==============================================================================
+# Input Parameters: Columns (Keyword Arrays, one per record field)
+# Output Returns: none
+#
+# Description: Packs a batch of samples into records and queues them to be
+# appended to the capture file. Ex: Write(Sample = x, Value = y)
+#==============================================================================
+    def Write(self, **Columns):
+        n = len(next(iter(Columns.values())))
+        batch = np.zeros(n, dtype = self.Record)
+        for name in Columns:
+            batch[name] = Columns[name]
+        self.__queue.put(batch)
+
+    def Close(self):
+        self.__queue.put(None)
+        self.join()
+
+#==============================================================================
+# Input Parameters: fname (Str)
+# Output Returns: none
+#
+# Description: Read only, memory mapped view of a capture file. Only whole
+# records are mapped, so a partial capture opens like any other. Records[i] is
+# sample i, fields are read from disk only when they are used.
+#==============================================================================
+class CaptureFile():
+    def __init__(self, fname):
+        self.fname = fname
+        self.Info, self.Record, self.Offset = ReadHeader(fname)
+        self.Rate = float(self.Info['Rate'])
+
+        count = (os.path.getsize(fname) - self.Offset) // self.Record.itemsize
+        if(count > 0):
+            self.Records = np.memmap(fname, dtype = self.Record, mode = 'r', offset = self.Offset, shape = (count,))
+        else:
+            self.Records = np.zeros(0, dtype = self.Record)
+
+    def __len__(self):
+        return len(self.Records)
+
+    def __getitem__(self, i):
+        return self.Records[i]
+
+#==============================================================================
+# Input Parameters: t (Float, Seconds)
+# Output Returns: i (Int)
+#
+# Description: Index of the first sample received at or after time t (seconds
+# since the start of the test). The nominal rate gives a first guess and the 
+# recorded times are only searched in a small window around it that is widened
+# until it brackets t, so this stays O(1) unless the run had large gaps.
+#==============================================================================
+    def IndexAtTime(self, t):
+        n = len(self.Records)
+        if(n == 0):
+            raise IndexError('Capture is empty')
+        if('Time' not in self.Record.names):   #Only the nominal rate is known
+            i = int(round(t * self.Rate)) - int(self.Records['Sample'][0])
+            return min(max(i, 0), n - 1)
+
+        Times = self.Records['Time']
+        target = int(t * 1e9)
+        guess = min(max(int(t * self.Rate), 0), n - 1)
+        window = 64
+        while(True):
+            lo = max(guess - window, 0)
+            hi = min(guess + window, n)
+            if((lo == 0 or Times[lo] < target) and (hi == n or Times[hi - 1] >= target)):
+                break
+            window *= 4
+        return min(lo + int(np.searchsorted(Times[lo:hi], target)), n - 1)
+
+    def AtTime(self, t):
+        return self.Records[self.IndexAtTime(t)]
+
+#==============================================================================
+# Input Parameters: Start (Int), Stop (Int)
+# Output Returns: Time (NumPy Array, Seconds)
+#
+# Description: Time of every sample (or of samples Start to Stop), from the 
+# recorded host times when the capture has them, otherwise from the nominal
+# rate.
+#==============================================================================
+    def Time(self, Start = 0, Stop = None):
+        if('Time' in self.Record.names):
+            return self.Records['Time'][Start:Stop] / 1e9
+        return self.Records['Sample'][Start:Stop] / self.Rate
+
+#==============================================================================
+# Input Parameters: Units (Str), Start (Int), Stop (Int)
+# Output Returns: Values (NumPy Array)
+#
+# Description: Every Value (or those of samples Start to Stop, so a capture 
+# larger than memory can be read in pieces) converted to Units (default 
+# 'Display Units'), raw counts go through the capture's transfer function.
+# Units that are not a pressure unit are returned as stored.
+#==============================================================================
+    def Values(self, Units = None, Start = 0, Stop = None):
+        Stored = self.Info.get('Units', '')
+        if(Units == None):
+            Units = self.Info.get('Display Units', Stored)
+        Value = np.asarray(self.Records['Value'][Start:Stop])
+        if(Units not in UNIT_SCALE):
+            return Value
+        if(Stored == 'Counts'):
+            return DF_DAQ_Transfer(**self.Info.get('Transfer', {})).ToUnits(Value, Units)
+        if(Stored in UNIT_SCALE):
+            return ConvertUnits(Value, Stored, Units)
+        return Value
+
+#==============================================================================
+# Input Parameters: CaptureName (Str), GapFactor (Float)
+# Output Returns: Report (Dict)
+#
+# Description: Timing summary of a run from the recorded sample times: the 
+# effective rate, the jitter (how far each sample interval is from the nominal
+# period) percentiles, and the number and length of gaps (intervals longer 
+# than GapFactor periods). Gaps are also counted from the device times when the
+# firmware sent them, those show samples the device took but the host never 
+# received.
+#==============================================================================
+def TimingReport(CaptureName, GapFactor = 2.0):
+    cap = CaptureFile(CaptureName)
+    Report = {'Samples' : len(cap)}
+    if(len(cap) < 2 or 'Time' not in cap.Record.names):
+        return Report
+
+    Period = 1e9 / cap.Rate     #nSec
+    Times = np.asarray(cap.Records['Time'])
+    dt = np.diff(Times)
+    Duration = (Times[-1] - Times[0]) / 1e9
+    Jitter = np.abs(dt - Period) / 1e6
+    Gaps = dt[dt > GapFactor * Period]
+
+    Report['Duration (sec)'] = round(Duration, 3)
+    Report['Effective Rate (Hz)'] = round((len(Times) - 1) / Duration, 3) if (Duration > 0) else 0.0
+    for Percent in [50, 90, 99]:
+        Report['Jitter p' + str(Percent) + ' (ms)'] = round(float(np.percentile(Jitter, Percent)), 3)
+    Report['Jitter Max (ms)'] = round(float(Jitter.max()), 3)
+    Report['Gaps'] = len(Gaps)
+    Report['Longest Gap (sec)'] = round(float(Gaps.max()) / 1e9, 3) if (len(Gaps) > 0) else 0.0
+    Report['Gap Time (sec)'] = round(float(Gaps.sum()) / 1e9, 3)
+
+    DeviceTime = np.asarray(cap.Records['DeviceTime']).reshape(len(cap), -1)
+    if(np.all(DeviceTime >= 0)):
+        ddt = np.diff(DeviceTime, axis = 0)
+        Report['Device Gaps'] = int(np.sum(ddt > GapFactor * Period / 1e6))
+        Report['Longest Device Gap (sec)'] = round(float(ddt.max()) / 1e3, 3)
+    return Report
+
+#==============================================================================
+# Input Parameters: CaptureName (Str), ExcelName (Str), Units (Str)
+# Output Returns: none
+#
+# Description: Builds the Excel file (same layout the live tab has always
+# written, plus one pressure column per board) from a capture file. Units 
+# defaults to the units selected during the test.
+#==============================================================================
+def ExportExcel(CaptureName, ExcelName, Units = None):
+    import pandas as pd
+
+    cap = CaptureFile(CaptureName)
+    if(Units == None):
+        Units = cap.Info.get('Display Units', cap.Info.get('Units', ''))
+    pressureHeading = 'Pressure (' + Units + ')'
+    Value = cap.Values(Units)
+    data = {'Time (sec)':cap.Time()}
+    if(Value.ndim == 1):
+        data[pressureHeading] = Value
+    else:   #One column per board
+        for i in range(0, Value.shape[1]):
+            data[pressureHeading + ' ' + str(cap.Info['Columns'][i])] = Value[:, i]
+    pd.DataFrame(data=data).to_excel(str(ExcelName))
+
+#==============================================================================
+# Input Parameters: ExcelName (Str), CaptureName (Str), Info (Dict)
+# Output Returns: none
+#
+# Description: Converts an Excel file in the live tab layout (Time (sec), then
+# Pressure (Units) or one Pressure (Units) Column per board, as ExportExcel
+# writes it) into a capture file. The values are stored in the units of the
+# headings, which are also the Display Units. Rate and Units are taken from
+# the sheet unless they are given in Info. Raises ValueError for a sheet that
+# is not in this layout.
+#==============================================================================
+def ImportExcel(ExcelName, CaptureName, Info = {}):
+    import pandas as pd
+
+    df = pd.read_excel(ExcelName, sheet_name = 'Sheet1', index_col = 0)
+    if('Time (sec)' not in df.columns):
+        raise ValueError(str(ExcelName) + ' has no Time (sec) column')
+    Time = df['Time (sec)'].values
+    Headings = [str(name) for name in df.columns if name != 'Time (sec)']
+    Matches = [re.match(r'Pressure \(([^)]*)\)(?: (.+))?$', Heading) for Heading in Headings]
+    if(len(Headings) == 0 or None in Matches):
+        raise ValueError(str(ExcelName) + ' is not in the Time (sec), Pressure (Units) layout')
+    Units = set([Match.group(1) for Match in Matches])
+    if(len(Units) != 1):
+        raise ValueError(str(ExcelName) + ' has columns in different units (' + ', '.join(sorted(Units)) + ')')
+    Columns = [Match.group(2) for Match in Matches]
+    if(len(Columns) > 1 and None in Columns):
+        raise ValueError(str(ExcelName) + ' has a pressure column without a board name')
+
+    Info = dict(Info)
+    if('Rate' not in Info):
+        Info['Rate'] = (1.0 / np.median(np.diff(Time))) if (len(Time) > 1) else 1.0
+    if('Units' not in Info):
+        Info['Units'] = Units.pop()
+    Info.setdefault('Display Units', Info['Units'])
+    if(len(Columns) > 1):
+        Info['Columns'] = Columns
+
+    Record = CaptureRecord(len(Columns))
+    records = np.zeros(len(df), dtype = Record)
+    records['Sample'] = np.arange(len(df))
+    records['Time'] = np.round(Time * 1e9)
+    records['DeviceTime'] = -1
+    records['Value'] = df[Headings].values.reshape(records['Value'].shape)
+    with open(CaptureName, 'wb') as f:
+        WriteHeader(f, Info, Record)
+        f.write(records.tobytes())
+
+#==============================================================================
+# Input Parameters: CaptureName (Str), ExcelName (Str), Units (Str)
+# Output Returns: ExcelName (Str)
+#
+# Description: Recovery tool, rebuilds the Excel file from a partial capture
+# left behind by a crash.
+#==============================================================================
+def RecoverCapture(CaptureName, ExcelName = None, Units = None):
+    if(ExcelName == None):
+        ExcelName = os.path.splitext(CaptureName)[0] + '-Recovered.xlsx'
+    ExportExcel(CaptureName, ExcelName, Units)
+    return ExcelName
+
+if __name__ == '__main__':
+    if(len(sys.argv) < 2):
+        print (__doc__)
+        sys.exit(1)
+    print ('Recovered: ' + RecoverCapture(*sys.argv[1:4]))
@@ -0,0 +1,280 @@
+# -*- coding: utf-8 -*-
+"""
+DF_DAQ_Columns - Column store for the data files the plotter imports
+
+Reading a large workbook takes far longer than plotting it, so a workbook is
+only read the first time it is opened. Sheet1 is streamed row by row
+(openpyxl read only mode, never the whole sheet in memory) into a folder in
+COLUMN_CACHE, one per source path:
+
+    Info.json    Names, Rows, XName and the source's path, size and
+                 modification time
+    X.f8         x of every row (float64), only for sheets with a time column
+    <i>.f8       column i (float64), NaN for empty or text cells
+
+Every later open of the same, unchanged file maps those files with np.memmap,
+so opening is instant and only the columns and rows that are plotted are ever
+read from disk. Editing or replacing the source file makes the cached copy
+stale, it is rebuilt on the next open. Capture files (.dfc, see
+DF_DAQ_Capture) are already memory mapped and are read directly.
+
+Sheets in the live tab layout (an index column, 'Time (sec)' and one pressure
+column per board) are plotted against time. Any other sheet is plotted by
+row, one line per column, like the 64 channel MUX workbooks.
+
+@author: DroidForge Engineering
+"""
+
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
+
+from DF_DAQ_Buffers import EnvelopeBlocks, EnvelopeBlock
+from DF_DAQ_Units import UNIT_SCALE
+
+COLUMN_CACHE = os.path.join(os.path.expanduser('~'), '.DF_DAQ_Cache')
+COLUMN_CACHE_VERSION = 2
+CHUNK_ROWS = 65536      #Rows converted or summarised at a time
+TIME_COLUMN = 'Time (sec)'
+
+#==============================================================================
+# Input Parameters: fname (Str), CacheDir (Str)
+# Output Returns: Cache folder name (Str)
+#==============================================================================
+def CacheName(fname, CacheDir = COLUMN_CACHE):
+    key = hashlib.sha1(os.path.abspath(fname).encode('utf-8')).hexdigest()
+    return os.path.join(CacheDir, key[:20])
+
+def _SourceKey(fname):
+    stat = os.stat(fname)
+    return {'Version' : COLUMN_CACHE_VERSION, 'Source' : os.path.abspath(fname), 'Size' : stat.st_size, 'MTime' : stat.st_mtime_ns}
+
+def _ToFloat(cells):
+    try:
+        return np.array(cells, dtype = np.float64)     #Empty cells (None) become NaN
+    except (TypeError, ValueError):
+        Values = np.full(len(cells), np.nan)
+        for i in range(0, len(cells)):
+            try:
+                Values[i] = float(cells[i])
+            except (TypeError, ValueError):
+                pass        #Text cell
+        return Values
+
+#==============================================================================
+# Input Parameters: Header (List, first row of the sheet)
+# Output Returns: xColumn (Int, None to plot by row), Columns (List of Int),
+#                 Names (List of Str)
+#
+# Description: Which sheet columns are x and which are lines, see the module
+# description.
+#==============================================================================
+def SheetLayout(Header):
+    Header = [None if (name == None or str(name).strip() == '') else str(name) for name in Header]
+    if(TIME_COLUMN in Header):
+        xColumn = Header.index(TIME_COLUMN)
+        Columns = [i for i in range(0, len(Header)) if (i != xColumn and Header[i] != None)]
+        return xColumn, Columns, [Header[i] for i in Columns]
+    return None, list(range(0, len(Header))), [name if (name != None) else 'Column ' + str(i + 1) for i, name in enumerate(Header)]
+
+#==============================================================================
+# Input Parameters: fname (Str), Path (Str)
+# Output Returns: none
+#
+# Description: Converts Sheet1 of a workbook into the column files in Path,
+# CHUNK_ROWS rows at a time. Info.json is only written once every column is,
+# a folder without it is an unfinished conversion.
+#==============================================================================
+def ConvertSheet(fname, Path):
+    import openpyxl     #Only needed when a file is not cached yet
+
+    Key = _SourceKey(fname)
+    if(os.path.isdir(Path)):
+        shutil.rmtree(Path)
+    os.makedirs(Path)
+    book = openpyxl.load_workbook(fname, read_only = True, data_only = True)
+    try:
+        rows = book['Sheet1'].iter_rows(values_only = True)
+        xColumn, Columns, Names = SheetLayout(list(next(rows, [])))
+        files = [('X.f8', xColumn)] if (xColumn != None) else []
+        files += [(str(i) + '.f8', Columns[i]) for i in range(0, len(Columns))]
+
+        Rows = 0
+        while(True):
+            chunk = [row for row, _ in zip(rows, range(0, CHUNK_ROWS))]
+            if(len(chunk) == 0):
+                break
+            for name, column in files:
+                with open(os.path.join(Path, name), 'ab') as f:
+                    f.write(_ToFloat([row[column] if (column < len(row)) else None for row in chunk]).tobytes())
+            Rows += len(chunk)
+    finally:
+        book.close()
+
+    Info = dict(Key, Names = Names, Rows = Rows, XName = TIME_COLUMN if (xColumn != None) else 'Row')
+    with open(os.path.join(Path, 'Info.json'), 'w') as f:
+        json.dump(Info, f, indent = 1)
+
+#==============================================================================
+# Input Parameters: Path (Str)
+# Output Returns: none
+#
+# Description: Read only, memory mapped view of a converted sheet. Names, XName
+# (what x is) and len (rows) come from Info.json, the data is only read by
+# Read.
+#==============================================================================
+class ColumnFile():
+    def __init__(self, Path):
+        self.Path = Path
+        with open(os.path.join(Path, 'Info.json'), 'r') as f:
+            self.Info = json.load(f)
+        self.Names = self.Info['Names']
+        self.XName = self.Info['XName']
+        self.Rows = int(self.Info['Rows'])
+        self.X = self.__map('X.f8') if (self.XName != 'Row') else None
+        self.__columns = {}
+
+    def __len__(self):
+        return self.Rows
+
+    def __map(self, name):
+        if(self.Rows == 0):
+            return np.zeros(0)
+        return np.memmap(os.path.join(self.Path, name), dtype = np.float64, mode = 'r', shape = (self.Rows,))
+
+    def Column(self, i):
+        if(i not in self.__columns):
+            self.__columns[i] = self.__map(str(i) + '.f8')
+        return self.__columns[i]
+
+#==============================================================================
+# Input Parameters: x (Float)
+# Output Returns: Row (Int)
+#
+# Description: First row at or after x, x is assumed to be increasing
+#==============================================================================
+    def IndexAt(self, x):
+        if(self.X is None):
+            return min(max(int(np.ceil(x)), 0), self.Rows)
+        return int(np.searchsorted(self.X, x))
+
+#==============================================================================
+# Input Parameters: Columns (List of Int), Start (Int), Stop (Int)
+# Output Returns: x (NumPy Array), y (NumPy Array, Columns x Rows)
+#==============================================================================
+    def Read(self, Columns, Start = 0, Stop = None):
+        Start, Stop, _ = slice(Start, Stop).indices(self.Rows)
+        x = np.arange(Start, Stop) if (self.X is None) else np.asarray(self.X[Start:Stop])
+        y = np.empty((len(Columns), len(x)))
+        for i in range(0, len(Columns)):
+            y[i] = self.Column(Columns[i])[Start:Stop]
+        return x, y
+
+#==============================================================================
+# Input Parameters: fname (Str), Units (Str)
+# Output Returns: none
+#
+# Description: The ColumnFile interface on a capture file, one column per
+# board plotted against time in Units (the capture's 'Display Units' unless
+# Units is a pressure unit).
+#==============================================================================
+class CaptureColumns():
+    def __init__(self, fname, Units = None):
+        from DF_DAQ_Capture import CaptureFile
+
+        self.Capture = CaptureFile(fname)
+        Info = self.Capture.Info
+        self.Units = Units if (Units in UNIT_SCALE) else Info.get('Display Units', Info.get('Units', ''))
+        self.Rows = len(self.Capture)
+        self.XName = TIME_COLUMN
+        Boards = Info.get('Columns', [])
+        if(self.Capture.Record['Value'].shape == ()):
+            self.Names = ['Pressure (' + self.Units + ')']
+        else:
+            self.Names = ['Pressure (' + self.Units + ') ' + str(Board) for Board in Boards]
+
+    def __len__(self):
+        return self.Rows
+
+    def IndexAt(self, x):
+        if(self.Rows == 0):
+            return 0
+        i = self.Capture.IndexAtTime(x)
+        return i + 1 if (self.Capture.Time(i, i + 1)[0] < x) else i
+
+    def Read(self, Columns, Start = 0, Stop = None):
+        Start, Stop, _ = slice(Start, Stop).indices(self.Rows)
+        Values = self.Capture.Values(self.Units, Start, Stop).reshape(Stop - Start, -1)
+        return self.Capture.Time(Start, Stop), Values[:, Columns].T
+
+#==============================================================================
+# Input Parameters: fname (Str), CacheDir (Str), Units (Str, capture files only)
+# Output Returns: Columns (ColumnFile or CaptureColumns)
+#
+# Description: Opens a workbook (converted the first time, see ConvertSheet)
+# or a capture file for plotting.
+#==============================================================================
+def OpenColumns(fname, CacheDir = COLUMN_CACHE, Units = None):
+    if(fname.lower().endswith('.dfc')):
+        return CaptureColumns(fname, Units)
+
+    Path = CacheName(fname, CacheDir)
+    try:
+        Cached = ColumnFile(Path)
+        if(all([Cached.Info.get(name) == value for name, value in _SourceKey(fname).items()])):
+            print ('Columns Loaded from Cache: ' + Path)
+            return Cached
+    except (OSError, ValueError, KeyError):
+        pass        #Not converted yet, or the conversion did not finish
+    print ('Converting ' + fname + ' to ' + Path)
+    ConvertSheet(fname, Path)
+    return ColumnFile(Path)
+
+#==============================================================================
+# Input Parameters: Source (ColumnFile or CaptureColumns), Columns (List of Int),
+#                   MaxPoints (Int), Start (Int), Stop (Int)
+# Output Returns: x (NumPy Array), y (NumPy Array, Columns x Points)
+#
+# Description: Min/max envelope (see EnvelopeBlocks) of rows Start to Stop of
+# the given columns with at most MaxPoints points. The rows are read
+# CHUNK_ROWS at a time, so memory use does not depend on the file size.
+#==============================================================================
+def ColumnEnvelope(Source, Columns, MaxPoints, Start = 0, Stop = None):
+    Start, Stop, _ = slice(Start, Stop).indices(len(Source))
+    Block = EnvelopeBlock(Stop - Start, MaxPoints) if (Stop - Start > MaxPoints) else 1
+    Chunk = Block * max(CHUNK_ROWS // Block, 1)
+    xParts = []
+    yParts = []
+    for first in range(Start, Stop, Chunk):
+        x, y = Source.Read(Columns, first, min(first + Chunk, Stop))
+        if(Block > 1):
+            x, y = EnvelopeBlocks(x, y, Block)
+        xParts.append(x)
+        yParts.append(y)
+    if(len(xParts) == 0):
+        return np.zeros(0), np.zeros((len(Columns), 0))
+    return np.concatenate(xParts), np.concatenate(yParts, axis = 1)
+
+#==============================================================================
+# Input Parameters: Text (Str), Count (Int)
+# Output Returns: Columns (List of Int, 0 based)
+#
+# Description: Parses a column selection like '1-16, 33' (1 based, as the
+# columns are numbered in the legend). Empty or 'All' selects every column.
+# Raises ValueError for anything else.
+#==============================================================================
+def ParseColumns(Text, Count):
+    Text = Text.strip()
+    if(Text == '' or Text.lower() == 'all'):
+        return list(range(0, Count))
+    Columns = []
+    for part in Text.split(','):
+        bounds = part.split('-')
+        first, last = int(bounds[0]), int(bounds[-1])
+        if(len(bounds) > 2 or first < 1 or last > Count or first > last):
+            raise ValueError('Columns ' + part.strip() + ' are not between 1 and ' + str(Count))
+        Columns += [i for i in range(first - 1, last) if i not in Columns]
+    return Columns
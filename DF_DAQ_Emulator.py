@@ -0,0 +1,274 @@
+# -*- coding: utf-8 -*-
+"""
+DF_DAQ_Emulator - Python emulation of the pressureSensorLogger firmware, for
+checking the host code without a board
+
+@author: DroidForge Engineering
+"""
+
+import collections
+import os
+import time
+
+import numpy as np
+
+from DF_DAQ_HW_Interface import FRAME_SYNC, FRAME_HEADER, SupportsLiveCommands, SendsMillis, SetupChannels
+from DF_DAQ_Units import DF_DAQ_Transfer, TRANSFER_FUNCTIONS, COUNT_FAILED
+
+FRAME_SAMPLES = 8       #Samples per frame, FRAME_SAMPLES in pressureSensorLogger.ino
+
+#==============================================================================
+# Input Parameters: PSI (Array like), Transfer (DF_DAQ_Transfer)
+# Output Returns: Counts (NumPy Array)
+#
+# Description: Inverse of DF_DAQ_Transfer.ToUnits, the counts the sensor would
+# report for a pressure. NaN becomes a failed read (COUNT_FAILED).
+#==============================================================================
+def PSIToCounts(PSI, Transfer = DF_DAQ_Transfer()):
+    CountMin, CountMax = np.array([TRANSFER_FUNCTIONS[F] for F in np.atleast_1d(Transfer.Function)], dtype = np.float64).T
+    if(np.ndim(Transfer.Function) == 0):
+        CountMin, CountMax = CountMin[0], CountMax[0]
+    PSI = np.asarray(PSI, dtype = np.float64)
+    Counts = (PSI - Transfer.PSIMin) * ((CountMax - CountMin) / (np.asarray(Transfer.PSIMax) - Transfer.PSIMin)) + CountMin + Transfer.Offset
+    Counts = np.clip(np.round(np.nan_to_num(Counts, nan = COUNT_FAILED)), 0, COUNT_FAILED)
+    return np.where(np.isnan(PSI), COUNT_FAILED, Counts).astype(np.uint32)
+
+#==============================================================================
+# Input Parameters: Counts (Array like, Samples or Samples x Channels), Millis (Array like),
+#                   Seq (Int), Samples (Int)
+# Output Returns: Frames (Bytes)
+#
+# Description: Packs samples into binary stream frames byte for byte the way the
+# firmware's addFrameSample does. Millis is the device time of every sample,
+# each frame carries the time of its first sample. Seq is the sequence number
+# of the first frame, it wraps at 16 bits. Samples that do not fill a whole
+# frame are not sent, the same as the firmware.
+#==============================================================================
+def EncodeFrames(Counts, Millis, Seq = 0, Samples = FRAME_SAMPLES):
+    Counts = np.asarray(Counts, dtype = np.uint32)
+    if(Counts.ndim == 1):
+        Counts = Counts.reshape(-1, 1)
+    Channels = Counts.shape[1]
+    nFrames = len(Counts) // Samples
+    Counts = Counts[:nFrames * Samples]
+    Millis = np.asarray(Millis, dtype = np.uint32)[0:nFrames * Samples:Samples]
+
+    L = FRAME_HEADER + 3 * Samples * Channels + 1
+    frames = np.zeros((nFrames, L), dtype = np.uint8)
+    frames[:, 0] = FRAME_SYNC[0]
+    frames[:, 1] = FRAME_SYNC[1]
+    seq = (Seq + np.arange(nFrames)) & 0xFFFF
+    frames[:, 2] = seq & 0xFF
+    frames[:, 3] = seq >> 8
+    frames[:, 4:8] = Millis.astype('<u4').view(np.uint8).reshape(nFrames, 4)
+    frames[:, 8] = Channels
+    frames[:, 9] = Samples
+    raw = Counts.reshape(nFrames, Samples * Channels)
+    for b in range(0, 3):
+        frames[:, FRAME_HEADER + b:L - 1:3] = (raw >> (8 * b)) & 0xFF
+    frames[:, L - 1] = frames[:, 2:L - 1].sum(axis = 1, dtype = np.uint32) & 0xFF
+    return frames.tobytes()
+
+#==============================================================================
+# Input Parameters: Values (Array like, Samples or Samples x Channels), 
+#                   Millis (Array like), DeviceTime (Bool, False for firmware
+#                   before 0.0.2)
+# Output Returns: Lines (Bytes)
+#
+# Description: The text stream ('s' command), one 'value,millis' line per
+# sample ('value,...,value,millis' with several channels) printed with 4 
+# decimals like Serial.print(pressure_psi, 4). Without DeviceTime the lines
+# end after the values ('value,').
+#==============================================================================
+def EncodeText(Values, Millis, DeviceTime = True):
+    Values = np.asarray(Values, dtype = np.float64).reshape(len(Millis), -1)
+    if(not(DeviceTime)):
+        return b''.join([b','.join([b'%.4f' % Value for Value in Row]) + b',\r\n' for Row in Values.tolist()])
+    return b''.join([b','.join([b'%.4f' % Value for Value in Row]) + b',%d\r\n' % Milli for Row, Milli in zip(Values.tolist(), Millis)])
+
+#==============================================================================
+# Input Parameters: Version (Str), Setup (Str), Pressure (Function of device 
+#                   time in Sec, returns PSI for every channel or one for all),
+#                   Period (Int, mSec), Noise (Float, PSI), Latency (Float, Sec)
+# Output Returns: none
+#
+# Description: Fake pressureSensorLogger board on a pseudo terminal (POSIX 
+# only). Port is the device name to open with pyserial like a real board. The 
+# command set, the text and binary streams, the sample timing (one sample every
+# period + 1 mSec) and the commands that work while streaming ('s', 'b', 'p',
+# 'z' and 'h', from Version 0.0.4 also 'o' and 'u' with '#' tagged replies) all
+# follow pressureSensorLogger.ino, before Version 0.0.2 the text lines have no
+# millis. Period is the sample period the board starts with (the 'o' command
+# changes it), Noise the standard deviation of the random noise added to every
+# reading and Latency how long everything the board sends takes to reach the
+# port, like the USB link of a real board. 
+# HostNs gives the host time (time.perf_counter_ns) of a device time, for
+# measuring the latency of the host side. The board has the number of channels
+# in its Setup (SetupChannels), by default each one a sine of its own phase. 
+# Close stops the device.
+#==============================================================================
+class FakeDevice():
+    def __init__(self, Version = '0.0.4', Setup = 'P-PSI-1-50-10', Pressure = None, Period = 500, Noise = 0.0, Latency = 0.0):
+        import pty
+        import threading
+        import tty
+
+        self.Version = Version
+        self.Setup = Setup
+        self.Channels = SetupChannels(Setup)
+        Phase = 2 * np.pi * np.arange(self.Channels) / self.Channels
+        self.Pressure = Pressure if (Pressure != None) else (lambda t: 0.5 + 0.1 * np.sin(2 * np.pi * t + Phase))
+        self.Noise = Noise
+        self.Latency = Latency
+        self.Period = Period
+        self.Units = 'PSI'
+        self.Zero = np.zeros(self.Channels)
+        self.Running = False
+        self.Binary = False
+        self.Sent = 0               #Samples streamed
+        self.__frame = []
+        self.__seq = 0
+        self.__out = collections.deque()     #(Due, Bytes) waiting out the latency
+        self.__random = np.random.RandomState()
+
+        self.__master, self.__slave = pty.openpty()
+        tty.setraw(self.__master)
+        tty.setraw(self.__slave)
+        self.Port = os.ttyname(self.__slave)
+        self.__t0 = time.perf_counter_ns()
+        self.__lock = threading.Lock()
+        self.__stop = threading.Event()
+        self.__threads = [threading.Thread(target = self.__commands, daemon = True),
+                          threading.Thread(target = self.__stream, daemon = True),
+                          threading.Thread(target = self.__deliver, daemon = True)]
+        for thread in self.__threads:
+            thread.start()
+
+    def millis(self):
+        return (time.perf_counter_ns() - self.__t0) // 1000000
+
+    def HostNs(self, Millis):
+        return self.__t0 + np.asarray(Millis, dtype = np.int64) * 1000000
+
+    def __write(self, data):
+        if(self.Latency > 0):
+            self.__out.append((time.perf_counter() + self.Latency, data))
+            return
+        try:
+            os.write(self.__master, data)
+        except OSError:
+            pass        #Port closed
+
+    def __deliver(self):
+        while(not(self.__stop.is_set())):
+            if(len(self.__out) == 0 or self.__out[0][0] > time.perf_counter()):
+                self.__stop.wait(0.0005)
+                continue
+            try:
+                os.write(self.__master, self.__out.popleft()[1])
+            except OSError:
+                pass
+
+    def __println(self, text):
+        self.__write(str(text).encode('latin_1') + b'\r\n')
+
+    def __read(self):
+        try:
+            return os.read(self.__master, 256)
+        except OSError:
+            return b''
+
+    def __pressure(self):
+        return np.broadcast_to(self.Pressure(self.millis() / 1000.0), (self.Channels,)).astype(np.float64)
+
+    def __reading(self):
+        #One value per channel
+        Noise = self.__random.normal(0, self.Noise, self.Channels) if (self.Noise > 0) else 0.0
+        return self.__pressure() + Noise - self.Zero
+
+    def __commands(self):
+        from DF_DAQ_Units import UNIT_SCALE
+        
+        Units = list(UNIT_SCALE.keys())
+        Live = SupportsLiveCommands(self.Version)
+        data = b''
+        while(not(self.__stop.is_set())):
+            if(len(data) == 0):
+                data = self.__read()
+                if(len(data) == 0):
+                    self.__stop.wait(0.01)
+                    continue
+            command, data = data[:1], data[1:]
+            with self.__lock:
+                if(command == b's'):
+                    self.Running, self.Binary = True, False
+                elif(command == b'b'):
+                    self.Running, self.Binary = True, True
+                    self.__frame = []
+                    self.__seq = 0
+                elif(command == b'p'):
+                    self.Running, self.Binary = False, False
+                elif(command == b'z'):
+                    self.Zero = self.__pressure()
+                    if(self.Running and Live):
+                        self.__println('#z')
+                elif(command in (b'h', b'?')):
+                    self.Running = False
+                    self.__println('DF_pressureSensorLogger v' + self.Version)
+                Tag = '#' + command.decode('latin_1') if (self.Running) else ''
+                if(self.Running and not(Live and command in (b'o', b'u'))):
+                    continue
+                if(command == b'i'):
+                    self.__println('DF_pressureSensorLogger')
+                elif(command == b'x'):
+                    self.__println(self.Setup)
+                elif(command == b'v'):
+                    self.__println(self.Version)
+                elif(command == b't'):
+                    self.__println('MPRSS0001PG00001C')
+                elif(command == b'r'):
+                    self.__println(','.join(['%.4f' % Value for Value in self.__reading() * UNIT_SCALE[self.Units]]))
+                elif(command == b'o'):
+                    while(b'\n' not in data and not(self.__stop.is_set())):
+                        data += self.__read()
+                    digits, data = data.split(b'\n', 1) if (b'\n' in data) else (data, b'')
+                    digits = b''.join([bytes([c]) for c in digits if (48 <= c <= 57)])
+                    if(len(digits) > 0 and 0 < int(digits) < 60000):
+                        self.Period = int(digits)
+                    self.__println(Tag + str(self.Period))
+                elif(command == b'u'):
+                    if(len(data) > 0 and 0 <= data[0] - 48 < len(Units)):
+                        self.Units = Units[data[0] - 48]
+                        data = data[1:]
+                    self.__println(Tag + self.Units)
+
+    def __stream(self):
+        from DF_DAQ_Units import UNIT_SCALE
+        
+        last = self.millis()
+        while(not(self.__stop.is_set())):
+            now = self.millis()
+            if(now - last <= self.Period):
+                self.__stop.wait(min(max(self.Period + 1 - (now - last), 0.5), 5) / 1000.0)   #Short waits so a new period applies at once
+                continue
+            last = now
+            with self.__lock:
+                if(not(self.Running)):
+                    continue
+                self.Sent += 1
+                if(not(self.Binary)):
+                    self.__write(EncodeText(self.__reading() * UNIT_SCALE[self.Units], [now], SendsMillis(self.Version)))
+                    continue
+                self.__frame.append((self.__reading(), now))
+                if(len(self.__frame) == FRAME_SAMPLES):
+                    Counts = PSIToCounts([sample[0] for sample in self.__frame])
+                    self.__write(EncodeFrames(Counts, [sample[1] for sample in self.__frame], self.__seq))
+                    self.__seq += 1
+                    self.__frame = []
+
+    def Close(self):
+        self.__stop.set()
+        for thread in self.__threads:
+            thread.join(1.0)
+        os.close(self.__master)
+        os.close(self.__slave)
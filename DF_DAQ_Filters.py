@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+"""
+DF_DAQ_Filters - Filters for the live samples, applied per batch
+
+Every filter takes a batch of samples (x, the sample numbers, and y, Rows x
+Columns) and returns the filtered batch. Its state is carried over to the next
+batch, so filtering a run batch by batch gives the same result (to rounding)
+as filtering it in one go, whatever the batch sizes. Each batch is processed
+with whole array NumPy operations, never per sample:
+
+    Filters = ParseFilters('avg 8, lowpass 2, decimate 4', Rate = 200)
+    x, y = Filters.Process(x, y)
+
+    avg N        moving average of the last N samples
+    lowpass F    first order IIR low-pass, cutoff F Hz
+    decimate N   average of every N samples, one sample out per N in
+
+The GUI filters the samples it plots, the capture file always gets the raw
+samples, so the data can be filtered differently afterwards.
+
+@author: DroidForge Engineering
+"""
+
+import numpy as np
+
+IIR_BLOCK = 64      #Samples solved at once by DF_DAQ_LowPass
+
+#==============================================================================
+# Input Parameters: y (NumPy Array, Rows x Columns), Last (NumPy Array, last
+#                   good value of every column)
+# Output Returns: y (NumPy Array), Last (NumPy Array)
+#
+# Description: Failed reads (NaN) hold the last good value of their column, so
+# one failed read does not blank a whole window of filtered samples.
+#==============================================================================
+def HoldFailed(y, Last):
+    Failed = np.isnan(y)
+    if(Failed.any()):
+        y = np.concatenate((Last[None, :], y))
+        index = np.where(np.isnan(y), 0, np.arange(len(y))[:, None])
+        np.maximum.accumulate(index, axis = 0, out = index)
+        y = y[index, np.arange(y.shape[1])][1:]
+    return y, y[-1] if (len(y) > 0) else Last
+
+#==============================================================================
+# Input Parameters: N (Int, samples)
+# Output Returns: none
+#
+# Description: Moving average of the last N samples. The first N - 1 samples of
+# a run are averaged over the samples there are so far.
+#==============================================================================
+class DF_DAQ_MovingAverage():
+    def __init__(self, N):
+        if(int(N) < 1):
+            raise ValueError('avg needs at least 1 sample')
+        self.N = int(N)
+        self.Reset()
+
+    def Reset(self):
+        self.__tail = None      #Last N - 1 samples
+
+    def Process(self, x, y):
+        if(self.__tail is None):
+            self.__tail = np.zeros((0, y.shape[1]))
+        data = np.concatenate((self.__tail, y))
+        total = np.concatenate((np.zeros((1, y.shape[1])), np.cumsum(data, axis = 0)))
+        end = np.arange(len(self.__tail), len(data)) + 1
+        start = np.maximum(end - self.N, 0)
+        y = (total[end] - total[start]) / (end - start)[:, None]
+        self.__tail = data[max(len(data) - self.N + 1, 0):] if (self.N > 1) else data[:0]
+        return x, y
+
+    def __str__(self):
+        return 'avg ' + str(self.N)
+
+#==============================================================================
+# Input Parameters: Cutoff (Float, Hz), Rate (Float, samples per second)
+# Output Returns: none
+#
+# Description: First order IIR low-pass, y[n] = y[n-1] + a * (x[n] - y[n-1]).
+# The recursion is solved IIR_BLOCK samples at a time as a matrix product with
+# the filter's impulse response, which is exact and keeps the work in NumPy.
+# The filter starts at the first sample of a run instead of at 0.
+#==============================================================================
+class DF_DAQ_LowPass():
+    def __init__(self, Cutoff, Rate):
+        if(not(0 < float(Cutoff) < float(Rate) / 2)):
+            raise ValueError('lowpass cutoff has to be between 0 and ' + str(float(Rate) / 2) + ' Hz')
+        self.Cutoff = float(Cutoff)
+        self.Rate = float(Rate)
+        self.a = 1.0 - np.exp(-2 * np.pi * self.Cutoff / self.Rate)
+        k = np.arange(IIR_BLOCK)
+        Lag = k[:, None] - k[None, :]
+        self.__response = np.where(Lag >= 0, self.a * (1.0 - self.a) ** np.maximum(Lag, 0), 0.0)   #Output n from input k
+        self.__decay = ((1.0 - self.a) ** (k + 1))[:, None]       #Output n from the previous output
+        self.Reset()
+
+    def Reset(self):
+        self.__last = None
+
+    def Process(self, x, y):
+        if(len(y) == 0):
+            return x, y
+        if(self.__last is None):
+            self.__last = y[0].astype(np.float64)
+        out = np.empty(y.shape)
+        for i in range(0, len(y), IIR_BLOCK):
+            block = y[i:i + IIR_BLOCK]
+            n = len(block)
+            out[i:i + n] = self.__response[:n, :n].dot(block) + self.__decay[:n] * self.__last
+            self.__last = out[i + n - 1]
+        return x, out
+
+    def __str__(self):
+        return 'lowpass %g' % self.Cutoff
+
+#==============================================================================
+# Input Parameters: N (Int, samples)
+# Output Returns: none
+#
+# Description: One sample out for every N in, the average of the N samples so
+# the decimated signal is not aliased. Its sample number is the one of the
+# last of the N samples. Samples that do not fill a block wait for the next
+# batch.
+#==============================================================================
+class DF_DAQ_Decimate():
+    def __init__(self, N):
+        if(int(N) < 1):
+            raise ValueError('decimate needs at least 1 sample')
+        self.N = int(N)
+        self.Reset()
+
+    def Reset(self):
+        self.__x = None
+        self.__y = None
+
+    def Process(self, x, y):
+        if(self.__y is None):
+            self.__x, self.__y = x[:0], np.zeros((0, y.shape[1]))
+        x = np.concatenate((self.__x, x))
+        y = np.concatenate((self.__y, y))
+        n = len(y) - len(y) % self.N
+        self.__x, self.__y = x[n:], y[n:]
+        return x[self.N - 1:n:self.N], y[:n].reshape(-1, self.N, y.shape[1]).mean(axis = 1)
+
+    def __str__(self):
+        return 'decimate ' + str(self.N)
+
+FILTERS = {'avg'      : lambda Value, Rate: DF_DAQ_MovingAverage(int(Value)),
+           'lowpass'  : lambda Value, Rate: DF_DAQ_LowPass(float(Value), Rate),
+           'decimate' : lambda Value, Rate: DF_DAQ_Decimate(int(Value))}
+
+#==============================================================================
+# Input Parameters: Filters (List of filters)
+# Output Returns: none
+#
+# Description: Filters applied one after the other. Failed reads are held
+# (HoldFailed) before the first filter. An empty chain returns the samples as
+# they are.
+#==============================================================================
+class DF_DAQ_FilterChain():
+    def __init__(self, Filters = []):
+        self.Filters = list(Filters)
+        self.Reset()
+
+    def __len__(self):
+        return len(self.Filters)
+
+    def Reset(self):
+        self.__last = None
+        for Filter in self.Filters:
+            Filter.Reset()
+
+#==============================================================================
+# Input Parameters: x (NumPy Array, sample numbers), y (NumPy Array, Rows x Columns)
+# Output Returns: x (NumPy Array), y (NumPy Array, Rows x Columns), fewer rows
+#                 when decimating
+#==============================================================================
+    def Process(self, x, y):
+        if(len(self.Filters) == 0):
+            return x, y
+        if(self.__last is None):
+            self.__last = np.zeros(y.shape[1])
+        y, self.__last = HoldFailed(np.asarray(y, dtype = np.float64), self.__last)
+        for Filter in self.Filters:
+            x, y = Filter.Process(x, y)
+        return x, y
+
+    def __str__(self):
+        return ', '.join([str(Filter) for Filter in self.Filters]) or 'none'
+
+#==============================================================================
+# Input Parameters: Text (Str, Ex: 'avg 8, lowpass 2, decimate 4'), Rate (Float,
+#                   samples per second)
+# Output Returns: DF_DAQ_FilterChain
+#
+# Description: Builds the chain from its text form, see the module description.
+# An empty text (or 'none') is a chain without filters. Raises ValueError for
+# anything it does not understand.
+#==============================================================================
+def ParseFilters(Text, Rate):
+    Filters = []
+    for Part in Text.replace(';', ',').split(','):
+        Fields = Part.strip().lower().split()
+        if(len(Fields) == 0 or Fields == ['none']):
+            continue
+        if(len(Fields) != 2 or Fields[0] not in FILTERS):
+            raise ValueError('unknown filter "' + Part.strip() + '", use ' + ', '.join([Name + ' N' for Name in FILTERS]))
+        Filters.append(FILTERS[Fields[0]](Fields[1], Rate))
+    return DF_DAQ_FilterChain(Filters)
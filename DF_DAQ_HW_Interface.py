@@ -7,12 +7,340 @@ Created on Tue May 02 10:17:41 2017
 
 import serial
 import serial.tools.list_ports as PortList
+import threading
+import collections
+import time
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+from DF_DAQ_Units import DF_DAQ_Transfer, StackTransfers, UNIT_SCALE
+from DF_DAQ_Metrics import METRICS
+
+#Binary stream frame (firmware 'b' command), all fields little endian:
+# [0xA5][0x5A][seq:2][millis:4][channels:1][samples:1][counts:3 x samples x channels][checksum:1]
+FRAME_SYNC = b'\xa5\x5a'
+FRAME_HEADER = 10
+FRAME_RELOCK = 8        #Bad frames in a row before the frame layout is looked for again
+FRAME_MAX = 4096        #Longest frame a header can announce (bytes)
+BINARY_FIRMWARE = (0, 0, 3)     #First firmware version with the binary stream
+MILLIS_FIRMWARE = (0, 0, 2)     #First firmware version that ends every text line with its millis
+LINE_RELOCK = 8         #Lines in a row with another field count before the stream is taken to have another channel count
+
+#Firmware 0.0.4 also takes these while streaming, their replies are tagged
+# '#' + command + reply (Ex: #o10) so they can be picked out of the stream
+LIVE_FIRMWARE = (0, 0, 4)
+LIVE_COMMANDS = 'zou'
+REPLY_MAX = 64      #Longest tagged reply, a longer '#...' run is treated as stream data
+
+def FirmwareVersion(Version):
+    try:
+        return tuple([int(v) for v in Version.strip().split('.')])
+    except ValueError:
+        return ()
+
+#==============================================================================
+# Input Parameters: Version (Str)
+# Output Returns: True if the firmware supports the binary stream
+#==============================================================================
+def SupportsBinary(Version):
+    return FirmwareVersion(Version) >= BINARY_FIRMWARE
+
+#==============================================================================
+# Input Parameters: Version (Str)
+# Output Returns: True if the text stream has the device time ('value,millis'),
+#                 also for an unknown version
+#==============================================================================
+def SendsMillis(Version):
+    Version = FirmwareVersion(Version)
+    return Version == () or Version >= MILLIS_FIRMWARE
+
+#==============================================================================
+# Input Parameters: Version (Str)
+# Output Returns: True if the firmware takes LIVE_COMMANDS while streaming
+#==============================================================================
+def SupportsLiveCommands(Version):
+    return FirmwareVersion(Version) >= LIVE_FIRMWARE
+
+#==============================================================================
+# Input Parameters: Setup (Str, Ex: 'P-PSI-1-50-10')
+# Output Returns: Channels (Int), sensors the board sends per sample, 1 if the
+#                 setup does not say
+#==============================================================================
+def SetupChannels(Setup):
+    try:
+        return max(int(Setup.strip().split('-')[2]), 1)
+    except (IndexError, ValueError):
+        return 1
+
+#==============================================================================
+# Input Parameters: Ports (List of Str), Channels (Int)
+# Output Returns: Names (List of Str), one per column (board and channel)
+#==============================================================================
+def ColumnNames(Ports, Channels = 1):
+    if(Channels == 1):
+        return list(Ports)
+    return [Port + ' Ch' + str(c + 1) for Port in Ports for c in range(0, Channels)]
+
+#==============================================================================
+# Input Parameters: s (Str, reply to 'r', Ex: '0.5012' or '0.5012,0.4870')
+# Output Returns: Values (NumPy Array, one per channel)
+#
+# Description: Raises ValueError when the reply is not a reading
+#==============================================================================
+def ParseRead(s):
+    return np.array(s.strip().strip(',').split(','), dtype = np.float64)
+
+#==============================================================================
+# Input Parameters: Channels (Int), Millis (Bool, False for firmware that only
+#                   sends the values, see SendsMillis)
+# Output Returns: none
+#
+# Description: Decoder for the text stream ('value,millis' lines, or one value
+# per channel 'value,...,value,millis' for boards with Channels sensors). 
+# Decode takes whatever bytes arrived and returns the samples of every 
+# complete line (Samples x Channels), a partial line is kept until the rest of
+# it arrives. Without Millis the lines are only the values and Millis is -1.
+# The fields of every line are converted in one step, so the cost per value
+# does not grow with the channel count. A line with another number of fields
+# is dropped (BadLines), after LINE_RELOCK of them in a row with the same count
+# StreamChannels holds the channel count the stream has instead. Tagged 
+# command replies ('#' lines) are not samples, they are added to Replies 
+# without the '#'.
+#==============================================================================
+class DF_DAQ_TextDecoder():
+    def __init__(self, Channels = 1, Millis = True):
+        self.Channels = Channels
+        self.Millis = Millis
+        self.StreamChannels = None      #Channel count of LINE_RELOCK lines in a row, when not Channels
+        self.BadLines = 0
+        self.Replies = []
+        self.__lineBuffer = b''
+        self.__otherFields = None       #Field count of the last lines that did not fit, and how many in a row
+        self.__otherRun = 0
+
+    def __bad(self, line):
+        print ('ERROR - Bad Sample: ' + str(line))
+        self.BadLines += 1
+
+    def __other(self, fields):
+        self.__otherRun = self.__otherRun + 1 if (fields == self.__otherFields) else 1
+        self.__otherFields = fields
+        if(self.__otherRun >= LINE_RELOCK):
+            self.StreamChannels = fields - (1 if self.Millis else 0)
+
+    def Decode(self, data):
+        lines = (self.__lineBuffer + data).split(b'\n')
+        self.__lineBuffer = lines.pop()     #Last entry is an incomplete line (or empty)
+        
+        Fields = self.Channels + (1 if self.Millis else 0)
+        Rows = []
+        for line in lines:
+            line = line.strip(b'\r ,')
+            if(len(line) == 0):
+                continue
+            if(line[:1] == b'#'):
+                self.Replies.append(line[1:].decode('latin_1'))
+                continue
+            fields = line.split(b',')
+            if(len(fields) == Fields):
+                Rows.append(fields if self.Millis else fields + [b'-1'])     #-1, no device time
+                self.__otherRun = 0
+            else:
+                self.__other(len(fields))
+                self.__bad(line)
+        try:
+            Block = np.array(Rows, dtype = np.float64).reshape(-1, self.Channels + 1)
+        except ValueError:
+            Good = []       #Find the lines that are not numbers
+            for fields in Rows:
+                try:
+                    Good.append([float(field) for field in fields])
+                except ValueError:
+                    self.__bad(b','.join(fields))
+            Block = np.array(Good, dtype = np.float64).reshape(-1, self.Channels + 1)
+        return Block[:, :-1], Block[:, -1].astype(np.int64)
+
+#==============================================================================
+# Input Parameters: Period (Int, mSec), Channels (Int)
+# Output Returns: none
+#
+# Description: Decoder for the binary stream. Whole runs of back to back frames
+# are checked and unpacked at once with np.frombuffer, the byte by byte search
+# for the next sync is only needed after a corrupted frame. Frames with a bad 
+# sync or checksum are dropped (BadFrames) and gaps in the sequence number are
+# counted as LostFrames. Period is used to give each sample in a frame its 
+# device time. Tagged command replies the firmware sends between frames are 
+# added to Replies, like DF_DAQ_TextDecoder. The frame layout is locked by the
+# first frame with Channels channels that passes its checksum, and looked for
+# again after FRAME_RELOCK bad frames in a row.
+#==============================================================================
+class DF_DAQ_FrameDecoder():
+    def __init__(self, Period = 1, Channels = 1):
+        self.Period = Period
+        self.Replies = []
+        self.BadFrames = 0
+        self.LostFrames = 0
+        self.SkippedBytes = 0
+        self.FrameSize = None           #Locked by the first frame that passes its checksum
+        self.Channels = Channels
+        self.StreamChannels = None      #Channel count of the frames that pass their checksum
+        self.__buffer = b''
+        self.__badRun = 0
+        self.__lastSeq = None
+        self.__frames = 0       #Frames sent by the firmware so far, including lost ones
+
+    def __frameSize(self, data, pos):
+        #Frame layout is fixed for a stream. It is only taken from a frame
+        #that passes its checksum, so a sync pattern inside the sample bytes
+        #can not set it, and only with the expected channel count (frames with
+        #another count set StreamChannels). 0 is not a frame
+        if(self.FrameSize != None):
+            return self.FrameSize
+        if(len(data) - pos < FRAME_HEADER):
+            return None
+        L = FRAME_HEADER + 3 * data[pos + 8] * data[pos + 9] + 1
+        if(data[pos + 9] == 0 or L > FRAME_MAX):
+            return 0
+        if(len(data) - pos < L):
+            return None
+        if((sum(data[pos + 2:pos + L - 1]) & 0xFF) != data[pos + L - 1]):
+            return 0
+        self.StreamChannels = data[pos + 8]
+        if(self.StreamChannels != self.Channels):
+            return 0
+        self.FrameSize = L
+        return L
+
+#==============================================================================
+# Input Parameters: data (Bytes)
+# Output Returns: Counts (NumPy Array, Samples x Channels), Millis (NumPy Array),
+#                 Seq (NumPy Array, sample number within the stream)
+#==============================================================================
+    def Decode(self, data):
+        data = self.__buffer + data
+        frames = []
+        pos = 0
+        while(True):
+            if(data[pos:pos + 1] == b'#'):
+                end = data.find(b'\n', pos, pos + REPLY_MAX)
+                if(end >= 0):
+                    self.Replies.append(data[pos + 1:end].strip(b'\r').decode('latin_1'))
+                    pos = end + 1
+                    continue
+                if(len(data) - pos < REPLY_MAX):
+                    break   #Wait for the rest of the reply
+            if(data[pos:pos + 2] != FRAME_SYNC):
+                nxt = data.find(FRAME_SYNC, pos + 1)
+                if(nxt < 0):
+                    keep = 1 if (data[-1:] == FRAME_SYNC[:1]) else 0   #Keep half a sync
+                    self.SkippedBytes += len(data) - pos - keep
+                    pos = len(data) - keep
+                    break
+                self.SkippedBytes += nxt - pos
+                pos = nxt
+            
+            L = self.__frameSize(data, pos)
+            if(L == None or len(data) - pos < L):
+                break   #Wait for the rest of the frame
+            if(L == 0):
+                self.BadFrames += 1
+                self.SkippedBytes += 1
+                pos += 1        #Not a frame header, look for the next sync
+                continue
+            
+            n = (len(data) - pos) // L
+            block = np.frombuffer(data, dtype = np.uint8, count = n * L, offset = pos).reshape(n, L)
+            valid = (block[:, 0] == FRAME_SYNC[0]) & (block[:, 1] == FRAME_SYNC[1])
+            valid &= (block[:, 2:L - 1].sum(axis = 1, dtype = np.uint32) & 0xFF) == block[:, L - 1]
+            good = n if valid.all() else int(np.argmin(valid))     #Leading run of good frames
+            
+            if(good > 0):
+                frames.append(block[:good])
+                pos += good * L
+                self.__badRun = 0
+            else:
+                self.BadFrames += 1
+                self.SkippedBytes += 1
+                pos += 1        #Corrupt frame, look for the next sync
+                self.__badRun += 1
+                if(self.__badRun >= FRAME_RELOCK):
+                    self.FrameSize = None       #Layout may have changed (firmware restarted), find it again
+                    self.__badRun = 0
+        self.__buffer = data[pos:]
+        
+        if(len(frames) == 0):
+            return np.zeros((0, self.Channels), dtype = np.uint32), np.zeros(0, dtype = np.int64), np.zeros(0, dtype = np.int64)
+        
+        block = np.concatenate(frames)
+        nSamples = block[0, 9]
+        seq = block[:, 2].astype(np.int64) | (block[:, 3].astype(np.int64) << 8)
+        millis = block[:, 4:8].copy().view('<u4').reshape(-1).astype(np.int64)
+        raw = block[:, FRAME_HEADER:-1].reshape(-1, 3).astype(np.uint32)
+        counts = (raw[:, 0] | (raw[:, 1] << 8) | (raw[:, 2] << 16)).reshape(-1, self.Channels)
+        
+        #Sequence numbers are 16 bit, unwrap them and count the missing frames
+        prev = seq[0] - 1 if (self.__lastSeq == None) else self.__lastSeq
+        steps = np.diff(np.concatenate(([prev], seq))) % 65536
+        self.LostFrames += int(np.sum(steps - 1))
+        frameSeq = self.__frames + np.cumsum(steps) - 1
+        self.__lastSeq = seq[-1]
+        self.__frames = frameSeq[-1] + 1
+        
+        offsets = np.arange(nSamples, dtype = np.int64)
+        Seq = (frameSeq[:, None] * nSamples + offsets).reshape(-1)
+        Millis = (millis[:, None] + offsets * (self.Period + 1)).reshape(-1)    #Firmware samples every Period + 1 mSec
+        return counts, Millis, Seq
+
+IDENTITY_CACHE = os.path.join(os.path.expanduser('~'), '.DF_DAQ_Devices.json')
+
+#==============================================================================
+# Input Parameters: fname (Str)
+# Output Returns: none
+#
+# Description: Identity table of the boards seen before (firmware, setup, 
+# type and info per port), saved as JSON so it survives restarts. An entry is
+# only used while the same board is on the port, checked with the USB serial
+# number. Boards without a serial number are never cached.
+#==============================================================================
+class DF_DAQ_IdentityCache():
+    def __init__(self, fname = IDENTITY_CACHE):
+        self.fname = fname
+        try:
+            with open(self.fname, 'r') as f:
+                self.Table = json.load(f)
+        except (OSError, ValueError):
+            self.Table = {}
+
+    def Get(self, Port, Serial):
+        Identity = self.Table.get(Port)
+        if(Identity != None and Serial and Identity.get('Serial') == Serial):
+            return Identity
+        return None
+
+    def Put(self, Identity):
+        if(Identity['Serial'] and Identity['Firmware'] != 'NA'):
+            self.Table[Identity['Port']] = Identity
+
+    def Forget(self, Port):
+        self.Table.pop(Port, None)
+
+    def Save(self):
+        try:
+            with open(self.fname + '.tmp', 'w') as f:
+                json.dump(self.Table, f, indent = 1)
+            os.replace(self.fname + '.tmp', self.fname)
+        except OSError as e:
+            print ('ERROR - Could not save the device table: ' + str(e))
 
 class DF_DAQ():
     def __init__(self):
         print ('Class Initialized')
         self.ADCMult = 0.0078125
         self.Port = []
+        self.Serials = {}           #USB serial number of each port found by findPort
+        self.Identities = None      #DF_DAQ_IdentityCache, loaded by the first Probe
         self.Abort = False
         self.__Temperature = 'NA'
         self.__comOpen = False
@@ -27,6 +355,7 @@ class DF_DAQ():
             print ("Port HWID: " + str(port.hwid))
             if '239A:8022' in str(port.hwid): #Detect the Teensy Vid:Pid
                 self.Port.append(str(port[0])) #Add COM Port to the list of Teensy Ports
+                self.Serials[str(port[0])] = port.serial_number
                 print ('Port Found! ' + str(self.Port)) #Confirmation
         return self.Port #Return the list of Teensy COM Ports
     
@@ -35,7 +364,10 @@ class DF_DAQ():
                        "DataRate"   :"o" + data + "\n",    #[Command Type][Sample Period][]
                        "Setup"      :"x\n",#Setup Info
                        "Read"       :"r\n",#Read Sensor
-                       "Zero"       :"z\n" #Zero Sensor Reading
+                       "Zero"       :"z\n",#Zero Sensor Reading
+                       "Start"      :"s\n",#Start Data Streaming
+                       "StartBinary":"b\n",#Start Binary Data Streaming
+                       "Stop"       :"p\n" #Stop Data Streaming
                        }
         #print ('Command: ' + CommandList[Command])
         ser.write(CommandList[Command].encode('latin_1'))
@@ -112,7 +444,60 @@ class DF_DAQ():
                 print ("Error, Serial Port Already Closed")
             return 'NA'    
 
-    def Read(self, Com):
+#==============================================================================
+# Input Parameters: COM (Str)
+# Output Returns: Identity (Dict, Port, Serial, Firmware, Setup, Type, Info)
+#
+# Description: Asks a board for everything the GUI needs in one serial 
+# session, instead of opening the port once per command. Anything the board
+# does not answer is 'NA'.
+#==============================================================================
+    def Identify(self, COM):
+        Identity = {'Port' : COM, 'Serial' : self.Serials.get(COM)}
+        Replies = {'Firmware' : 'v\n', 'Setup' : 'x\n', 'Type' : 't\n', 'Info' : 'i\n'}
+        try:
+            with serial.Serial(COM, 250000, timeout = 1) as ser:
+                ser.write(b'p\n')     #Only answers while it is not streaming
+                time.sleep(0.05)
+                ser.reset_input_buffer()
+                for Key in Replies:
+                    ser.write(Replies[Key].encode('latin_1'))
+                    Identity[Key] = ser.readline().decode('latin_1').strip() or 'NA'
+        except serial.SerialException as e:
+            print ('ERROR - Could not identify ' + COM + ': ' + str(e))
+            for Key in Replies:
+                Identity.setdefault(Key, 'NA')
+        print ('Identified ' + COM + ': ' + str(Identity))
+        return Identity
+
+#==============================================================================
+# Input Parameters: Ports (List of Str), Refresh (Bool)
+# Output Returns: Identities (Dict, Port : Identity, see Identify)
+#
+# Description: Identifies every port at once, one thread per board, so the 
+# total wait is that of the slowest board rather than the sum. Boards already
+# in the identity table (same port and USB serial number) are not asked again
+# unless Refresh is True.
+#==============================================================================
+    def Probe(self, Ports, Refresh = False):
+        if(self.Identities == None):
+            self.Identities = DF_DAQ_IdentityCache()
+        Identities = {}
+        for Port in Ports:
+            Cached = self.Identities.Get(Port, self.Serials.get(Port))
+            if(Cached != None and not(Refresh)):
+                Identities[Port] = Cached
+        
+        Unknown = [Port for Port in Ports if Port not in Identities]
+        if(len(Unknown) > 0):
+            with ThreadPoolExecutor(max_workers = len(Unknown)) as pool:
+                for Identity in pool.map(self.Identify, Unknown):
+                    Identities[Identity['Port']] = Identity
+                    self.Identities.Put(Identity)
+            self.Identities.Save()
+        return Identities
+
+    def __OpenCOM(self, Com):
         if(not(self.__comOpen)):
             self.__ser = serial.Serial()
             self.__ser.baudrate = 250000
@@ -130,19 +515,590 @@ class DF_DAQ():
                 self.__ser.close()
                 self.__ser.open()
                 self.__comOpen = True
+
+    def Read(self, Com):
+        self.__OpenCOM(Com)
         
         self.__SendCommand('Read', self.__ser, "")
         try:
             s = self.__ser.readline().decode()
             #print('Returned: ' + str(s))
-        except:
+            return ParseRead(s)
+        except (serial.SerialException, ValueError):
             print('ERROR - Nothing Returned')
-            s = '0.0'
-        
-        return float(s)
-    
+            return np.zeros(1)
+
     def CloseCOM(self, Com):
         self.__ser.close()
         self.__comOpen = False
         
-        self.reading = 0
\ No newline at end of file
+        self.__reading = 0
+
+#==============================================================================
+# Input Parameters: Ports (List of Str), Period (Int, mSec), Binary (Bool),
+#                   Channels (Int, per board)
+# Output Returns: DF_DAQ_Group
+#
+# Description: Acquisition from the given boards, not started yet. Replays 
+# (DF_DAQ_Replay) return theirs from the same call.
+#==============================================================================
+    def Group(self, Ports, Period, Binary = False, Channels = 1):
+        return DF_DAQ_Group(Ports, Period, Binary = Binary, Channels = Channels)
+
+#==============================================================================
+# Input Parameters: Received (Int, nSec), Millis (NumPy Array, device times)
+# Output Returns: Times (NumPy Array, nSec)
+#
+# Description: Host time of every sample of one serial read: the time the read
+# returned (time.perf_counter_ns, shared by every board), less each sample's
+# device time offset from the newest one, as the samples read together (a
+# whole frame) were not taken together. Without device times (-1) every sample
+# gets the time of the read.
+#==============================================================================
+def HostTimes(Received, Millis):
+    Times = np.full(len(Millis), Received, dtype = np.int64)
+    if(len(Millis) > 0 and Millis[0] >= 0):
+        Times -= (Millis[-1] - Millis) * 1000000
+    return Times
+
+#==============================================================================
+# Input Parameters: MaxSamples (Int), Channels (Int)
+# Output Returns: none
+#
+# Description: Thread safe buffer of streamed samples between the thread that
+# reads a board and the one that drains it. Each read is kept as one block of
+# NumPy arrays rather than per sample. If the buffer is not drained in time the
+# oldest samples are dropped and counted in Overruns instead of slowing the
+# acquisition down.
+#==============================================================================
+class DF_DAQ_SampleBuffer():
+    def __init__(self, MaxSamples = 100000, Channels = 1):
+        self.MaxSamples = MaxSamples
+        self.Channels = Channels
+        self.Overruns = 0
+        self.__lock = threading.Lock()
+        self.__blocks = collections.deque()    #(Times, Samples, Millis) per read
+        self.__count = 0
+
+    def Append(self, Times, Samples, Millis):
+        with self.__lock:
+            self.__blocks.append((Times, Samples, Millis))
+            self.__count += len(Samples)
+            while(self.__count > self.MaxSamples):     #Buffer full, drop the oldest samples
+                Times, Samples, Millis = self.__blocks.popleft()
+                dropped = min(len(Samples), self.__count - self.MaxSamples)
+                if(dropped < len(Samples)):
+                    self.__blocks.appendleft((Times[dropped:], Samples[dropped:], Millis[dropped:]))
+                self.__count -= dropped
+                self.Overruns += dropped
+                METRICS.Count('Dropped', dropped)
+
+#==============================================================================
+# Input Parameters: none
+# Output Returns: Times (NumPy Array, nSec), Samples (NumPy Array, Samples x
+#                 Channels), Millis (NumPy Array)
+#
+# Description: Returns and clears every sample buffered since the last call
+# along with the host time each one was received and its device time.
+#==============================================================================
+    def Drain(self):
+        with self.__lock:
+            blocks = list(self.__blocks)
+            self.__blocks.clear()
+            self.__count = 0
+        if(len(blocks) == 0):
+            return np.zeros(0, dtype = np.int64), np.zeros((0, self.Channels)), np.zeros(0, dtype = np.int64)
+        Times = np.concatenate([block[0] for block in blocks])
+        Samples = np.concatenate([block[1] for block in blocks]).astype(np.float64)
+        Millis = np.concatenate([block[2] for block in blocks]).astype(np.int64)
+        return Times, Samples, Millis
+
+#==============================================================================
+# Input Parameters: Com (Str), MaxSamples (Int), Timeout (Float, Sec), 
+#                   Channels (Int)
+# Output Returns: none
+#
+# Description: Long lived connection to one board. The session owns the only
+# serial handle for the port, from start until Stop, and its thread reads 
+# everything the board sends. Commands from any thread are queued with Command
+# and each reply is handed back to the request it answers: in order while the
+# board is idle, by the command in the '#' tag while it is streaming. Every
+# streamed sample is stamped with the host clock (time.perf_counter_ns, shared
+# by all sessions) when it is received, less its device time offset from the
+# newest sample of the same read, and buffered with its device time until Drain
+# is called. If the buffer is not drained in time the oldest samples are 
+# dropped and counted in Overruns instead of slowing the acquisition down. With 
+# firmware 0.0.4 or newer 'z' and 'o' work during a stream without stopping
+# it (see SupportsLiveCommands, SetUnits), older firmware only takes a 'z' then
+# and does not acknowledge it. Stalls counts every second the stream was quiet.
+# Error holds the reason if the port failed. Every sample holds one value per
+# channel (Channels, see SetupChannels), a stream with another channel count
+# is refused with an Error.
+#==============================================================================
+class DF_DAQ_Session(threading.Thread):
+    def __init__(self, Com, MaxSamples = 100000, Timeout = 1.0, Channels = 1):
+        super(DF_DAQ_Session, self).__init__()
+        self.daemon = True
+        self.Com = Com
+        self.MaxSamples = MaxSamples
+        self.Timeout = Timeout
+        self.Channels = Channels
+        self.Firmware = 'NA'
+        self.Period = None
+        self.Streaming = False
+        self.Stalls = 0
+        self.Error = None
+        self.__buffer = DF_DAQ_SampleBuffer(MaxSamples, Channels)
+        self.__ser = None
+        self.__decoder = None
+        self.__line = b''
+        self.__last = 0
+        self.__sendLock = threading.Lock()      #Port writes, pending requests and the stream state
+        self.__pending = collections.deque()    #Requests waiting for their reply, oldest first
+        self.__zero = None                      #Zero request waiting for its reply and its deadline (ZeroStart)
+        self.__zeroed = 0
+        self.__stop = threading.Event()
+
+    @property
+    def Overruns(self):
+        return self.__buffer.Overruns
+
+    @property
+    def Live(self):
+        return SupportsLiveCommands(self.Firmware)
+
+    @property
+    def Decoder(self):
+        return self.__decoder       #Of the current or last stream, for its error counts
+
+    @property
+    def LostFrames(self):
+        return getattr(self.__decoder, 'LostFrames', 0)
+
+    def start(self):
+        try:
+            self.__ser = serial.Serial(self.Com, 250000, timeout = 0.1)
+            self.__ser.write(b'p\n')       #Make sure the firmware is not already streaming
+            time.sleep(0.05)
+            self.__ser.reset_input_buffer()
+        except serial.SerialException as e:
+            print ('ERROR - Could not open ' + self.Com + ': ' + str(e))
+            self.Error = str(e)
+            return
+        print ('Serial Opened on Port: ' + self.Com)
+        super(DF_DAQ_Session, self).start()
+        self.Firmware = self.getFirmVer()
+
+    def run(self):
+        try:
+            while(not(self.__stop.is_set())):
+                start = time.perf_counter_ns()
+                data = self.__ser.read(max(self.__ser.in_waiting, 1))
+                Received = time.perf_counter_ns()
+                METRICS.Add('Serial Wait', Received - start)
+                with self.__sendLock:
+                    if(not(self.Streaming)):
+                        self.__lines(data)
+                        continue
+                    if(len(data) == 0):
+                        if(Received - self.__last > 1000000000):
+                            self.Stalls += 1
+                            self.__last = Received
+                        continue
+                    self.__last = Received
+                    Samples, Millis = self.__samples(data)
+                    METRICS.Add('Parse', time.perf_counter_ns() - Received)
+                    while(len(self.__decoder.Replies) > 0):
+                        Reply = self.__decoder.Replies.pop(0)
+                        self.__answer(Reply[:1], Reply[1:])
+                if(self.__decoder.StreamChannels not in (None, self.Channels)):
+                    raise serial.SerialException('board sends ' + str(self.__decoder.StreamChannels) + ' channels, its setup has ' + str(self.Channels))
+                if(len(Samples) > 0):
+                    self.__store(Received, Samples, Millis)
+        except serial.SerialException as e:
+            print ('ERROR - Session Stopped: ' + str(e))
+            self.Error = str(e)
+        finally:
+            with self.__sendLock:
+                self.Streaming = False
+                while(len(self.__pending) > 0):
+                    self.__pending.popleft()['Event'].set()      #Nobody is going to answer these
+            try:
+                self.__ser.close()
+                print ('Serial on Port: ' + self.Com + ' Closed')
+            except serial.SerialException:
+                print ("Error, Serial Port Already Closed")
+
+    def __lines(self, data):
+        #Idle, every line the board sends answers the oldest request, anything else is discarded
+        lines = (self.__line + data).split(b'\n')
+        self.__line = lines.pop()
+        for line in lines:
+            if(len(self.__pending) > 0):
+                self.__answer(None, line.strip(b'\r').decode('latin_1'))
+
+    def __answer(self, Command, Reply):
+        for Request in self.__pending:
+            if(Command == None or Request['Command'] == Command):
+                self.__pending.remove(Request)
+                if(Request['Command'] == 'o' and isinstance(self.__decoder, DF_DAQ_FrameDecoder) and Reply.isdigit()):
+                    self.__decoder.Period = int(Reply)     #New device times from here on
+                Request['Reply'] = Reply
+                Request['Event'].set()
+                return
+
+    def __samples(self, data):
+        if(isinstance(self.__decoder, DF_DAQ_FrameDecoder)):
+            Counts, Millis, Seq = self.__decoder.Decode(data)
+            return Counts.astype(np.float64), Millis
+        return self.__decoder.Decode(data)
+
+    def __store(self, Received, Samples, Millis):
+        start = time.perf_counter_ns()
+        self.__buffer.Append(HostTimes(Received, Millis), Samples, Millis)
+        METRICS.Add('Buffer Append', time.perf_counter_ns() - start)
+
+#==============================================================================
+# Input Parameters: Command (Str, one character), Data (Str), Reply (Bool),
+#                   Timeout (Float, Sec, default the session Timeout), Wait (Bool)
+# Output Returns: Reply (Str, without the line ending or tag), '' if no reply
+#                 was asked for, None if there was none
+#
+# Description: Sends Command + Data + '\n' and, if Reply is True, waits for the
+# line that answers it. Safe to call from any thread. While streaming a command
+# that would not be answered (anything but LIVE_COMMANDS, or any command on
+# firmware older than 0.0.4) is refused and returns None. Without Wait the 
+# request is returned at once instead, its 'Event' is set once 'Reply' holds
+# the answer (see ZeroStart).
+#==============================================================================
+    def Command(self, Command, Data = '', Reply = True, Timeout = None, Wait = True):
+        Request = {'Command' : Command, 'Event' : threading.Event(), 'Reply' : None}
+        with self.__sendLock:
+            if(not(self.is_alive())):
+                print ('ERROR - ' + self.Com + ' is not open')
+                return None
+            if(Reply and self.Streaming and not(self.Live and Command in LIVE_COMMANDS)):
+                print ("ERROR - '" + Command + "' does not work while streaming (firmware " + self.Firmware + ')')
+                return None
+            try:
+                self.__ser.write((Command + Data + '\n').encode('latin_1'))
+            except serial.SerialException as e:
+                print ('ERROR - Could not send ' + Command + ': ' + str(e))
+                return None
+            if(not(Reply)):
+                return ''
+            self.__pending.append(Request)
+            if(not(Wait)):
+                return Request
+            start = time.perf_counter_ns()
+        if(not(Request['Event'].wait(self.Timeout if (Timeout == None) else Timeout))):
+            with self.__sendLock:
+                if(Request in self.__pending):
+                    self.__pending.remove(Request)
+            print ("ERROR - No reply to '" + Command + "' from " + self.Com)
+        METRICS.Add('Reply Wait', time.perf_counter_ns() - start)
+        return Request['Reply']
+
+    def getFirmVer(self):
+        return self.Command('v') or 'NA'
+
+    def getSetup(self):
+        return self.Command('x') or 'NA'
+
+#==============================================================================
+# Input Parameters: none
+# Output Returns: Values (NumPy Array, one per channel), zeros if the board 
+#                 did not answer
+#==============================================================================
+    def Read(self):
+        try:
+            return ParseRead(self.Command('r'))
+        except (AttributeError, ValueError):
+            print ('ERROR - Nothing Returned')
+            return np.zeros(self.Channels)
+
+#==============================================================================
+# Input Parameters: none
+# Output Returns: 1 once the sensor is zeroed, 0 if the board did not answer
+#
+# Description: ZeroStart, then waits for ZeroDone. Blocks for as long as the
+# firmware takes to zero, use ZeroStart and ZeroDone from a GUI thread.
+#==============================================================================
+    def zero(self):
+        self.ZeroStart()
+        while(self.ZeroDone() == None):
+            time.sleep(0.01)
+        return self.ZeroDone()
+
+#==============================================================================
+# Input Parameters: none
+# Output Returns: none
+#
+# Description: Sends the zero command and returns at once. The firmware
+# averages several samples at the sample period to zero, its acknowledgement
+# is expected within that time. Boards that do not acknowledge a zero (idle, 
+# or firmware before 0.0.4) are only sent the command.
+#==============================================================================
+    def ZeroStart(self):
+        print ('Zeroing the sensor on ' + self.Com)
+        if(self.Streaming and self.Live):
+            Period = self.Period if (self.Period != None) else 500
+            Request = self.Command('z', Wait = False)
+            self.__zero = None if (Request == None) else (Request, time.perf_counter() + self.Timeout + 8 * (Period + 1) / 1000.0)
+            self.__zeroed = 0
+        else:
+            self.__zero = None
+            self.__zeroed = 1 if (self.Command('z', Reply = False) != None) else 0
+
+#==============================================================================
+# Input Parameters: none
+# Output Returns: None while the acknowledgement of ZeroStart is awaited, then
+#                 1 once the sensor is zeroed, 0 if the board did not answer
+#==============================================================================
+    def ZeroDone(self):
+        if(self.__zero == None):
+            return self.__zeroed
+        Request, Deadline = self.__zero
+        if(Request['Event'].is_set()):
+            self.__zeroed = 1 if (Request['Reply'] != None) else 0
+        elif(time.perf_counter() > Deadline):
+            with self.__sendLock:
+                if(Request in self.__pending):
+                    self.__pending.remove(Request)
+            print ("ERROR - No reply to 'z' from " + self.Com)
+            self.__zeroed = 0
+        else:
+            return None
+        self.__zero = None
+        return self.__zeroed
+
+#==============================================================================
+# Input Parameters: Period (Int, mSec)
+# Output Returns: Period set by the board (Int), None if it did not answer
+#==============================================================================
+    def SetPeriod(self, Period):
+        s = self.Command('o', str(int(Period)))
+        if(s == None or not(s.strip().isdigit())):
+            return None
+        self.Period = int(s)
+        return self.Period
+
+#==============================================================================
+# Input Parameters: Units (Str, a key of UNIT_SCALE)
+# Output Returns: Units set by the board (Str), None if it did not answer
+#
+# Description: Units of the text stream and single reads, the binary stream is
+# always raw counts. Refused while streaming: the samples already buffered, 
+# DF_DAQ_Group.Units and the capture being written all say PSI.
+#==============================================================================
+    def SetUnits(self, Units):
+        if(self.Streaming):
+            print ("ERROR - Units can not be changed while streaming on " + self.Com)
+            return None
+        return self.Command('u', str(list(UNIT_SCALE.keys()).index(Units)))
+
+#==============================================================================
+# Input Parameters: Period (Int, mSec), Binary (Bool)
+# Output Returns: none
+#
+# Description: Sets the firmware sample period and puts the firmware into its
+# free running stream mode ('s', or 'b' for the binary stream, see 
+# SupportsBinary). The samples are then collected by the session thread until
+# Drain is called.
+#==============================================================================
+    def StreamStart(self, Period, Binary = False):
+        if(not(self.is_alive())):
+            return
+        print ('Sample Period Set: ' + str(self.SetPeriod(Period)) + ' mSec')
+        with self.__sendLock:
+            self.__decoder = DF_DAQ_FrameDecoder(self.Period or int(Period), self.Channels) if Binary else DF_DAQ_TextDecoder(self.Channels, SendsMillis(self.Firmware))
+            self.__last = time.perf_counter_ns()
+            self.Streaming = True
+        self.Command('b' if Binary else 's', Reply = False)
+        print ('Streaming Started on Port: ' + self.Com + (' (Binary)' if Binary else ''))
+
+#==============================================================================
+# Input Parameters: none
+# Output Returns: none
+#
+# Description: Stops the stream. Samples already on the way are still decoded,
+# whatever is left after that is cleared so it is not taken for a reply.
+#==============================================================================
+    def StreamStop(self):
+        if(not(self.Streaming)):
+            return
+        self.Command('p', Reply = False)
+        time.sleep(0.05)
+        with self.__sendLock:
+            self.Streaming = False
+            self.__line = b''
+            try:
+                self.__ser.reset_input_buffer()
+            except serial.SerialException:
+                pass
+        METRICS.Count('Bad Samples', getattr(self.__decoder, 'BadLines', 0) + getattr(self.__decoder, 'BadFrames', 0))
+        METRICS.Count('Lost Frames', self.LostFrames)
+        print ('Streaming Stopped')
+
+#==============================================================================
+# Input Parameters: none
+# Output Returns: Times (NumPy Array, nSec), Samples (NumPy Array, Samples x
+#                 Channels), Millis (NumPy Array)
+#
+# Description: See DF_DAQ_SampleBuffer.Drain
+#==============================================================================
+    def Drain(self):
+        return self.__buffer.Drain()
+
+    def Stop(self):
+        if(self.is_alive()):
+            self.StreamStop()
+            self.__stop.set()
+            self.join()
+
+#==============================================================================
+# Input Parameters: Ports (List of Str), Period (Int, mSec), MaxSamples (Int),
+#                   Binary (Bool), Transfers (Dict, Port : DF_DAQ_Transfer),
+#                   Channels (Int, per board)
+# Output Returns: none
+#
+# Description: Acquires from several DroidForge boards at once. Every board gets
+# its own DF_DAQ_Session and thread, so throughput scales with the number of 
+# boards. Drain merges the readers into one aligned capture with one column per
+# board and channel (Columns names them, see ColumnNames, a board's channels 
+# are next to each other): rows are placed on a common grid of the host clock (one row per 
+# Period, starting once every board has sent a sample) and each column holds 
+# the newest sample its board sent at or before that row's time. A row is only
+# returned once every board has data past it. With a single board the samples
+# are returned as they came, without resampling. StartNs is the host time the
+# readers were started. With the binary stream the samples are raw counts, 
+# ToPSI converts them with each board's transfer function (Transfers, the 
+# default DF_DAQ_Transfer for boards not listed). Units is what Drain returns.
+# Done is True once every reader has stopped (Stop, or its port failed).
+#==============================================================================
+class DF_DAQ_Group():
+    def __init__(self, Ports, Period, MaxSamples = 100000, Binary = False, Transfers = {}, Channels = 1):
+        self.Ports = list(Ports)
+        self.Period = Period
+        self.Channels = Channels
+        self.Columns = ColumnNames(self.Ports, Channels)
+        self.Raw = Binary
+        self.Transfer = StackTransfers([Transfers.get(Port, DF_DAQ_Transfer()) for Port in self.Ports for c in range(0, Channels)])
+        self.Binary = Binary
+        self.Units = 'Counts' if Binary else 'PSI'
+        self.Readers = [DF_DAQ_Session(Port, MaxSamples, Channels = Channels) for Port in self.Ports]
+        self.__times = [np.zeros(0, dtype = np.int64) for Port in self.Ports]
+        self.__samples = [np.zeros((0, Channels)) for Port in self.Ports]
+        self.__millis = [np.zeros(0, dtype = np.int64) for Port in self.Ports]
+        self.__t0 = None
+        self.__row = 0
+        self.StartNs = None
+
+    def __start(self, Reader):
+        Reader.start()
+        Reader.StreamStart(self.Period, self.Binary)
+
+    def start(self):
+        self.StartNs = time.perf_counter_ns()
+        with ThreadPoolExecutor(max_workers = len(self.Readers)) as pool:
+            list(pool.map(self.__start, self.Readers))     #Boards answer in parallel
+
+    def Stop(self):
+        for Reader in self.Readers:
+            Reader.Stop()
+
+    def zero(self):
+        with ThreadPoolExecutor(max_workers = len(self.Readers)) as pool:
+            return min(pool.map(lambda Reader: Reader.zero(), self.Readers))
+
+    def ZeroStart(self):
+        for Reader in self.Readers:
+            Reader.ZeroStart()
+
+    def ZeroDone(self):
+        Zeroed = [Reader.ZeroDone() for Reader in self.Readers]
+        return None if (None in Zeroed) else min(Zeroed)
+
+#==============================================================================
+# Input Parameters: Samples (NumPy Array, Rows x Columns)
+# Output Returns: PSI (NumPy Array, Rows x Columns)
+#==============================================================================
+    def ToPSI(self, Samples):
+        if(self.Raw):
+            return self.Transfer.ToUnits(Samples)
+        return Samples
+
+#==============================================================================
+# Input Parameters: Times (NumPy Array, nSec, from Drain)
+# Output Returns: Received (NumPy Array, nSec), host time the samples were 
+#                 received
+#==============================================================================
+    def ReceivedNs(self, Times):
+        return Times
+
+    @property
+    def Overruns(self):
+        return sum([Reader.Overruns for Reader in self.Readers])
+
+    @property
+    def Stalls(self):
+        return sum([Reader.Stalls for Reader in self.Readers])
+
+    @property
+    def Done(self):
+        return not(any([Reader.is_alive() for Reader in self.Readers]))
+
+    @property
+    def Error(self):
+        for Reader in self.Readers:
+            if(Reader.Error != None):
+                return Reader.Com + ': ' + Reader.Error
+        return None
+
+#==============================================================================
+# Input Parameters: none
+# Output Returns: Times (NumPy Array, nSec), Samples (NumPy Array, Rows x Columns),
+#                 Millis (NumPy Array, Rows x Columns)
+#
+# Description: Returns the aligned rows that are complete since the last call.
+# Millis is the device time of the sample each column's board contributed to
+# the row.
+#==============================================================================
+    def Drain(self):
+        if(len(self.Readers) == 1):
+            Times, Samples, Millis = self.Readers[0].Drain()
+            return Times, Samples, np.repeat(Millis.reshape(-1, 1), self.Channels, axis = 1)
+
+        for i in range(0, len(self.Readers)):
+            Times, Samples, Millis = self.Readers[i].Drain()
+            self.__times[i] = np.concatenate((self.__times[i], Times))
+            self.__samples[i] = np.concatenate((self.__samples[i], Samples))
+            self.__millis[i] = np.concatenate((self.__millis[i], Millis))
+
+        start = time.perf_counter_ns()
+        Empty = (np.zeros(0, dtype = np.int64), np.zeros((0, len(self.Columns))), np.zeros((0, len(self.Columns)), dtype = np.int64))
+        if(min([len(Times) for Times in self.__times]) == 0):
+            return Empty    #Waiting on at least one board
+        if(self.__t0 == None):
+            self.__t0 = max([int(Times[0]) for Times in self.__times])
+
+        PeriodNs = int(self.Period * 1000000)
+        tEnd = min([int(Times[-1]) for Times in self.__times])
+        nRows = (tEnd - self.__t0) // PeriodNs + 1 - self.__row
+        if(nRows <= 0):
+            return Empty
+
+        Grid = self.__t0 + (self.__row + np.arange(nRows, dtype = np.int64)) * PeriodNs
+        Rows = np.zeros((nRows, len(self.Columns)))
+        MillisRows = np.zeros((nRows, len(self.Columns)), dtype = np.int64)
+        C = self.Channels
+        for i in range(0, len(self.Readers)):
+            index = np.searchsorted(self.__times[i], Grid, side = 'right') - 1
+            Rows[:, i * C:(i + 1) * C] = self.__samples[i][index]
+            MillisRows[:, i * C:(i + 1) * C] = self.__millis[i][index, None]
+            self.__times[i] = self.__times[i][index[-1]:]     #Keep the newest used sample for the next row
+            self.__samples[i] = self.__samples[i][index[-1]:]
+            self.__millis[i] = self.__millis[i][index[-1]:]
+        self.__row += nRows
+        METRICS.Add('Align', time.perf_counter_ns() - start)
+        return Grid, Rows, MillisRows
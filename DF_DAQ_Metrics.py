@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+"""
+DF_DAQ_Metrics - Counters and latency histograms for every stage of the
+acquisition pipeline
+
+Each stage adds the time it took (nSec, from time.perf_counter_ns) to its
+DF_DAQ_Stage, counters count events such as dropped or late samples:
+
+    start = time.perf_counter_ns()
+    ...
+    METRICS.Add('Parse', time.perf_counter_ns() - start)
+    METRICS.Count('Dropped', n)
+
+A stage keeps its count, total, maximum and a histogram of power of two
+buckets (bucket k holds the times from 2^(k-1) to 2^k nSec), so adding a time
+costs a few hundred nSec and no memory, and the metrics can be left on for
+every run. Percentiles come from the histogram and are the upper edge of
+their bucket, at most twice the true value. METRICS is shared by every module
+of the app. The GUI shows Status under the live plot and Saves the metrics
+next to the capture file (<capture>.metrics.json) when a test stops, the CLI
+saves them the same way.
+
+Stages: Serial Wait (blocked in a serial read), Reply Wait (command to its
+reply), Parse (stream decoding), Buffer Append (reader buffer), Align (rows of
+several boards), Drain, Convert (to PSI), Stats (DF_DAQ_Stats), Trigger
+(DF_DAQ_Trigger), Filter (DF_DAQ_Filters), Plot Append (plot buffers),
+Downsample, setData, Tick (the whole plot update), Capture Write, Capture Sync
+and Save (Excel export).
+Counters: Samples, Dropped (samples not drained in time), Late (samples that
+reached the plot more than LATE_MS of wall clock time after they were received,
+for a replay after it released them, none for a replay as fast as possible),
+Bad Samples and Lost Frames.
+
+@author: DroidForge Engineering
+"""
+
+import datetime
+import json
+import threading
+
+METRIC_BUCKETS = 40     #Up to 2^39 nSec (9 minutes), longer times go in the last bucket
+LATE_MS = 250           #A sample that reaches the plot later than this after it was received is late
+
+#==============================================================================
+# Input Parameters: Name (Str)
+# Output Returns: none
+#
+# Description: Timing of one pipeline stage, see the module description. Safe
+# to Add to from any thread.
+#==============================================================================
+class DF_DAQ_Stage():
+    def __init__(self, Name):
+        self.Name = Name
+        self.Count = 0
+        self.TotalNs = 0
+        self.MaxNs = 0
+        self.Histogram = [0] * METRIC_BUCKETS
+        self.__lock = threading.Lock()
+
+    def Add(self, Ns):
+        Ns = int(Ns)
+        with self.__lock:
+            self.Count += 1
+            self.TotalNs += Ns
+            if(Ns > self.MaxNs):
+                self.MaxNs = Ns
+            self.Histogram[min(max(Ns, 0).bit_length(), METRIC_BUCKETS - 1)] += 1
+
+#==============================================================================
+# Input Parameters: q (Float, 0 to 1)
+# Output Returns: Time (Int, nSec), 0 if nothing was added
+#==============================================================================
+    def Percentile(self, q):
+        target = q * self.Count
+        total = 0
+        for k in range(0, METRIC_BUCKETS):
+            total += self.Histogram[k]
+            if(total >= target and total > 0):
+                return min(1 << k, self.MaxNs) if (k > 0) else 0
+        return 0
+
+    def Summary(self):
+        return {'Count'       : self.Count,
+                'Mean (mSec)' : round(self.TotalNs / self.Count / 1e6, 4) if (self.Count > 0) else 0.0,
+                'p50 (mSec)'  : round(self.Percentile(0.5) / 1e6, 4),
+                'p99 (mSec)'  : round(self.Percentile(0.99) / 1e6, 4),
+                'Max (mSec)'  : round(self.MaxNs / 1e6, 4),
+                'Total (sec)' : round(self.TotalNs / 1e9, 4)}
+
+#==============================================================================
+# Input Parameters: none
+# Output Returns: none
+#
+# Description: Every stage and counter of a run, see the module description.
+# Nothing is recorded while Enabled is False.
+#==============================================================================
+class DF_DAQ_Metrics():
+    def __init__(self):
+        self.Enabled = True
+        self.Stages = {}
+        self.Counters = {}
+        self.Start = datetime.datetime.now()
+        self.__lock = threading.Lock()
+
+    def Reset(self):
+        with self.__lock:
+            self.Stages = {}
+            self.Counters = {}
+            self.Start = datetime.datetime.now()
+
+    def Stage(self, Name):
+        Stage = self.Stages.get(Name)
+        if(Stage == None):
+            with self.__lock:
+                Stage = self.Stages.setdefault(Name, DF_DAQ_Stage(Name))
+        return Stage
+
+    def Add(self, Name, Ns):
+        if(self.Enabled):
+            self.Stage(Name).Add(Ns)
+
+    def Count(self, Name, n = 1):
+        if(self.Enabled and n != 0):
+            with self.__lock:
+                self.Counters[Name] = self.Counters.get(Name, 0) + int(n)
+
+    def Summary(self):
+        return {'Start'    : self.Start.isoformat(),
+                'End'      : datetime.datetime.now().isoformat(),
+                'Stages'   : {Name : Stage.Summary() for Name, Stage in list(self.Stages.items())},
+                'Counters' : dict(self.Counters)}
+
+#==============================================================================
+# Input Parameters: Stages (List of Str), Counters (List of Str)
+# Output Returns: Status (Str)
+#
+# Description: One line for a status area, the p99 of the given stages and the
+# given counters. Ex: 'Tick 2.1 | setData 1.0 mSec p99 | Dropped 0 | Late 0'
+#==============================================================================
+    def Status(self, Stages = ['Tick', 'Downsample', 'setData'], Counters = ['Samples', 'Dropped', 'Late']):
+        Times = ['%s %.1f' % (Name, self.Stages[Name].Percentile(0.99) / 1e6) for Name in Stages if Name in self.Stages]
+        Status = [' | '.join(Times) + ' mSec p99'] if (len(Times) > 0) else []
+        Status += [Name + ' ' + str(self.Counters.get(Name, 0)) for Name in Counters]
+        return ' | '.join(Status)
+
+#==============================================================================
+# Input Parameters: fname (Str)
+# Output Returns: none
+#
+# Description: Writes the Summary and every stage's histogram (counts per
+# bucket, 'Bucket Edges (nSec)' are the upper edges) to a JSON file.
+#==============================================================================
+    def Save(self, fname):
+        Summary = self.Summary()
+        Summary['Bucket Edges (nSec)'] = [0] + [1 << k for k in range(1, METRIC_BUCKETS)]
+        Summary['Histograms'] = {Name : list(Stage.Histogram) for Name, Stage in list(self.Stages.items())}
+        with open(fname, 'w') as f:
+            json.dump(Summary, f, indent = 1)
+
+METRICS = DF_DAQ_Metrics()      #Shared by every stage of the app
@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+"""
+DF_DAQ_Replay - Replays a capture file (.dfc) as if its boards were attached
+
+DF_DAQ_Replay stands in for DF_DAQ (findPort, Probe, Group) and
+DF_DAQ_ReplayGroup for DF_DAQ_Group (start, Drain, ToPSI, ReceivedNs, zero,
+ZeroStart, ZeroDone, Stop), so the GUI, the capture writer and anything else built on
+them run unchanged on recorded data:
+
+    python DF-DAQ.py --replay Test-1.dfc --speed 10
+
+Each column of the capture shows up as one port, a board with several
+channels shows up as one port per channel. The rows are released when
+the replay clock reaches their recorded time, at Speed times real time, or as
+fast as the consumer drains them when Speed is 0. The host times Drain returns
+are the recorded ones (Times - StartNs is the original 'Time'), so a replayed
+run writes a capture with the original timing and TimingReport shows the
+original gaps and jitter. Like a live board, a timed replay drops the oldest
+samples (Overruns) when they are not drained in time. Done is True once the
+last row has been released.
+
+@author: DroidForge Engineering
+"""
+
+import os
+import threading
+import time
+
+import numpy as np
+
+from DF_DAQ_Capture import CaptureFile
+from DF_DAQ_Units import DF_DAQ_Transfer, UNIT_SCALE, ConvertUnits
+from DF_DAQ_Metrics import METRICS
+
+REPLAY_TICK = 0.005     #Sec between releases of a timed replay
+REPLAY_BLOCK = 65536    #Most rows released at once when replaying as fast as possible
+
+#==============================================================================
+# Input Parameters: fname (Str), Speed (Float, 0 for as fast as possible)
+# Output Returns: none
+#
+# Description: DF_DAQ for a capture file, see the module description. The
+# identity of every port comes from the capture's metadata, Type is 'Replay'.
+#==============================================================================
+class DF_DAQ_Replay():
+    def __init__(self, fname, Speed = 1.0):
+        print ('Replaying ' + fname + (' at ' + str(Speed) + 'x' if (Speed > 0) else ' as fast as possible'))
+        self.fname = fname
+        self.Speed = Speed
+        self.Info = CaptureFile(fname).Info
+        self.Port = list(self.Info.get('Columns', [])) or [os.path.basename(fname)]
+        self.Abort = False
+
+    def findPort(self):
+        return self.Port
+
+    def Probe(self, Ports, Refresh = False):
+        Identities = {}
+        for Port in Ports:
+            Identities[Port] = {'Port'     : Port,
+                                'Serial'   : None,
+                                'Firmware' : self.Info.get('Firmware', 'NA'),
+                                'Setup'    : self.Info.get('Setup', 'NA'),
+                                'Type'     : 'Replay',
+                                'Info'     : self.fname}
+        return Identities
+
+#==============================================================================
+# Input Parameters: Ports (List of Str), Period (Int, mSec), Binary (Bool),
+#                   Channels (Int)
+# Output Returns: DF_DAQ_ReplayGroup
+#
+# Description: Same as DF_DAQ.Group. Period, Binary and Channels are ignored,
+# the samples come at the recorded rate, in the recorded units and columns.
+#==============================================================================
+    def Group(self, Ports, Period, Binary = False, Channels = 1):
+        return DF_DAQ_ReplayGroup(self.fname, [self.Port.index(Port) for Port in Ports], self.Speed)
+
+#==============================================================================
+# Input Parameters: fname (Str), Index (List of Int, capture columns), 
+#                   Speed (Float), MaxSamples (Int)
+# Output Returns: none
+#
+# Description: DF_DAQ_Group for the given columns of a capture file, see the
+# module description. Columns names them. Units is what the capture stored 
+# (Counts, PSI, ...), ToPSI converts it the same way CaptureFile.Values does.
+#==============================================================================
+class DF_DAQ_ReplayGroup(threading.Thread):
+    def __init__(self, fname, Index = [0], Speed = 1.0, MaxSamples = 100000):
+        super(DF_DAQ_ReplayGroup, self).__init__()
+        self.daemon = True
+        self.Capture = CaptureFile(fname)
+        self.Index = list(Index)
+        Names = self.Capture.Info.get('Columns', [])
+        self.Columns = [Names[i] if (i < len(Names)) else 'Column ' + str(i + 1) for i in self.Index]
+        self.Speed = Speed
+        self.MaxSamples = MaxSamples
+        self.Units = self.Capture.Info.get('Units', 'PSI')
+        self.Raw = (self.Units == 'Counts')
+        self.Binary = self.Raw
+        Transfer = self.Capture.Info.get('Transfer', {})
+        self.Transfer = DF_DAQ_Transfer(**{Key : ([Value[i] for i in self.Index] if isinstance(Value, list) else Value) for Key, Value in Transfer.items()})
+        self.Overruns = 0
+        self.Stalls = 0
+        self.Error = None
+        self.Done = False
+        self.StartNs = None
+        self.__width = int(np.prod(self.Capture.Record['Value'].shape))
+        self.__lock = threading.Lock()
+        self.__blocks = []
+        self.__count = 0
+        self.__stop = threading.Event()
+
+    def start(self):
+        self.StartNs = time.perf_counter_ns()
+        super(DF_DAQ_ReplayGroup, self).start()
+
+    def __indexAfter(self, t):
+        #Rows recorded at or before t (Sec)
+        i = self.Capture.IndexAtTime(t)
+        return i + 1 if (self.Capture.Time(i, i + 1)[0] <= t) else i
+
+    def run(self):
+        Rows = len(self.Capture)
+        First = self.Capture.Time(0, 1)[0] if (Rows > 0) else 0.0
+        i = 0
+        while(i < Rows and not(self.__stop.is_set())):
+            if(self.Speed > 0):
+                end = self.__indexAfter(First + (time.perf_counter_ns() - self.StartNs) / 1e9 * self.Speed)
+            else:
+                with self.__lock:
+                    end = min(i + min(self.MaxSamples - self.__count, REPLAY_BLOCK), Rows)     #Wait for the consumer instead of dropping
+            if(end <= i):
+                self.__stop.wait(REPLAY_TICK if (self.Speed > 0) else 0.001)
+                continue
+            self.__release(i, end)
+            i = end
+        self.Done = True
+
+    def __release(self, Start, Stop):
+        Records = self.Capture.Records[Start:Stop]
+        Times = self.StartNs + (np.round(self.Capture.Time(Start, Stop) * 1e9)).astype(np.int64)
+        Samples = np.asarray(Records['Value'], dtype = np.float64).reshape(-1, self.__width)[:, self.Index]
+        Millis = np.asarray(Records['DeviceTime'], dtype = np.int64).reshape(-1, self.__width)[:, self.Index]
+        with self.__lock:
+            self.__blocks.append((Times, Samples, Millis))
+            self.__count += len(Samples)
+            while(self.__count > self.MaxSamples):     #Not drained in time, drop the oldest samples like a live board
+                Times, Samples, Millis = self.__blocks.pop(0)
+                dropped = min(len(Samples), self.__count - self.MaxSamples)
+                if(dropped < len(Samples)):
+                    self.__blocks.insert(0, (Times[dropped:], Samples[dropped:], Millis[dropped:]))
+                self.__count -= dropped
+                self.Overruns += dropped
+                METRICS.Count('Dropped', dropped)
+
+    def Stop(self):
+        if(self.is_alive()):
+            self.__stop.set()
+            self.join()
+        print ('Replay Stopped')
+
+    def zero(self):
+        print ('ERROR - A replay can not be zeroed')
+        return 0
+
+    def ZeroStart(self):
+        self.zero()
+
+    def ZeroDone(self):
+        return 0
+
+#==============================================================================
+# Input Parameters: Samples (NumPy Array, Rows x Columns)
+# Output Returns: PSI (NumPy Array, Rows x Columns)
+#==============================================================================
+    def ToPSI(self, Samples):
+        if(self.Raw):
+            return self.Transfer.ToUnits(Samples)
+        if(self.Units in UNIT_SCALE):
+            return ConvertUnits(Samples, self.Units, 'PSI')
+        return Samples
+
+#==============================================================================
+# Input Parameters: Times (NumPy Array, nSec, from Drain)
+# Output Returns: Received (NumPy Array, nSec), host time the rows were 
+#                 released, None when Speed is 0 (released as drained)
+#
+# Description: Times are the recorded ones, a timed replay released them 
+# Speed times faster
+#==============================================================================
+    def ReceivedNs(self, Times):
+        if(self.Speed > 0):
+            return self.StartNs + ((Times - self.StartNs) / self.Speed).astype(np.int64)
+        return None
+
+#==============================================================================
+# Input Parameters: none
+# Output Returns: Times (NumPy Array, nSec), Samples (NumPy Array, Rows x Columns),
+#                 Millis (NumPy Array, Rows x Columns)
+#
+# Description: Same as DF_DAQ_Group.Drain, every row released since the last call
+#==============================================================================
+    def Drain(self):
+        with self.__lock:
+            blocks = self.__blocks
+            self.__blocks = []
+            self.__count = 0
+        if(len(blocks) == 0):
+            return np.zeros(0, dtype = np.int64), np.zeros((0, len(self.Columns))), np.zeros((0, len(self.Columns)), dtype = np.int64)
+        Times = np.concatenate([block[0] for block in blocks])
+        Samples = np.concatenate([block[1] for block in blocks])
+        Millis = np.concatenate([block[2] for block in blocks])
+        return Times, Samples, Millis
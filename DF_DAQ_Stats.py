@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+"""
+DF_DAQ_Stats - Live statistics of a run: mean, standard deviation, min, max
+and effective sample rate, for the whole run and for a rolling window
+
+The statistics are never computed by going back over the samples. Every batch
+is reduced to its moments (count, mean, sum of squared deviations, min, max,
+per column, failed reads left out) and merged into the running totals with
+the parallel form of Welford's algorithm, which stays accurate for any run
+length. The window is a ring of blocks of Block samples holding the moments
+of each block, so adding a sample costs the same whatever the window length,
+and reading the window merges Window / Block blocks. The window covers the
+newest whole blocks plus the block being filled, Window to Window + Block
+samples.
+
+The rate counts the samples each column really got, not the rows: with
+several boards the rows are on a grid of the host clock and a board that
+falls behind repeats its newest sample. With Millis (device times, Rows x
+Columns) a row only counts for a column when its device time changed. Rows
+without a device time (-1) always count.
+
+    Stats = DF_DAQ_Stats(Width = 2, Window = 2000)
+    Stats.Extend(Times, y, Millis)
+    Stats.Run()['Mean'], Stats.Windowed()['Std']
+
+@author: DroidForge Engineering
+"""
+
+import numpy as np
+
+STATS_BLOCK = 256       #Samples per block of the window ring
+
+#==============================================================================
+# Input Parameters: y (NumPy Array, Blocks x Rows x Columns)
+# Output Returns: Moments (Tuple of NumPy Arrays, Blocks x Columns: Count, Mean,
+#                 M2, Min, Max)
+#
+# Description: Moments of every block, failed reads (NaN) left out. The Mean
+# of a column without samples is 0 and its Min and Max are +/- inf, so it
+# merges as nothing.
+#==============================================================================
+def BlockMoments(y):
+    Valid = ~np.isnan(y)
+    Count = Valid.sum(axis = 1)
+    y0 = np.where(Valid, y, 0.0)
+    Mean = y0.sum(axis = 1) / np.maximum(Count, 1)
+    M2 = (np.where(Valid, y - Mean[:, None, :], 0.0) ** 2).sum(axis = 1)
+    Min = np.where(Valid, y, np.inf).min(axis = 1)
+    Max = np.where(Valid, y, -np.inf).max(axis = 1)
+    return Count, Mean, M2, Min, Max
+
+#==============================================================================
+# Input Parameters: Count, Mean, M2, Min, Max (NumPy Arrays, Blocks x Columns)
+# Output Returns: Moments (Tuple of NumPy Arrays, Columns)
+#
+# Description: Merges the moments of several blocks into the moments of all of
+# their samples (Chan et al., the parallel form of Welford's algorithm).
+#==============================================================================
+def MergeMoments(Count, Mean, M2, Min, Max):
+    Total = Count.sum(axis = 0)
+    Merged = (Count * Mean).sum(axis = 0) / np.maximum(Total, 1)
+    M2 = M2.sum(axis = 0) + (Count * (Mean - Merged) ** 2).sum(axis = 0)
+    return Total, Merged, M2, Min.min(axis = 0), Max.max(axis = 0)
+
+#==============================================================================
+# Input Parameters: Moments (Tuple), New (NumPy Array, samples per column),
+#                   First, Last (Int, nSec)
+# Output Returns: Stats (Dict of NumPy Arrays, one value per column, NaN for
+#                 a column without samples, 'Rate' in samples/s)
+#==============================================================================
+def Summary(Moments, New, First, Last):
+    Count, Mean, M2, Min, Max = Moments
+    Empty = (Count == 0)
+    Seconds = (Last - First) / 1e9
+    return {'Count' : Count,
+            'Mean'  : np.where(Empty, np.nan, Mean),
+            'Std'   : np.where(Count > 1, np.sqrt(M2 / np.maximum(Count - 1, 1)), np.nan),
+            'Min'   : np.where(Empty, np.nan, Min),
+            'Max'   : np.where(Empty, np.nan, Max),
+            'Rate'  : np.where(New > 1, (New - 1) / Seconds, np.nan) if (Seconds > 0) else np.full(len(Count), np.nan)}
+
+#==============================================================================
+# Input Parameters: Width (Int, columns), Window (Int, samples), Block (Int,
+#                   samples)
+# Output Returns: none
+#
+# Description: Whole run and rolling window statistics, see the module
+# description. Rate is the effective sample rate of every column, new samples
+# per second of host time.
+#==============================================================================
+class DF_DAQ_Stats():
+    def __init__(self, Width = 1, Window = 2000, Block = STATS_BLOCK):
+        self.Width = Width
+        self.Block = max(min(Block, Window), 1)
+        self.Blocks = max(-(-Window // self.Block), 1)     #Whole blocks covering the window
+        self.Clear()
+
+    def Clear(self):
+        W = self.Width
+        self.Rows = 0
+        self.First = None
+        self.Last = None
+        self.__run = (np.zeros(W, dtype = np.int64), np.zeros(W), np.zeros(W), np.full(W, np.inf), np.full(W, -np.inf))
+        self.__runNew = np.zeros(W, dtype = np.int64)
+        self.__lastMillis = None        #Device time of the newest row, per column
+        #Ring of whole blocks: moments, new samples and host time of the first row of each
+        B = self.Blocks
+        self.__ring = [np.zeros((B, W), dtype = np.int64), np.zeros((B, W)), np.zeros((B, W)), np.full((B, W), np.inf), np.full((B, W), -np.inf)]
+        self.__ringNew = np.zeros((B, W), dtype = np.int64)
+        self.__ringFirst = np.zeros(B, dtype = np.int64)
+        self.__next = 0
+        self.__full = 0
+        self.__partial = np.zeros((0, W))       #Block being filled
+        self.__partialNew = np.zeros((0, W), dtype = bool)
+        self.__partialTimes = np.zeros(0, dtype = np.int64)
+
+    def __new(self, Millis, Rows):
+        #Rows that hold a sample the column did not have in the row before
+        if(Millis is None):
+            return np.ones((Rows, self.Width), dtype = bool)
+        Millis = np.asarray(Millis, dtype = np.int64).reshape(Rows, self.Width)
+        First = (Millis[:1] - 1) if (self.__lastMillis is None) else self.__lastMillis[None, :]     #The first row of the run is new
+        prev = np.concatenate((First, Millis[:-1]))
+        self.__lastMillis = Millis[-1]
+        return (Millis != prev) | (Millis < 0)
+
+#==============================================================================
+# Input Parameters: Times (NumPy Array, nSec), y (NumPy Array, Rows x Columns),
+#                   Millis (NumPy Array, Rows x Columns, device times, None
+#                   if every row is a new sample)
+# Output Returns: none
+#==============================================================================
+    def Extend(self, Times, y, Millis = None):
+        if(len(y) == 0):
+            return
+        y = np.asarray(y, dtype = np.float64).reshape(len(y), self.Width)
+        New = self.__new(Millis, len(y))
+        if(self.First == None):
+            self.First = int(Times[0])
+        self.Last = int(Times[-1])
+        self.Rows += len(y)
+        self.__runNew += New.sum(axis = 0)
+        Moments = BlockMoments(y[None])
+        self.__run = MergeMoments(*[np.stack((Run, Batch[0])) for Run, Batch in zip(self.__run, Moments)])
+
+        y = np.concatenate((self.__partial, y))
+        New = np.concatenate((self.__partialNew, New))
+        Times = np.concatenate((self.__partialTimes, Times))
+        n = len(y) - len(y) % self.Block
+        if(n > 0):
+            Whole = y[:n].reshape(-1, self.Block, self.Width)[-self.Blocks:]     #Older blocks would leave the window at once
+            First = Times[:n:self.Block][-self.Blocks:]
+            index = (self.__next + np.arange(len(Whole))) % self.Blocks
+            for Ring, Value in zip(self.__ring, BlockMoments(Whole)):
+                Ring[index] = Value
+            self.__ringNew[index] = New[:n].reshape(-1, self.Block, self.Width)[-self.Blocks:].sum(axis = 1)
+            self.__ringFirst[index] = First
+            self.__next = (index[-1] + 1) % self.Blocks
+            self.__full = min(self.__full + len(Whole), self.Blocks)
+        self.__partial = y[n:]
+        self.__partialNew = New[n:]
+        self.__partialTimes = Times[n:]
+
+#==============================================================================
+# Input Parameters: none
+# Output Returns: Stats (Dict, see Summary) of the whole run
+#==============================================================================
+    def Run(self):
+        if(self.Rows == 0):
+            return Summary(self.__run, self.__runNew, 0, 0)
+        return Summary(self.__run, self.__runNew, self.First, self.Last)
+
+#==============================================================================
+# Input Parameters: none
+# Output Returns: Stats (Dict, see Summary) of the window
+#==============================================================================
+    def Windowed(self):
+        used = (self.__next - 1 - np.arange(self.__full)) % self.Blocks       #Newest block first
+        Moments = [Ring[used] for Ring in self.__ring]
+        Rows = self.__full * self.Block + len(self.__partial)
+        New = self.__ringNew[used].sum(axis = 0) + self.__partialNew.sum(axis = 0)
+        if(len(self.__partial) > 0):
+            Moments = [np.concatenate((Block, Partial)) for Block, Partial in zip(Moments, BlockMoments(self.__partial[None]))]
+        if(Rows == 0):
+            return self.Run()       #Nothing added yet
+        First = int(self.__ringFirst[used[-1]]) if (self.__full > 0) else int(self.__partialTimes[0])
+        return Summary(MergeMoments(*Moments), New, First, self.Last)
@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""
+DF_DAQ_Trigger - Triggered capture: only the samples around pressure events
+are kept
+
+A trigger watches the samples for an event and passes on the Pre samples
+before every trigger and the Post samples from it on, everything else is
+dropped. The samples before a trigger wait in a ring of at most Pre rows, so
+memory and file size grow with the number of events, not the length of the
+run. A trigger inside the window of the one before extends that window, it
+is the same event. Every batch is checked with whole array NumPy operations:
+
+    level V      a sample at or above V
+    rising V     a sample crossing V going up
+    falling V    a sample crossing V going down
+    rate V       a change of at least V per second, either way
+
+    Trigger = ParseTrigger('rising 0.8 pre 2 post 5', Rate = 200)
+    x, Times, Values = Trigger.Process(y, x, Times, Values)
+
+The text form is the mode and its threshold, then optionally 'pre' and 'post'
+in seconds (default 1 each) and 'column' (from 1, default any column).
+
+@author: DroidForge Engineering
+"""
+
+import numpy as np
+
+TRIGGER_MODES = ['level', 'rising', 'falling', 'rate']
+
+#==============================================================================
+# Input Parameters: Mode (Str, see TRIGGER_MODES), Level (Float, PSI or PSI/s),
+#                   Pre, Post (Int, samples), Column (Int from 0, None for
+#                   any column), Rate (Float, samples per second), Units (Str,
+#                   units the threshold is shown in), Scale (Float, Units per 
+#                   PSI)
+# Output Returns: none
+#
+# Description: See the module description. Events counts the triggers that
+# started a new window, Kept the samples passed on. The text form shows the
+# threshold in Units, Describe adds the unit name.
+#==============================================================================
+class DF_DAQ_Trigger():
+    def __init__(self, Mode, Level, Pre, Post, Column = None, Rate = 1.0, Units = 'PSI', Scale = 1.0):
+        if(Mode not in TRIGGER_MODES):
+            raise ValueError('unknown trigger "' + str(Mode) + '", use ' + ', '.join(TRIGGER_MODES))
+        if(Pre < 0 or Post < 1):
+            raise ValueError('trigger needs pre >= 0 and post > 0')
+        if(Column != None and Column < 0):
+            raise ValueError('trigger column counts from 1')
+        self.Mode = Mode
+        self.Level = float(Level)
+        self.Pre = int(Pre)
+        self.Post = int(Post)
+        self.Column = Column
+        self.Rate = float(Rate)
+        self.Units = Units
+        self.Scale = float(Scale)
+        self.Reset()
+
+    def Reset(self):
+        self.Events = 0
+        self.Kept = 0
+        self.__last = None          #Newest watched values, for edges and rates
+        self.__ring = None          #Samples not passed on yet, newest Pre
+        self.__remaining = 0        #Samples still to pass on for the open window
+
+    def __fire(self, y):
+        v = y if (self.Column == None) else y[:, [self.Column]]
+        if(self.__last is None):
+            self.__last = np.full(v.shape[1], np.nan)
+        prev = np.concatenate((self.__last[None, :], v[:-1]))
+        self.__last = v[-1]
+        if(self.Mode == 'level'):
+            Fire = (v >= self.Level)
+        elif(self.Mode == 'rising'):
+            Fire = (prev < self.Level) & (v >= self.Level)
+        elif(self.Mode == 'falling'):
+            Fire = (prev > self.Level) & (v <= self.Level)
+        else:
+            Fire = (np.abs(v - prev) * self.Rate >= self.Level)
+        return Fire.any(axis = 1)
+
+#==============================================================================
+# Input Parameters: y (NumPy Array, Rows x Columns, watched values), *Arrays
+#                   (NumPy Arrays, one row per row of y, what is passed on)
+# Output Returns: Arrays (List of NumPy Arrays), only the rows in a window
+#==============================================================================
+    def Process(self, y, *Arrays):
+        if(len(y) == 0):
+            return [Array[:0] for Array in Arrays]
+        y = np.asarray(y, dtype = np.float64).reshape(len(y), -1)
+        if(self.__ring is None):
+            self.__ring = [Array[:0] for Array in Arrays]
+        r = len(self.__ring[0])
+        Data = [np.concatenate((Ring, Array)) for Ring, Array in zip(self.__ring, Arrays)]
+        N = len(Data[0])
+
+        Fire = r + np.flatnonzero(self.__fire(y))
+        if(len(Fire) == 0 and self.__remaining == 0):     #Quiet, the usual case: only the ring moves on
+            self.__ring = [Array[N - min(self.Pre, N):] for Array in Data]
+            return [Array[:0] for Array in Data]
+        Open = r + self.__remaining         #End of the window left open by the last batch
+        Ends = Fire + self.Post
+        if(len(Fire) > 0):
+            Before = np.maximum.accumulate(np.concatenate(([Open], Ends[:-1])))   #End of every window opened before each trigger
+            self.Events += int(np.count_nonzero(Fire >= Before))
+            Open = max(Open, int(Ends[-1]))
+        Edges = np.zeros(N + 1, dtype = np.int64)
+        Edges[r] += 1
+        Edges[min(r + self.__remaining, N)] -= 1
+        np.add.at(Edges, np.maximum(Fire - self.Pre, 0), 1)
+        np.add.at(Edges, np.minimum(Ends, N), -1)
+        Keep = np.cumsum(Edges[:N]) > 0
+        self.__remaining = max(Open - N, 0)
+
+        Kept = np.flatnonzero(Keep)
+        Start = max(Kept[-1] + 1 if (len(Kept) > 0) else 0, N - self.Pre)
+        self.__ring = [Array[Start:] for Array in Data]
+        self.Kept += len(Kept)
+        return [Array[Kept] for Array in Data]
+
+    def __str__(self):
+        Text = self.Mode + ' %g pre %g post %g' % (self.Level * self.Scale, self.Pre / self.Rate, self.Post / self.Rate)
+        return Text + ('' if (self.Column == None) else ' column ' + str(self.Column + 1))
+
+    def Describe(self):
+        return str(self) + ' (' + self.Units + ('/s' if (self.Mode == 'rate') else '') + ')'
+
+#==============================================================================
+# Input Parameters: Text (Str, Ex: 'rising 0.8 pre 2 post 5'), Rate (Float,
+#                   samples per second), Scale (Float, units of the text per PSI),
+#                   Columns (Int, columns of the samples, None if not known),
+#                   Units (Str, name of the units of Scale)
+# Output Returns: DF_DAQ_Trigger, None for an empty text (or 'none')
+#
+# Description: Builds a trigger from its text form, see the module
+# description. The threshold is in the units of Scale (UNIT_SCALE) and kept in
+# PSI, the trigger's text form shows it in those units again. Raises 
+# ValueError for anything it does not understand, including a column that is
+# not one of Columns.
+#==============================================================================
+def ParseTrigger(Text, Rate, Scale = 1.0, Columns = None, Units = 'PSI'):
+    Fields = Text.replace(',', ' ').lower().split()
+    if(len(Fields) == 0 or Fields == ['none']):
+        return None
+    if(len(Fields) % 2 != 0 or Fields[0] not in TRIGGER_MODES):
+        raise ValueError('unknown trigger "' + Text.strip() + '", use [' + '|'.join(TRIGGER_MODES) + '] V pre S post S column N')
+    Options = {'pre' : 1.0, 'post' : 1.0, 'column' : None}
+    for Key, Value in zip(Fields[2::2], Fields[3::2]):
+        if(Key not in Options):
+            raise ValueError('unknown trigger option "' + Key + '"')
+        Options[Key] = float(Value)
+    Column = None if (Options['column'] == None) else int(Options['column']) - 1
+    if(Column != None and (Column != Options['column'] - 1 or Column < 0 or (Columns != None and Column >= Columns))):
+        raise ValueError('no trigger column ' + Fields[Fields.index('column') + 1] + (', use 1 to ' + str(Columns) if (Columns != None) else ', columns count from 1'))
+    return DF_DAQ_Trigger(Fields[0], float(Fields[1]) / Scale, int(round(Options['pre'] * Rate)), int(round(Options['post'] * Rate)),
+                          Column, Rate, Units, Scale)
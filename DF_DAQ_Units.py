@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""
+DF_DAQ_Units - Pressure units and sensor count conversion
+
+@author: DroidForge Engineering
+"""
+
+import numpy as np
+
+#Pressure units the firmware supports (Adafruit_MPRLS::readPressure), value of 1 PSI in each
+UNIT_SCALE = {'PSI'   : 1.0,
+              'HPA'   : 6894.7572932,
+              'KPA'   : 6.8947572932,
+              'MBAR'  : 68.947572932,
+              'BAR'   : 0.068947572932,
+              'CMH2O' : 70.3069578296,
+              'INH2O' : 27.6799048425,
+              'MMHG'  : 51.71492}
+
+#MPRLS transfer functions (DroidForge_MPR.h), [Count Min, Count Max]
+TRANSFER_FUNCTIONS = {'A' : [0x19999A, 0xE66666],   #10% to 90% of 2^24 counts
+                      'B' : [0x066666, 0x39999A],   #2.5% to 22.5% of 2^24 counts
+                      'C' : [0x333333, 0xCCCCCD]}   #20% to 80% of 2^24 counts
+
+COUNT_FAILED = 0xFFFFFF         #Count sent when the sensor read failed
+
+#==============================================================================
+# Input Parameters: Function (Str), PSIMin (Float), PSIMax (Float), Offset (Int)
+# Output Returns: none
+#
+# Description: Transfer function of a pressure sensor, turns raw 24 bit counts
+# into pressure the same way Adafruit_MPRLS::readPressure does. Offset is a
+# zero offset (counts) removed on the host, on top of the firmware's autoZero.
+# Every parameter can also be a list with one entry per board, the conversion
+# then works column by column on Samples x Boards arrays. The defaults match
+# the pressureSensorLogger sensor (MPRSS0001PG00001C).
+#==============================================================================
+class DF_DAQ_Transfer():
+    def __init__(self, Function = 'C', PSIMin = 0.0, PSIMax = 1.0, Offset = 0):
+        self.Function = Function
+        self.PSIMin = PSIMin
+        self.PSIMax = PSIMax
+        self.Offset = Offset
+        Range = np.array([TRANSFER_FUNCTIONS[F] for F in np.atleast_1d(Function)], dtype = np.float64)
+        self.__countMin = Range[:, 0] if (np.ndim(Function) > 0) else Range[0, 0]
+        self.__countMax = Range[:, 1] if (np.ndim(Function) > 0) else Range[0, 1]
+
+    def Info(self):
+        return {'Function' : self.Function, 'PSIMin' : self.PSIMin, 'PSIMax' : self.PSIMax, 'Offset' : self.Offset}
+
+#==============================================================================
+# Input Parameters: Counts (Array like), Units (Str)
+# Output Returns: Pressure (NumPy Array)
+#
+# Description: Converts a whole batch of counts to Units in one expression.
+# Failed reads (COUNT_FAILED) become NaN.
+#==============================================================================
+    def ToUnits(self, Counts, Units = 'PSI'):
+        Counts = np.asarray(Counts, dtype = np.float64)    #Counts below the range are negative pressure
+        Scale = UNIT_SCALE[Units]
+        PSIMin = np.asarray(self.PSIMin, dtype = np.float64)
+        Span = np.asarray(self.PSIMax, dtype = np.float64) - PSIMin
+        return np.where(Counts == COUNT_FAILED, np.nan,
+                        ((Counts - self.Offset - self.__countMin) * (Span / (self.__countMax - self.__countMin)) + PSIMin) * Scale)
+
+#==============================================================================
+# Input Parameters: Transfers (List of DF_DAQ_Transfer)
+# Output Returns: DF_DAQ_Transfer
+#
+# Description: One transfer function with a column per board, for converting
+# the Samples x Boards arrays of DF_DAQ_Group.
+#==============================================================================
+def StackTransfers(Transfers):
+    return DF_DAQ_Transfer([T.Function for T in Transfers], [T.PSIMin for T in Transfers],
+                           [T.PSIMax for T in Transfers], [T.Offset for T in Transfers])
+
+#==============================================================================
+# Input Parameters: Values (Array like), From (Str), To (Str)
+# Output Returns: Values (NumPy Array)
+#
+# Description: Converts pressure readings from one unit to another.
+#==============================================================================
+def ConvertUnits(Values, From, To):
+    return np.asarray(Values, dtype = np.float64) * (UNIT_SCALE[To] / UNIT_SCALE[From])
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""
+bench_async - AsyncDF_DAQ against several pty fake boards (DF_DAQ_Emulator) on
+one event loop. POSIX only.
+
+Run from the repository root:  python benchmarks/bench_async.py [Boards] [Seconds]
+
+@author: DroidForge Engineering
+"""
+
+import asyncio
+import sys
+import time
+
+import numpy as np
+
+from harness import Check
+
+from DF_DAQ_Async import AsyncDF_DAQ, Acquire
+from DF_DAQ_Emulator import FakeDevice
+
+PERIOD = 4      #Sample period (mSec)
+
+async def Commands(Devices):
+    daqs = [AsyncDF_DAQ(Device.Port) for Device in Devices]
+    for daq in daqs:
+        await daq.Open()
+    start = time.perf_counter()
+    Versions = await asyncio.gather(*[daq.getFirmVer() for daq in daqs])
+    Setups = await asyncio.gather(*[daq.getSetup() for daq in daqs])
+    Reads = await asyncio.gather(*[daq.Read() for daq in daqs])
+    Seconds = time.perf_counter() - start
+    for daq in daqs:
+        await daq.Close()
+    return Versions, Setups, Reads, Seconds
+
+async def SlowConsumer(Device, Seconds):
+    Samples = 0
+    async with AsyncDF_DAQ(Device.Port, QueueSize = 2) as daq:
+        await daq.StreamStart(PERIOD, True)
+        asyncio.get_event_loop().call_later(Seconds, lambda: asyncio.ensure_future(daq.StreamStop()))
+        async for Times, Batch, Millis in daq.Stream():
+            Samples += len(Batch)
+            await asyncio.sleep(0.1)       #Consumer much slower than the board
+        return Samples, daq.Paused, daq.LostFrames
+
+if __name__ == '__main__':
+    Boards = int(sys.argv[1]) if (len(sys.argv) > 1) else 4
+    Seconds = float(sys.argv[2]) if (len(sys.argv) > 2) else 2.0
+    Devices = [FakeDevice() for i in range(0, Boards)]
+    loop = asyncio.get_event_loop()
+    Passed = True
+
+    print ('Commands (' + str(Boards) + ' boards)')
+    Versions, Setups, Reads, CommandSec = loop.run_until_complete(Commands(Devices))
+    Passed &= Check('versions', all([Version.strip() == Devices[0].Version for Version in Versions]))
+    Passed &= Check('setups', all([Setup.strip() == 'P-PSI-1-50-10' for Setup in Setups]))
+    Passed &= Check('reads', all([0.3 < Read < 0.7 for Read in Reads]))
+    print ('  %.1f mSec for 3 commands on every board' % (CommandSec * 1000))
+
+    for Binary in [False, True]:
+        print ('Streaming (' + ('binary' if Binary else 'text') + ', ' + str(Seconds) + ' sec)')
+        Sent = [Device.Sent for Device in Devices]
+        Results = loop.run_until_complete(Acquire([Device.Port for Device in Devices], PERIOD, Seconds, Binary))
+        for i in range(0, Boards):
+            Times, Samples, Millis = Results[Devices[i].Port]
+            Expected = Devices[i].Sent - Sent[i]
+            Steps = np.diff(Millis)
+            Passed &= Check('%s %d of %d samples, device time steps %d..%d mSec' % (Devices[i].Port, len(Samples), Expected, Steps.min(), Steps.max()),
+                            len(Samples) >= Expected - 8 and Steps.min() > 0)
+
+    print ('Backpressure')
+    Samples, Paused, Lost = loop.run_until_complete(SlowConsumer(Devices[0], Seconds))
+    Passed &= Check('reading paused %d times, %d samples, %d frames lost' % (Paused, Samples, Lost), Paused > 0 and Lost == 0)
+
+    for Device in Devices:
+        Device.Close()
+    sys.exit(0 if Passed else 1)
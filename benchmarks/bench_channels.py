@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+"""
+bench_channels - Boards with several channels: decoding cost per value of the
+text and binary streams for 1, 4 and 16 channels, a streaming session and a
+group of pty fake boards with 4 channels each (DF_DAQ_Emulator), and the GUI
+(offscreen) plotting one curve per channel and writing every channel to the
+capture and Excel files. POSIX only.
+
+Run from the repository root:  python benchmarks/bench_channels.py [Seconds]
+
+@author: DroidForge Engineering
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from harness import Check, Spin, RunGUI, SelectBoards
+
+import DF_DAQ_HW_Interface
+from DF_DAQ_HW_Interface import DF_DAQ_TextDecoder, DF_DAQ_FrameDecoder, DF_DAQ_Session, DF_DAQ_Group, ColumnNames
+from DF_DAQ_Emulator import FakeDevice, EncodeText, EncodeFrames, PSIToCounts
+from DF_DAQ_Capture import CaptureFile
+from DF_DAQ_Units import DF_DAQ_Transfer
+
+VALUES = 2 * 10**5      #Values (samples x channels) decoded per channel count
+CHANNELS = [1, 4, 16]
+READ_SIZE = 4096        #Bytes per serial read
+FLAT = 1.5              #Most a value may cost with 16 channels relative to 1
+BOARD_CHANNELS = 4
+SETUP = 'P-PSI-' + str(BOARD_CHANNELS) + '-200-200'
+
+def Decode(Decoder, Stream):
+    Outputs = []
+    start = time.perf_counter()
+    for i in range(0, len(Stream), READ_SIZE):
+        Outputs.append(Decoder.Decode(Stream[i:i + READ_SIZE]))
+    return Outputs, time.perf_counter() - start
+
+#Different phase on every channel, so a swapped column shows up
+def Phases(t, Channels):
+    return 0.5 + 0.3 * np.sin(np.asarray(t)[:, None] / 50.0 + np.arange(Channels))
+
+def Bench(app, form):
+    SelectBoards(app, form)
+    form.fileUniqueStr = os.path.join(Folder, 'GUI.xlsx')
+    form.ToggleStartStop()
+    Spin(app, Seconds / 2)
+    start = time.perf_counter()
+    form.zeroSensor()       #Boards acknowledge it on a later timer tick
+    Blocked = time.perf_counter() - start
+    Spin(app, Seconds / 2)
+    Zeroed = Check('GUI zero returned in %.2f mSec, acknowledged by every board later' % (Blocked * 1000),
+                   Blocked < 0.02 and not(form.zeroing) and 'Zero Set' in form.Log.toPlainText())
+    Curves = len(form.data_lines)
+    Names = [line.name() for line in form.data_lines]
+    form.ToggleStartStop()
+    Capture = CaptureFile(os.path.join(Folder, 'GUI.dfc'))
+    Expected = ColumnNames([Device.Port for Device in Devices], BOARD_CHANNELS)
+    Values = Capture.Values('PSI')
+    return Zeroed & Check('GUI %d curves, capture %d rows x %d columns %s' % (Curves, len(Capture), Values.shape[1], Capture.Info['Columns'][:2]),
+                 Curves == len(Expected) and Names == Expected and Capture.Info['Columns'] == Expected and
+                 Values.shape[1] == len(Expected) and len(Capture) > 0 and os.path.exists(form.fileUniqueStr))
+
+if __name__ == '__main__':
+    Seconds = float(sys.argv[1]) if (len(sys.argv) > 1) else 2.0
+    Passed = True
+
+    print ('Decoding cost per value (%d values, uSec)' % VALUES)
+    Cost = {}
+    for Channels in CHANNELS:
+        n = VALUES // Channels
+        n -= n % 8
+        Counts = PSIToCounts(Phases(np.arange(n), Channels))
+        Millis = 1000 + np.arange(n, dtype = np.int64) * 2
+        Text = EncodeText(np.round(Phases(np.arange(n), Channels), 4), Millis)
+        Outputs, TextSec = Decode(DF_DAQ_TextDecoder(Channels), Text)
+        TextValues = np.concatenate([Output[0] for Output in Outputs])
+        Outputs, FrameSec = Decode(DF_DAQ_FrameDecoder(1, Channels), EncodeFrames(Counts, Millis))
+        FrameCounts = np.concatenate([Output[0] for Output in Outputs])
+        Cost[Channels] = (TextSec / (n * Channels) * 1e6, FrameSec / (n * Channels) * 1e6)
+        Passed &= Check('%2d channels: text %.3f, binary %.4f, round trip' % (Channels, Cost[Channels][0], Cost[Channels][1]),
+                        TextValues.shape == (n, Channels) and np.allclose(TextValues, np.round(Phases(np.arange(n), Channels), 4)) and
+                        np.array_equal(FrameCounts, Counts))
+    for i, Stream in enumerate(['text', 'binary']):
+        Passed &= Check('%s cost per value does not grow with the channels (%.2fx at %d)' % (Stream, Cost[CHANNELS[-1]][i] / Cost[1][i], CHANNELS[-1]),
+                        Cost[CHANNELS[-1]][i] < FLAT * Cost[1][i])
+    One = EncodeText(Phases(np.arange(100), 1), 1000 + np.arange(100))
+    Decoder = DF_DAQ_TextDecoder(2)
+    sys.stdout = open(os.devnull, 'w')     #Hide the bad line messages
+    Outputs, Sec = Decode(Decoder, One)
+    sys.stdout = sys.__stdout__
+    Passed &= Check('1 channel text lines with 2 expected: %d samples, stream seen with %s channels' % (sum([len(Output[0]) for Output in Outputs]), Decoder.StreamChannels),
+                    sum([len(Output[0]) for Output in Outputs]) == 0 and Decoder.StreamChannels == 1)
+    Decoder = DF_DAQ_TextDecoder(1, Millis = False)
+    Values, Millis = Decoder.Decode(EncodeText(Phases(np.arange(100), 1), np.arange(100), DeviceTime = False))
+    Passed &= Check('text lines without millis (firmware 0.0.1): %d samples, millis %s' % (len(Values), np.unique(Millis)),
+                    len(Values) == 100 and np.all(Millis == -1) and Decoder.StreamChannels == None and Decoder.BadLines == 0)
+
+    print ('Fake boards with %d channels (%s)' % (BOARD_CHANNELS, SETUP))
+    sys.stdout = open(os.devnull, 'w')     #Hide the board interface messages
+    Devices = [FakeDevice(Setup = SETUP, Period = 5) for i in range(0, 2)]
+    for Binary in [False, True]:
+        Session = DF_DAQ_Session(Devices[0].Port, Channels = BOARD_CHANNELS)
+        Session.start()
+        Read = Session.Read()
+        Session.StreamStart(5, Binary)
+        time.sleep(Seconds)
+        Session.Stop()
+        Times, Samples, Millis = Session.Drain()
+        PSI = DF_DAQ_Transfer().ToUnits(Samples) if Binary else Samples
+        Expected = np.array([Devices[0].Pressure(t) for t in Millis / 1000.0])
+        Passed &= Check('%-6s session: %d x %d samples, read %s, error %.4f PSI' % ('binary' if Binary else 'text', Samples.shape[0], Samples.shape[1], np.round(Read, 2),
+                                                                                 np.abs(PSI - Expected).max() if len(PSI) > 0 else np.nan),
+                        Samples.shape[1] == BOARD_CHANNELS and len(Samples) > 0 and len(Read) == BOARD_CHANNELS and np.abs(PSI - Expected).max() < 0.02)
+
+    Old = FakeDevice(Version = '0.0.1', Period = 5)
+    for Channels in [1, 2]:
+        Session = DF_DAQ_Session(Old.Port, Channels = Channels)
+        Session.start()
+        Session.StreamStart(5)
+        time.sleep(Seconds / 2)
+        Session.Stop()
+        Times, Samples, Millis = Session.Drain()
+        Passed &= Check('text session, firmware %s, 1 channel board set up for %d: %d samples, error "%s"' % (Session.Firmware.strip(), Channels, len(Samples), Session.Error),
+                        (len(Samples) > 0 and np.all(Millis == -1) and Session.Error == None) if (Channels == 1) else
+                        (len(Samples) == 0 and Session.Error != None))
+    Old.Close()
+
+    Group = DF_DAQ_Group([Device.Port for Device in Devices], 5, Binary = True, Channels = BOARD_CHANNELS)
+    Group.start()
+    time.sleep(Seconds)
+    Times, Samples, Millis = Group.Drain()
+    Group.Stop()
+    Passed &= Check('group of %d boards: %d rows x %d columns, %s ... %s' % (len(Devices), Samples.shape[0], Samples.shape[1], Group.Columns[0], Group.Columns[-1]),
+                    Samples.shape[1] == len(Group.Columns) == len(Devices) * BOARD_CHANNELS and Millis.shape == Samples.shape and len(Samples) > 0)
+
+    print ('GUI (DF-DAQ.py, %d boards)' % len(Devices), file = sys.__stdout__)
+    Folder = tempfile.mkdtemp()
+    DF_DAQ_HW_Interface.DF_DAQ.findPort = lambda self: [Device.Port for Device in Devices]
+    Passed &= RunGUI(Bench)
+    for Device in Devices:
+        Device.Close()
+    sys.exit(0 if Passed else 1)
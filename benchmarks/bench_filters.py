@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""
+bench_filters - Plot filters (DF_DAQ_Filters): each filter against a direct,
+sample by sample reference, the same output whatever the batch sizes, the
+cost per value, and a replay through the GUI (offscreen) with filters on,
+checking the plot gets the decimated stream and the capture file the raw one.
+
+Run from the repository root:  python benchmarks/bench_filters.py [Samples]
+
+@author: DroidForge Engineering
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from harness import Check, RunCapture, RunGUI, SelectBoards
+
+from DF_DAQ_Filters import ParseFilters
+from DF_DAQ_Capture import CaptureFile
+from bench_replay import MakeCapture
+
+RATE = 200              #Samples/s
+COLUMNS = 4
+COST_BUDGET = 500       #nSec per value for the whole chain
+CHAIN = 'avg 8, lowpass 5, decimate 4'
+
+#Sample by sample versions of the filters
+def Reference(Name, Value, y):
+    out = []
+    if(Name == 'avg'):
+        for i in range(0, len(y)):
+            out.append(y[max(0, i - Value + 1):i + 1].mean(axis = 0))
+    elif(Name == 'lowpass'):
+        a = 1.0 - np.exp(-2 * np.pi * Value / RATE)
+        last = y[0]
+        for i in range(0, len(y)):
+            last = last + a * (y[i] - last)
+            out.append(last)
+    else:
+        for i in range(Value - 1, len(y), Value):
+            out.append(y[i - Value + 1:i + 1].mean(axis = 0))
+    return np.array(out)
+
+#Filters the samples in batches of the given sizes, the rest in one batch
+def Batches(Text, x, y, Sizes):
+    Filters = ParseFilters(Text, RATE)
+    xs, ys = [], []
+    i = 0
+    for n in list(Sizes) + [len(y)]:
+        bx, by = Filters.Process(x[i:i + n], y[i:i + n])
+        xs.append(bx)
+        ys.append(by)
+        i += n
+    return np.concatenate(xs), np.concatenate(ys)
+
+def Bench(app, form):
+    SelectBoards(app, form)
+    form.DataFilter.setText(CHAIN)
+    form.fileUniqueStr = os.path.join(Folder, 'GUI.xlsx')
+    RunCapture(app, form)
+    Source = CaptureFile(Source_fname)
+    Recorded = CaptureFile(os.path.join(Folder, 'GUI.dfc'))
+    return Check('GUI plotted %d of %d samples (%s), capture has all %d raw samples' % (len(form.yPyramid), len(Source), Recorded.Info['Plot Filters'], len(Recorded)),
+                 len(form.yPyramid) == len(Source) // 4 and Recorded.Info['Plot Filters'] == CHAIN and
+                 np.array_equal(Recorded.Records['Value'], Source.Records['Value']))
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if (len(sys.argv) > 1) else 10**6
+    Passed = True
+
+    print ('Against the sample by sample reference (2000 samples, %d columns)' % COLUMNS)
+    y = np.cumsum(np.random.randn(2000, COLUMNS), axis = 0)
+    x = np.arange(len(y))
+    Sizes = np.random.randint(0, 50, 60)
+    for Name, Value in [('avg', 8), ('lowpass', 5), ('decimate', 4)]:
+        Text = Name + ' ' + str(Value)
+        bx, by = Batches(Text, x, y, Sizes)
+        Error = np.abs(by - Reference(Name, Value, y)).max()
+        Passed &= Check('%-11s max error %.1e, same output in %d batches' % (Text, Error, len(Sizes) + 1),
+                        Error < 1e-9 and np.allclose(by, Batches(Text, x, y, [])[1], rtol = 0, atol = 1e-9))
+    bx, by = Batches('decimate 4', x, y, Sizes)
+    Passed &= Check('decimated sample numbers are the last of every block', np.array_equal(bx, x[3::4]))
+    y[100, 1] = np.nan
+    bx, by = Batches(CHAIN, x, y, Sizes)
+    Passed &= Check('a failed read holds the last value', not(np.isnan(by).any()))
+
+    print ('Cost (%d samples, %d columns, nSec per value)' % (n, COLUMNS))
+    y = np.random.randn(n, COLUMNS)
+    x = np.arange(n)
+    for Text in ['avg 8', 'lowpass 5', 'decimate 4', CHAIN]:
+        start = time.perf_counter()
+        Batches(Text, x, y, [RATE // 25] * (n // 100))     #One batch per plot tick, then the rest
+        Cost = (time.perf_counter() - start) / (n * COLUMNS) * 1e9
+        Passed &= Check('%-30s %6.1f' % (Text, Cost), Cost < COST_BUDGET)
+
+    print ('GUI (DF-DAQ.py --replay, as fast as possible)')
+    Folder = tempfile.mkdtemp()
+    Source_fname = os.path.join(Folder, 'Source.dfc')
+    MakeCapture(Source_fname, 10.0)
+    Passed &= RunGUI(Bench, ['--replay', Source_fname, '--speed', '0'])
+    sys.exit(0 if Passed else 1)
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""
+bench_framing - Text stream vs binary frame stream, checked against the
+firmware emulation (DF_DAQ_Emulator)
+
+Run from the repository root:  python benchmarks/bench_framing.py [Samples]
+
+@author: DroidForge Engineering
+"""
+
+import sys
+import time
+
+import numpy as np
+
+from harness import Check
+
+from DF_DAQ_HW_Interface import DF_DAQ_TextDecoder, DF_DAQ_FrameDecoder, FRAME_HEADER
+from DF_DAQ_Units import DF_DAQ_Transfer
+from DF_DAQ_Emulator import EncodeFrames, EncodeText, PSIToCounts, FRAME_SAMPLES
+
+PERIOD = 10         #Sample period (mSec)
+READ_SIZE = 4096    #Bytes per serial read
+
+#==============================================================================
+# Input Parameters: Decoder (Text or Frame decoder), Stream (Bytes)
+# Output Returns: Outputs (List of decoder results), Seconds (Float)
+#
+# Description: Feeds the stream to the decoder READ_SIZE bytes at a time, the
+# same way DF_DAQ_Session hands it what the serial port has buffered.
+#==============================================================================
+def Decode(Decoder, Stream):
+    Outputs = []
+    start = time.perf_counter()
+    for i in range(0, len(Stream), READ_SIZE):
+        Outputs.append(Decoder.Decode(Stream[i:i + READ_SIZE]))
+    return Outputs, time.perf_counter() - start
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if (len(sys.argv) > 1) else 200000
+    n -= n % FRAME_SAMPLES
+    PSI = 0.5 + 0.3 * np.sin(np.arange(n) / 50.0) + np.random.normal(0, 0.001, n)
+    PSI[n // 3] = np.nan     #One failed sensor read
+    Counts = PSIToCounts(PSI)
+    Millis = 1000 + np.arange(n, dtype = np.int64) * (PERIOD + 1)
+
+    Text = EncodeText(np.nan_to_num(DF_DAQ_Transfer().ToUnits(Counts)), Millis)
+    Frames = EncodeFrames(Counts, Millis, Seq = 65000)  #Sequence wraps during the run
+
+    print ('Round Trip')
+    Passed = True
+    Outputs, TextSec = Decode(DF_DAQ_TextDecoder(), Text)
+    TextPSI = np.concatenate([Output[0] for Output in Outputs])
+    Passed &= Check('text samples', len(TextPSI) == n)
+
+    Decoder = DF_DAQ_FrameDecoder(PERIOD)
+    Outputs, FrameSec = Decode(Decoder, Frames)
+    FrameCounts = np.concatenate([Output[0] for Output in Outputs])[:, 0]
+    FrameMillis = np.concatenate([Output[1] for Output in Outputs])
+    FrameSeq = np.concatenate([Output[2] for Output in Outputs])
+    Passed &= Check('frame counts', np.array_equal(FrameCounts, Counts))
+    Passed &= Check('frame device time', np.array_equal(FrameMillis, Millis))
+    Passed &= Check('frame sequence', np.array_equal(FrameSeq, np.arange(n)))
+    Passed &= Check('failed read is NaN', np.isnan(DF_DAQ_Transfer().ToUnits(FrameCounts)[n // 3]))
+    Passed &= Check('no errors', Decoder.BadFrames == 0 and Decoder.LostFrames == 0 and Decoder.SkippedBytes == 0)
+
+    print ('Corruption')
+    L = FRAME_HEADER + 3 * FRAME_SAMPLES + 1
+    Damaged = bytearray(Frames)
+    Damaged[10 * L + 12] ^= 0x40                            #Flip a bit in frame 10
+    Damaged = bytes(Damaged[:20 * L]) + bytes(Damaged[21 * L:])   #Lose frame 20
+    Damaged = Damaged[:30 * L + 5] + b'\x5a\xa5\x00' + Damaged[30 * L + 5:]  #Noise inside frame 30
+    Decoder = DF_DAQ_FrameDecoder(PERIOD)
+    Outputs, Sec = Decode(Decoder, Damaged)
+    FrameSeq = np.concatenate([Output[2] for Output in Outputs])
+    Passed &= Check('bad frames counted (' + str(Decoder.BadFrames) + ')', Decoder.BadFrames == 2)
+    Passed &= Check('lost frames counted (' + str(Decoder.LostFrames) + ')', Decoder.LostFrames == 3)
+    Passed &= Check('stream resynced', len(FrameSeq) == n - 3 * FRAME_SAMPLES and FrameSeq[-1] == n - 1)
+
+    Tricky = Counts.copy()
+    Tricky[:FRAME_SAMPLES] = 0x005AA5                       #Sync pattern in the sample bytes
+    Decoder = DF_DAQ_FrameDecoder(PERIOD)
+    Outputs, Sec = Decode(Decoder, EncodeFrames(Tricky, Millis)[FRAME_HEADER:])   #Joined mid frame
+    FrameSeq = np.concatenate([Output[2] for Output in Outputs])
+    Passed &= Check('joined mid frame with a sync in the samples, layout from a good frame (%d samples)' % len(FrameSeq),
+                    len(FrameSeq) == n - FRAME_SAMPLES and Decoder.FrameSize == L and Decoder.StreamChannels == 1)
+    Decoder = DF_DAQ_FrameDecoder(PERIOD, Channels = 2)
+    Outputs, Sec = Decode(Decoder, Frames[:100 * L])
+    Passed &= Check('stream with another channel count seen (%s channels)' % Decoder.StreamChannels,
+                    Decoder.StreamChannels == 1 and sum([len(Output[0]) for Output in Outputs]) == 0)
+
+    print ('Throughput (' + str(n) + ' samples)')
+    print ('  text:   %6.2f bytes/sample %8.1f ksamples/sec decoded' % (len(Text) / float(n), n / TextSec / 1000))
+    print ('  binary: %6.2f bytes/sample %8.1f ksamples/sec decoded' % (len(Frames) / float(n), n / FrameSec / 1000))
+    print ('  binary is %.1fx smaller and %.1fx faster to decode' % (len(Text) / float(len(Frames)), TextSec / FrameSec))
+    sys.exit(0 if Passed else 1)
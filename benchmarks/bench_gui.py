@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""
+bench_gui - Cost of the live tab with pty fake boards (DF_DAQ_Emulator): the
+update_plot_data timer tick for captures of different lengths, in both plot
+modes, and the time to save the Excel file (what SaveData does when a test is
+stopped) for different capture lengths. Runs offscreen, no hardware or display
+needed. POSIX only.
+
+Run from the repository root:  python benchmarks/bench_gui.py [Boards] [Seconds]
+
+Long captures are simulated by filling the plot buffers before the ticks are
+timed, the ticks themselves drain real samples from the fake boards. A tick is
+timed in two parts, update_plot_data itself and the repaint of the plot it
+causes, at the app's own timer interval (PLOT_FPS, it does not change with
+the sample rate). The app's messages go to stdout, the results to the console
+(sys.__stdout__).
+
+@author: DroidForge Engineering
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from harness import Check, Spin, RunGUI, SelectBoards
+
+import DF_DAQ_HW_Interface
+from DF_DAQ_Emulator import FakeDevice
+from DF_DAQ_Capture import CaptureWriter, CaptureRecord, CaptureFile, ExportExcel, ImportExcel
+
+RATE = 200                                      #Samples/s per board
+CAPTURE_LENGTHS = [0, 10**5, 10**6, 10**7]      #Samples already in the plot when the ticks are timed
+SAVE_LENGTHS = [10**3, 10**4, 10**5]            #Samples in the saved capture
+
+#Start a test, fill the plot with Length samples and time the timer ticks
+def Ticks(app, form, Length, Mode, Seconds):
+    form.plotWidth.setCurrentIndex(Mode)
+    form.ToggleStartStop()
+    form.timer.stop()       #Ticks are called here instead, to time them
+    Boards = form.yRing.View().shape[1]
+    x = np.arange(0, Length)
+    y = np.sin(x / 1000.0)[:, None] * np.ones(Boards)
+    form.xRing.Extend(x)
+    form.yRing.Extend(y)
+    form.yPyramid.Extend(x, y)
+    Update = []
+    Paint = []
+    end = time.perf_counter() + Seconds
+    while(time.perf_counter() < end):
+        Spin(app, form.timer.interval() / 1000.0)
+        start = time.perf_counter()
+        form.update_plot_data()
+        painted = time.perf_counter()
+        form.plot.viewport().repaint()
+        Update.append(painted - start)
+        Paint.append(time.perf_counter() - painted)
+    form.ToggleStartStop()
+    return np.array(Update) * 1000, np.array(Paint) * 1000
+
+def Bench(app, form):
+    SelectBoards(app, form)
+    form.rateMax = RATE
+    form.DataRate.setText(str(RATE))
+    folder = tempfile.mkdtemp()
+    form.fileUniqueStr = os.path.join(folder, 'Test.xlsx')
+    Passed = True
+
+    Interval = form.timer.interval()
+    print ('update_plot_data tick every %d mSec (mSec, update + paint median / max, %d boards at %d Hz)' % (Interval, len(Devices), RATE), file = sys.__stdout__)
+    form.DataRate.setText('1')
+    Passed &= Check('same tick at 1 Hz and %d Hz' % RATE, form.timer.interval() == Interval)
+    form.DataRate.setText(str(RATE))
+    for Length in CAPTURE_LENGTHS:
+        for Mode in [0, 1]:
+            Update, Paint = Ticks(app, form, Length, Mode, Seconds)
+            Passed &= Check('%-11s %8d samples: %5.2f + %5.2f / %6.2f' % (form.plotWidth.itemText(Mode), Length, np.median(Update), np.median(Paint), (Update + Paint).max()),
+                            np.median(Update + Paint) < Interval)
+            os.remove(form.fileUniqueStr)
+    Captures = [name for name in os.listdir(folder) if name.endswith('.dfc')]
+    Passed &= Check('%d tests, %d capture files (none overwritten)' % (len(CAPTURE_LENGTHS) * 2, len(Captures)), len(Captures) == len(CAPTURE_LENGTHS) * 2)
+
+    print ('Save time (sec, ' + str(len(Devices)) + ' boards)', file = sys.__stdout__)
+    for Length in SAVE_LENGTHS:
+        cname = os.path.join(folder, 'Save-' + str(Length) + '.dfc')
+        Writer = CaptureWriter(cname, {'Rate' : RATE, 'Units' : 'PSI', 'Display Units' : 'PSI', 'Columns' : [Device.Port for Device in Devices]},
+                               Record = CaptureRecord(len(Devices)))
+        x = np.arange(0, Length)
+        Writer.Write(Sample = x, Time = x * (10**9 // RATE), DeviceTime = np.repeat(x[:, None] * (1000 // RATE), len(Devices), axis = 1),
+                     Value = np.random.randn(Length, len(Devices)))
+        Writer.Close()
+        start = time.perf_counter()
+        ExportExcel(cname, os.path.splitext(cname)[0] + '.xlsx', 'KPA')
+        print ('  %8d samples: %6.2f' % (Length, time.perf_counter() - start), file = sys.__stdout__)
+    iname = os.path.join(folder, 'Imported.dfc')
+    ImportExcel(os.path.splitext(cname)[0] + '.xlsx', iname)
+    Saved, Imported = CaptureFile(cname), CaptureFile(iname)
+    Passed &= Check('Excel export imported back: %d rows, %s, %s' % (len(Imported), Imported.Info['Units'], Imported.Info.get('Columns')),
+                    Imported.Info.get('Columns') == Saved.Info['Columns'] and np.allclose(Imported.Values('PSI'), Saved.Values('PSI')) and
+                    np.allclose(Imported.Time(), Saved.Time()))
+    return Passed
+
+if __name__ == '__main__':
+    Boards = int(sys.argv[1]) if (len(sys.argv) > 1) else 2
+    Seconds = float(sys.argv[2]) if (len(sys.argv) > 2) else 1.0
+    Devices = [FakeDevice(Setup = 'P-PSI-1-' + str(RATE) + '-10', Noise = 0.01) for i in range(0, Boards)]
+    DF_DAQ_HW_Interface.DF_DAQ.findPort = lambda self: [Device.Port for Device in Devices]
+    Passed = RunGUI(Bench)
+    for Device in Devices:
+        Device.Close()
+    sys.exit(0 if Passed else 1)
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""
+bench_metrics - Overhead and accuracy of the pipeline metrics (DF_DAQ_Metrics),
+the stages a streaming session records with a pty fake board
+(DF_DAQ_Emulator), and the metrics file the GUI saves at the end of a replayed
+run (offscreen). POSIX only.
+
+Run from the repository root:  python benchmarks/bench_metrics.py [Seconds]
+
+@author: DroidForge Engineering
+"""
+
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from harness import Check, RunCapture, RunGUI, Spin
+
+from DF_DAQ_Metrics import METRICS, DF_DAQ_Metrics
+from DF_DAQ_HW_Interface import DF_DAQ_Session
+from DF_DAQ_Emulator import FakeDevice
+from bench_replay import MakeCapture
+
+ADD_BUDGET = 2000       #nSec per Add
+GUI_STAGES = ['Drain', 'Convert', 'Plot Append', 'Downsample', 'setData', 'Tick', 'Capture Write', 'Capture Sync', 'Save']
+
+def Stream(Device, Seconds, Enabled):
+    METRICS.Reset()
+    METRICS.Enabled = Enabled
+    Session = DF_DAQ_Session(Device.Port)
+    Session.start()
+    Sent = Device.Sent
+    cpu = time.process_time()
+    Session.StreamStart(1, True)
+    time.sleep(Seconds)
+    Session.Stop()
+    cpu = time.process_time() - cpu
+    Samples = len(Session.Drain()[1])
+    METRICS.Enabled = True
+    return Samples, Device.Sent - Sent, cpu
+
+def Bench(app, form):
+    Spin(app, 0.5)
+    form.fileUniqueStr = os.path.join(Folder, 'GUI.xlsx')
+    RunCapture(app, form)
+    with open(os.path.join(Folder, 'GUI.metrics.json'), 'r') as f:
+        Saved = json.load(f)
+    Missing = [Name for Name in GUI_STAGES if Saved['Stages'].get(Name, {}).get('Count', 0) == 0]
+    return Check('GUI replay saved %d stages, %d samples, status "%s" %s' % (len(Saved['Stages']), Saved['Counters'].get('Samples', 0), form.plotStatus.text(),
+                                                                              ('missing ' + str(Missing)) if Missing else ''),
+                 len(Missing) == 0 and Saved['Counters'].get('Samples', 0) == Rows)
+
+if __name__ == '__main__':
+    Seconds = float(sys.argv[1]) if (len(sys.argv) > 1) else 2.0
+    Passed = True
+
+    print ('Cost and accuracy')
+    Metrics = DF_DAQ_Metrics()
+    Durations = np.random.lognormal(np.log(200000), 1.0, 100000).astype(np.int64)
+    start = time.perf_counter_ns()
+    for Ns in Durations.tolist():
+        Metrics.Add('Stage', Ns)
+    Cost = (time.perf_counter_ns() - start) / len(Durations)
+    Passed &= Check('%.0f nSec per Add (budget %d)' % (Cost, ADD_BUDGET), Cost < ADD_BUDGET)
+    Stage = Metrics.Stage('Stage')
+    for q in [0.5, 0.99]:
+        True_ = np.percentile(Durations, q * 100)
+        Passed &= Check('p%d %.3f mSec, true %.3f mSec' % (q * 100, Stage.Percentile(q) / 1e6, True_ / 1e6), True_ <= Stage.Percentile(q) <= 2 * True_)
+    Passed &= Check('max and mean exact', Stage.MaxNs == Durations.max() and Stage.TotalNs == Durations.sum())
+
+    print ('Streaming session (binary, 1 mSec, ' + str(Seconds) + ' sec)')
+    Device = FakeDevice(Period = 1)
+    sys.stdout = open(os.devnull, 'w')     #Hide the board interface messages
+    Off = Stream(Device, Seconds, False)
+    On = Stream(Device, Seconds, True)
+    Names = ['Serial Wait', 'Parse', 'Buffer Append', 'Reply Wait']
+    Passed &= Check('%d of %d samples with metrics, %d of %d without, CPU %.2f vs %.2f sec' % (On[0], On[1], Off[0], Off[1], On[2], Off[2]),
+                    On[0] >= On[1] - 8 and Off[0] >= Off[1] - 8)
+    for Name in Names:
+        Summary = METRICS.Stage(Name).Summary()
+        Passed &= Check('%-13s %6d, p50 / p99 / max %.3f / %.3f / %.3f mSec' % (Name, Summary['Count'], Summary['p50 (mSec)'], Summary['p99 (mSec)'], Summary['Max (mSec)']),
+                        Summary['Count'] > 0)
+    Device.Close()
+
+    print ('GUI (DF-DAQ.py --replay, as fast as possible)', file = sys.__stdout__)
+    Folder = tempfile.mkdtemp()
+    Source = os.path.join(Folder, 'Source.dfc')
+    MakeCapture(Source, 10.0)
+    from DF_DAQ_Capture import CaptureFile
+    Rows = len(CaptureFile(Source))
+    Passed &= RunGUI(Bench, ['--replay', Source, '--speed', '0'])
+    sys.exit(0 if Passed else 1)
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""
+bench_plot - Offline plotter loading and plotting cost: reading a 64 column 
+workbook the old way (pandas), converting it to the column store and reopening
+it (DF_DAQ_Columns), the points sent to bokeh with the min/max envelope, and 
+the memory used to plot a capture file much larger than the plot needs.
+
+Run from the repository root:  python benchmarks/bench_plot.py [Rows] [CaptureMB]
+
+Writing the test workbook takes a while for large Rows, the test files are 
+kept in a temporary folder only for the run.
+
+@author: DroidForge Engineering
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+from harness import Check
+
+from DF_DAQ_Columns import OpenColumns, ColumnEnvelope
+from DF_DAQ_Capture import WriteHeader, CaptureRecord
+
+PLOT_WIDTH = 1650       #PlotData figure width (pixels)
+
+def Timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+def Extremes(ys, Values):
+    return (np.allclose(np.nanmax(ys, axis = 1), np.nanmax(Values, axis = 1)) and
+            np.allclose(np.nanmin(ys, axis = 1), np.nanmin(Values, axis = 1)))
+
+#Two board capture of Rows samples, written in pieces so it never has to fit in memory
+def WriteCapture(fname, Rows):
+    Record = CaptureRecord(2)
+    Info = {'Rate' : 1000, 'Units' : 'PSI', 'Display Units' : 'KPA', 'Columns' : ['A', 'B']}
+    with open(fname, 'wb') as f:
+        WriteHeader(f, Info, Record)
+        for first in range(0, Rows, 1000000):
+            n = min(1000000, Rows - first)
+            records = np.zeros(n, dtype = Record)
+            records['Sample'] = first + np.arange(n)
+            records['Time'] = records['Sample'] * 1000000
+            records['Value'] = np.sin(records['Sample'] / 1e5)[:, None] * [1, 2]
+            f.write(records.tobytes())
+
+if __name__ == '__main__':
+    import pandas as pd
+
+    Rows = int(sys.argv[1]) if (len(sys.argv) > 1) else 10000
+    CaptureMB = int(sys.argv[2]) if (len(sys.argv) > 2) else 256
+    Passed = True
+    folder = tempfile.mkdtemp()
+    try:
+        fname = os.path.join(folder, 'Test.xlsx')
+        CacheDir = os.path.join(folder, 'cache')
+        Data = np.random.randn(Rows, 64).cumsum(axis = 0)
+        Data[Rows // 2:Rows // 2 + 10, 3] = np.nan      #Gap in one line
+        pd.DataFrame(Data).to_excel(fname, sheet_name = 'Sheet1', index = False)
+
+        print ('Loading (' + str(Rows) + ' rows x 64 columns)')
+        df, Parse = Timed(pd.read_excel, fname, 'Sheet1')
+        Source, First = Timed(OpenColumns, fname, CacheDir)
+        Source, Cached = Timed(OpenColumns, fname, CacheDir)
+        print ('  pandas %.3f sec, first open %.3f sec, cached open %.4f sec' % (Parse, First, Cached))
+        x, Values = Source.Read(list(range(0, 64)))
+        Passed &= Check('columns match the workbook', np.allclose(Values, df.values.T, equal_nan = True) and len(Source.Names) == 64)
+        Passed &= Check('cached open at least 100x faster than pandas', Cached * 100 < Parse)
+        os.utime(fname, ns = (time.time_ns(), time.time_ns() + 10**9))     #Touched, the cache is stale now
+        Source, Stale = Timed(OpenColumns, fname, CacheDir)
+        Passed &= Check('changed file is converted again (%.3f sec)' % Stale, Stale * 10 > Parse)
+
+        print ('Plotting')
+        (x, ys), Seconds = Timed(ColumnEnvelope, Source, list(range(0, 64)), 2 * PLOT_WIDTH)
+        print ('  Envelope %.3f sec, %d points per line instead of %d' % (Seconds, len(x), Rows))
+        Passed &= Check('at most 2 points per pixel', len(x) <= 2 * PLOT_WIDTH + 2)
+        Passed &= Check('envelope keeps the extremes', Extremes(ys, Values))
+        (x, ys), Seconds = Timed(ColumnEnvelope, Source, [3, 5], 2 * PLOT_WIDTH, Rows // 4, Rows // 2)
+        Passed &= Check('selected columns and rows only', Extremes(ys, Values[[3, 5], Rows // 4:Rows // 2]))
+
+        cname = os.path.join(folder, 'Test.dfc')
+        CaptureRows = CaptureMB * 2**20 // CaptureRecord(2).itemsize
+        WriteCapture(cname, CaptureRows)
+        print ('Capture file (%d MB, %d rows x 2 boards)' % (os.path.getsize(cname) // 2**20, CaptureRows))
+        Source = OpenColumns(cname)
+        tracemalloc.start()
+        (x, ys), Seconds = Timed(ColumnEnvelope, Source, [0, 1], 2 * PLOT_WIDTH)
+        Peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print ('  Envelope %.3f sec, %.1f MB peak' % (Seconds, Peak / 2**20))
+        Passed &= Check('memory does not grow with the file', Peak < 64 * 2**20)
+        Passed &= Check('capture in display units', abs(np.nanmax(ys[1]) - 2 * 6.894757) < 0.01)
+        del Source
+    finally:
+        shutil.rmtree(folder)
+    sys.exit(0 if Passed else 1)
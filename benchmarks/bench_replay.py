@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""
+bench_replay - Replays a synthetic two board capture (DF_DAQ_Replay) at 1x,
+10x and as fast as possible, checks the replayed samples and timing against
+the capture, then replays it through the GUI (offscreen) and checks the
+capture file the GUI writes is the same as the one replayed.
+
+Run from the repository root:  python benchmarks/bench_replay.py [Seconds]
+
+@author: DroidForge Engineering
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from harness import Check, RunCapture, RunGUI, SelectBoards
+
+from DF_DAQ_Replay import DF_DAQ_Replay
+from DF_DAQ_Capture import CaptureWriter, CaptureRecord, CaptureFile
+from DF_DAQ_Units import DF_DAQ_Transfer
+
+RATE = 200          #Samples/s per board
+PORTS = ['/dev/ttyACM0', '/dev/ttyACM1']
+
+#Capture of Seconds at RATE with jitter and a 1 sec gap in the middle, stored as raw counts
+def MakeCapture(fname, Seconds):
+    n = int(Seconds * RATE)
+    x = np.arange(0, n)
+    Time = x * (10**9 // RATE) + np.random.randint(0, 10**6, n)
+    Time[n // 2:] += 10**9
+    Millis = np.stack([Time // 10**6 + 7, Time // 10**6 + 11], axis = 1)
+    Counts = np.stack([0x800000 + 1000 * np.sin(x / 50.0), 0x600000 + np.random.randint(0, 100, n)], axis = 1).round()
+    Transfer = DF_DAQ_Transfer(['C', 'A'], [0.0, 0.0], [1.0, 15.0], [0, 0])
+    Info = {'Firmware' : '0.0.4', 'Setup' : 'P-PSI-2-' + str(RATE) + '-' + str(RATE), 'Units' : 'Counts', 'Display Units' : 'KPA',
+            'Transfer' : Transfer.Info(), 'Rate' : RATE, 'Columns' : PORTS}
+    Writer = CaptureWriter(fname, Info, Record = CaptureRecord(len(PORTS)))
+    Writer.Write(Sample = x, Time = Time, DeviceTime = Millis, Value = Counts)
+    Writer.Close()
+
+#Replays Ports of the capture and returns everything drained, the wall time and the group
+def Replay(fname, Ports, Speed):
+    DAQ = DF_DAQ_Replay(fname, Speed)
+    Reader = DAQ.Group(Ports, 5)
+    Times, Samples, Millis = [], [], []
+    start = time.perf_counter()
+    Reader.start()
+    while(True):
+        Done = Reader.Done
+        batch = Reader.Drain()
+        Times.append(batch[0] - Reader.StartNs)
+        Samples.append(batch[1])
+        Millis.append(batch[2])
+        if(Done):
+            break
+        time.sleep(0.02)
+    Seconds = time.perf_counter() - start
+    Reader.Stop()
+    return np.concatenate(Times), np.concatenate(Samples), np.concatenate(Millis), Seconds, Reader
+
+def Same(Capture, Times, Samples, Millis, Columns):
+    Records = Capture.Records
+    return (np.array_equal(Times, Records['Time']) and np.array_equal(Samples, Records['Value'][:, Columns])
+            and np.array_equal(Millis, Records['DeviceTime'][:, Columns]))
+
+def Bench(app, form):
+    SelectBoards(app, form)
+    form.fileUniqueStr = os.path.join(Folder, 'GUI.xlsx')
+    Seconds = RunCapture(app, form)
+    Recorded = CaptureFile(os.path.join(Folder, 'GUI.dfc'))
+    Source = CaptureFile(Source_fname)
+    return Check('GUI replay stopped itself in %.2f sec, capture written is the one replayed (%d rows, %s)' % (Seconds, len(Recorded), Recorded.Info['Units']),
+                 not(form.Start) and Recorded.Info['Units'] == 'Counts' and Recorded.Info['Transfer'] == Source.Info['Transfer'] and
+                 Same(Source, Recorded.Records['Time'], Recorded.Records['Value'], Recorded.Records['DeviceTime'], [0, 1]) and
+                 os.path.exists(form.fileUniqueStr))
+
+if __name__ == '__main__':
+    Seconds = float(sys.argv[1]) if (len(sys.argv) > 1) else 20.0
+    Folder = tempfile.mkdtemp()
+    Source_fname = os.path.join(Folder, 'Source.dfc')
+    MakeCapture(Source_fname, Seconds)
+    Source = CaptureFile(Source_fname)
+    Length = Source.Time(len(Source) - 1, len(Source))[0]
+    Passed = True
+
+    print ('Replay of %.1f sec, %d rows, %d boards' % (Length, len(Source), len(PORTS)))
+    for Speed in [1.0, 10.0]:
+        fname = Source_fname
+        if(Speed == 1.0):       #Keep 1x short
+            fname = os.path.join(Folder, 'Short.dfc')
+            MakeCapture(fname, 2.0)
+        Capture = CaptureFile(fname)
+        Expected = Capture.Time(len(Capture) - 1, len(Capture))[0] / Speed
+        Times, Samples, Millis, Wall, Reader = Replay(fname, PORTS, Speed)
+        Passed &= Check('%4.0fx took %.2f sec for %.2f sec, same samples and times, %d overruns' % (Speed, Wall, Expected, Reader.Overruns),
+                        Expected <= Wall < Expected + 0.2 and Same(Capture, Times, Samples, Millis, [0, 1]) and Reader.Overruns == 0)
+
+    Times, Samples, Millis, Wall, Reader = Replay(Source_fname, PORTS, 0)
+    Passed &= Check('as fast as possible: %.0f rows/s, same samples and times, %d overruns' % (len(Source) / Wall, Reader.Overruns),
+                    Same(Source, Times, Samples, Millis, [0, 1]) and Reader.Overruns == 0)
+    Times, Samples, Millis, Wall, Reader = Replay(Source_fname, PORTS[1:], 0)
+    PSI = Reader.ToPSI(Samples)[:, 0]
+    Passed &= Check('one board of two, ToPSI with its own transfer function',
+                    Same(Source, Times, Samples, Millis, [1]) and np.allclose(PSI, Source.Values('PSI')[:, 1]))
+
+    print ('GUI (DF-DAQ.py --replay, as fast as possible)')
+    Passed &= RunGUI(Bench, ['--replay', Source_fname, '--speed', '0'])
+    sys.exit(0 if Passed else 1)
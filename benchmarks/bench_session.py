@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""
+bench_session - DF_DAQ_Session against pty fake boards (DF_DAQ_Emulator):
+command round trips while idle, and 'z', 'o' and 'u' sent while the board
+streams, which must be answered without a single bad sample. POSIX only.
+
+Run from the repository root:  python benchmarks/bench_session.py [Seconds]
+
+@author: DroidForge Engineering
+"""
+
+import sys
+import threading
+import time
+
+import numpy as np
+
+from harness import Check
+
+from DF_DAQ_HW_Interface import DF_DAQ_Session
+from DF_DAQ_Emulator import FakeDevice
+
+PERIOD = 4      #Sample period (mSec)
+
+def Idle(Session, Count = 50):
+    start = time.perf_counter()
+    Replies = [Session.getSetup() for i in range(0, Count)]
+    return Replies, (time.perf_counter() - start) / Count
+
+#Commands from several threads at once while streaming, each must get its own reply
+def Live(Session, Seconds):
+    Replies = {'o' : [], 'u' : [], 'z' : []}
+    Times = []
+    def worker(Command, Data):
+        end = time.monotonic() + Seconds
+        while(time.monotonic() < end):
+            start = time.perf_counter()
+            Replies[Command].append(Session.Command(Command, Data, Timeout = 2.0))
+            Times.append(time.perf_counter() - start)
+            time.sleep(0.01)
+    threads = [threading.Thread(target = worker, args = args) for args in [('o', str(PERIOD)), ('u', '0'), ('z', '')]]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return Replies, Times
+
+if __name__ == '__main__':
+    Seconds = float(sys.argv[1]) if (len(sys.argv) > 1) else 2.0
+    Passed = True
+
+    Device = FakeDevice()
+    Session = DF_DAQ_Session(Device.Port)
+    Session.start()
+    print ('Idle (firmware ' + Session.Firmware + ')')
+    Replies, Each = Idle(Session)
+    Passed &= Check('%d setup replies, %.2f mSec each' % (len(Replies), Each * 1000), all([Reply == Device.Setup for Reply in Replies]))
+
+    for Binary in [False, True]:
+        print ('Live commands (' + ('binary' if Binary else 'text') + ' stream, ' + str(Seconds) + ' sec)')
+        Sent = Device.Sent
+        Session.StreamStart(PERIOD, Binary)
+        Replies, Times = Live(Session, Seconds)
+        Units = Session.SetUnits('KPA')
+        start = time.perf_counter()
+        Session.ZeroStart()
+        Returned = time.perf_counter() - start
+        while(Session.ZeroDone() == None):
+            time.sleep(0.001)
+        Zeroed = (Session.ZeroDone(), Returned, time.perf_counter() - start)
+        Session.StreamStop()
+        Times = np.array(Times) * 1000
+        Host, Samples, Millis = Session.Drain()
+        Passed &= Check('%d replies, %.2f mSec median, %.2f mSec max' % (len(Times), np.median(Times), Times.max()),
+                        all([Reply == str(PERIOD) for Reply in Replies['o']]) and all([Reply == 'PSI' for Reply in Replies['u']]) and all([Reply == '' for Reply in Replies['z']]))
+        Bad = getattr(Session.Decoder, 'BadLines', 0) + getattr(Session.Decoder, 'SkippedBytes', 0)
+        Expected = Device.Sent - Sent
+        Passed &= Check('%d of %d samples, %d bad, %d frames lost' % (len(Samples), Expected, Bad, Session.LostFrames),
+                        Bad == 0 and Session.LostFrames == 0 and len(Samples) >= Expected - 8 and np.all(np.diff(Millis) > 0))
+        Passed &= Check('units not changed while streaming', Units == None)
+        Passed &= Check('zero sent in %.2f mSec without waiting, acknowledged after %.2f mSec' % (Zeroed[1] * 1000, Zeroed[2] * 1000), Zeroed[0] == 1 and Zeroed[1] < 0.005)
+    print ('Back to idle')
+    Passed &= Check('setup after streaming', Session.getSetup() == Device.Setup)
+    Passed &= Check('units set while idle', Session.SetUnits('PSI') == 'PSI')
+    Session.Stop()
+    Device.Close()
+
+    Device = FakeDevice(Version = '0.0.3')
+    Session = DF_DAQ_Session(Device.Port)
+    Session.start()
+    print ('Firmware ' + Session.Firmware + ' (no live commands)')
+    Session.StreamStart(PERIOD, True)
+    time.sleep(0.2)
+    Passed &= Check("'o' refused while streaming", Session.SetPeriod(PERIOD) == None)
+    Passed &= Check("'z' sent without a reply", Session.zero() == 1)
+    Session.StreamStop()
+    Passed &= Check('period after streaming', Session.SetPeriod(PERIOD) == PERIOD)
+    Session.Stop()
+    Device.Close()
+    sys.exit(0 if Passed else 1)
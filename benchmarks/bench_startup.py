@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""
+bench_startup - Import times and time to first window of DF-DAQ.py, checked
+against a startup budget
+
+Run from the repository root:  python benchmarks/bench_startup.py [Runs]
+
+Each run starts a fresh interpreter. The window is created offscreen, the run
+ends when the Qt event loop would start (the main window is up by then).
+The modules loaded by that point are checked too, so a stray top level import
+of pandas or bokeh shows up as a failure even on a fast PC.
+
+@author: DroidForge Engineering
+"""
+
+import json
+import subprocess
+import sys
+
+from harness import ROOT, Check
+
+#Seconds, median of the runs
+BUDGET = {'First Window' : 1.5,
+          'DF_DAQ_CLI'   : 0.5}
+
+#Only loaded on first use, never at startup
+LAZY_MODULES = ['pandas', 'bokeh', 'scipy']
+
+#Runs DF-DAQ.py up to app.exec_() and reports the time and loaded modules
+WINDOW_PROBE = '''
+import json, os, sys, time
+start = time.perf_counter()
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+from PyQt5.QtWidgets import QApplication
+def exec_(app):
+    print(json.dumps({'First Window' : time.perf_counter() - start, 'Modules' : sorted(sys.modules)}))
+    return 0
+QApplication.exec_ = exec_
+sys.argv = ['DF-DAQ.py']
+import runpy
+runpy.run_path('DF-DAQ.py', run_name = '__main__')
+'''
+
+IMPORT_PROBE = '''
+import json, importlib, sys, time
+start = time.perf_counter()
+importlib.import_module(sys.argv[1])
+print(json.dumps({sys.argv[1] : time.perf_counter() - start}))
+'''
+
+def Probe(code, *args):
+    out = subprocess.run([sys.executable, '-c', code] + list(args), cwd = ROOT, stdout = subprocess.PIPE,
+                         stderr = subprocess.DEVNULL, universal_newlines = True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+def Median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+if __name__ == '__main__':
+    Runs = int(sys.argv[1]) if (len(sys.argv) > 1) else 5
+    Passed = True
+
+    print ('Import Times (sec, median of ' + str(Runs) + ')')
+    Times = {}
+    for Module in ['numpy', 'serial', 'PyQt5.QtWidgets', 'pyqtgraph', 'DF_DAQ_HW_Interface', 'DF_DAQ_Capture', 'DF_DAQ_CLI', 'pandas', 'bokeh.plotting']:
+        try:
+            Times[Module] = Median([Probe(IMPORT_PROBE, Module)[Module] for i in range(0, Runs)])
+            print ('  %-20s %6.3f' % (Module, Times[Module]))
+        except (ValueError, IndexError):
+            print ('  %-20s not installed' % Module)
+
+    print ('Time to First Window (sec)')
+    Results = [Probe(WINDOW_PROBE) for i in range(0, Runs)]
+    Times['First Window'] = Median([Result['First Window'] for Result in Results])
+    print ('  %-20s %6.3f' % ('DF-DAQ.py', Times['First Window']))
+
+    print ('Budget')
+    for Name in BUDGET:
+        Passed &= Check('%s %.3f sec (budget %.1f sec)' % (Name, Times.get(Name, 0), BUDGET[Name]), Times.get(Name, 0) <= BUDGET[Name])
+    Loaded = [Module for Module in LAZY_MODULES if Module in Results[0]['Modules']]
+    Passed &= Check('lazy modules not loaded at startup ' + (str(Loaded) if Loaded else ''), len(Loaded) == 0)
+    sys.exit(0 if Passed else 1)
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""
+bench_stats - Live statistics (DF_DAQ_Stats): whole run and rolling window
+mean, std, min, max and rate against NumPy over the same samples, the cost
+per sample for small and large windows, and a replay through the GUI
+(offscreen) checking the statistics panel against the capture.
+
+Run from the repository root:  python benchmarks/bench_stats.py [Samples]
+
+@author: DroidForge Engineering
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from harness import Check, RunCapture, RunGUI, SelectBoards
+
+from DF_DAQ_Stats import DF_DAQ_Stats
+from DF_DAQ_Capture import CaptureFile
+from bench_replay import MakeCapture
+
+RATE = 200          #Samples/s
+COLUMNS = 4
+WINDOWS = [10**3, 10**6]        #Samples
+FLAT = 2.0          #Most a sample may cost with the largest window relative to the smallest
+
+def Close(Stats, y, Times):
+    Rate = (len(Times) - 1) / ((Times[-1] - Times[0]) / 1e9)
+    return (np.allclose(Stats['Mean'], np.nanmean(y, axis = 0), rtol = 1e-12, atol = 1e-9) and
+            np.allclose(Stats['Std'], np.nanstd(y, axis = 0, ddof = 1), rtol = 1e-9) and
+            np.array_equal(Stats['Min'], np.nanmin(y, axis = 0)) and np.array_equal(Stats['Max'], np.nanmax(y, axis = 0)) and
+            np.allclose(Stats['Rate'], Rate))
+
+#Adds the samples in batches like the plot ticks do
+def Feed(Stats, Times, y, Batch):
+    start = time.perf_counter()
+    for i in range(0, len(y), Batch):
+        Stats.Extend(Times[i:i + Batch], y[i:i + Batch])
+    return time.perf_counter() - start
+
+def Bench(app, form):
+    SelectBoards(app, form)
+    form.fileUniqueStr = os.path.join(Folder, 'GUI.xlsx')
+    RunCapture(app, form)
+    Source = CaptureFile(Source_fname)
+    y = Source.Values('PSI')
+    Times = Source.Records['Time']
+    return Check('GUI panel, whole run against the capture (%d samples, %.1f Hz)' % (len(y), form.Stats.Run()['Rate'][0]),
+                 Close(form.Stats.Run(), y, Times) and 'Mean' in form.plotStats.text())
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if (len(sys.argv) > 1) else 10**6
+    Passed = True
+
+    print ('Against NumPy (%d samples, %d columns, offset 1e6)' % (n, COLUMNS))
+    y = 1e6 + np.cumsum(np.random.randn(n, COLUMNS), axis = 0) * 0.01       #Large offset, small changes
+    y[np.random.randint(0, n, 20), np.random.randint(0, COLUMNS, 20)] = np.nan      #Failed reads
+    Times = np.arange(n, dtype = np.int64) * (10**9 // RATE) + np.random.randint(0, 10**6, n)
+    Times.sort()
+    Stats = DF_DAQ_Stats(COLUMNS, Window = 2000)
+    Feed(Stats, Times, y, 37)
+    Passed &= Check('whole run', Close(Stats.Run(), y, Times))
+    Window = Stats.Windowed()
+    m = Window['Count'].max()
+    Passed &= Check('window of the last %d samples' % m, 2000 <= m < 2000 + Stats.Block and Close(Window, y[-m:], Times[-m:]))
+    Millis = np.repeat((Times // 10**6)[:, None], COLUMNS, axis = 1)
+    Millis[:, -1] = Millis[::2, -1].repeat(2)[:n]       #Last board behind, every sample twice on the grid
+    Stats = DF_DAQ_Stats(COLUMNS, Window = 2000)
+    for i in range(0, n, 37):
+        Stats.Extend(Times[i:i + 37], y[i:i + 37], Millis[i:i + 37])
+    Run, Window = Stats.Run()['Rate'], Stats.Windowed()['Rate']
+    Passed &= Check('rate from the device times: %.1f Hz, board behind %.1f Hz (window %.1f / %.1f)' % (Run[0], Run[-1], Window[0], Window[-1]),
+                    np.allclose(Run[:-1], RATE, rtol = 0.01) and np.isclose(Run[-1], RATE / 2, rtol = 0.01) and
+                    np.allclose(Window[:-1], RATE, rtol = 0.05) and np.isclose(Window[-1], RATE / 2, rtol = 0.05))
+
+    print ('Cost per sample (uSec, batches of %d)' % (RATE // 25))
+    Cost = []
+    for Window in WINDOWS:
+        Stats = DF_DAQ_Stats(COLUMNS, Window = Window)
+        Cost.append(Feed(Stats, Times[:10**5], y[:10**5], RATE // 25) / 10**5 * 1e6)
+        start = time.perf_counter()
+        Stats.Windowed()
+        Passed &= Check('window %8d samples: %.2f, reading the window %.2f mSec' % (Window, Cost[-1], (time.perf_counter() - start) * 1000), True)
+    Passed &= Check('cost does not grow with the window (%.2fx)' % (Cost[-1] / Cost[0]), Cost[-1] < FLAT * Cost[0])
+
+    print ('GUI (DF-DAQ.py --replay, as fast as possible)')
+    Folder = tempfile.mkdtemp()
+    Source_fname = os.path.join(Folder, 'Source.dfc')
+    MakeCapture(Source_fname, 10.0)
+    Passed &= RunGUI(Bench, ['--replay', Source_fname, '--speed', '0'])
+    sys.exit(0 if Passed else 1)
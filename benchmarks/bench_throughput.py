@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""
+bench_throughput - Samples per second and per sample latency of the host side
+against pty fake boards (DF_DAQ_Emulator), no hardware needed. POSIX only.
+
+Run from the repository root:  python benchmarks/bench_throughput.py [Seconds]
+
+Throughput streams 1, 4 and 8 boards at the fastest firmware rate through
+DF_DAQ_Session and counts what arrives against what the boards sent. Latency
+is measured per sample, from the device time the sample was taken to the
+host time its bytes were read and decoded, with and without an emulated USB
+latency. Timestamp error is how far the host times DF_DAQ_Session gives the
+samples are from when they were actually taken.
+
+@author: DroidForge Engineering
+"""
+
+import sys
+import time
+
+import numpy as np
+import serial
+
+from harness import Check
+
+from DF_DAQ_HW_Interface import DF_DAQ_Session, DF_DAQ_TextDecoder, DF_DAQ_FrameDecoder
+from DF_DAQ_Emulator import FakeDevice, FRAME_SAMPLES
+
+PERIOD = 1          #Fastest firmware sample period (mSec), a sample every 2 mSec
+DRAIN = 0.05        #Seconds between drains, the GUI timer interval
+
+def Stream(name):
+    return 'binary' if name else 'text'
+
+def Throughput(Boards, Binary, Seconds):
+    Devices = [FakeDevice(Period = PERIOD, Noise = 0.01) for i in range(0, Boards)]
+    Sessions = [DF_DAQ_Session(Device.Port) for Device in Devices]
+    for Session in Sessions:
+        Session.start()
+    Sent = [Device.Sent for Device in Devices]
+    for Session in Sessions:
+        Session.StreamStart(PERIOD, Binary)
+    Received = 0
+    Errors = []
+    start = time.perf_counter()
+    while(time.perf_counter() - start < Seconds):
+        time.sleep(DRAIN)
+        for Session in Sessions:
+            Times, Samples, Millis = Session.Drain()
+            Received += len(Samples)
+            Errors.append(Times - Devices[Sessions.index(Session)].HostNs(Millis))
+    for Session in Sessions:
+        Session.StreamStop()
+        Received += len(Session.Drain()[1])
+    Seconds = time.perf_counter() - start
+    Sent = sum([Devices[i].Sent - Sent[i] for i in range(0, Boards)])
+    Bad = sum([getattr(Session.Decoder, 'BadLines', 0) + getattr(Session.Decoder, 'SkippedBytes', 0) + Session.LostFrames for Session in Sessions])
+    Overruns = sum([Session.Overruns for Session in Sessions])
+    for Session in Sessions:
+        Session.Stop()
+    for Device in Devices:
+        Device.Close()
+    return Received, Sent, Seconds, Bad, Overruns, np.concatenate(Errors) / 1e6
+
+#Reads the port directly so every sample gets the host time its bytes were read
+def Latency(Binary, Delay, Seconds):
+    Device = FakeDevice(Period = PERIOD, Latency = Delay)
+    Latencies = []
+    with serial.Serial(Device.Port, 250000, timeout = 0.1) as ser:
+        ser.write(b'o' + str(PERIOD).encode() + b'\n')
+        time.sleep(0.05 + Delay)
+        ser.reset_input_buffer()
+        decoder = DF_DAQ_FrameDecoder(PERIOD) if Binary else DF_DAQ_TextDecoder()
+        ser.write(b'b\n' if Binary else b's\n')
+        start = time.perf_counter()
+        while(time.perf_counter() - start < Seconds):
+            data = ser.read(max(ser.in_waiting, 1))
+            Received = time.perf_counter_ns()
+            if(Binary):
+                Counts, Millis, Seq = decoder.Decode(data)
+            else:
+                Samples, Millis = decoder.Decode(data)
+            Latencies.append(Received - Device.HostNs(Millis))
+        ser.write(b'p\n')
+    Device.Close()
+    return np.concatenate(Latencies) / 1e6
+
+def Percentiles(values):
+    return '%.2f / %.2f / %.2f' % (np.percentile(values, 50), np.percentile(values, 99), values.max())
+
+if __name__ == '__main__':
+    Seconds = float(sys.argv[1]) if (len(sys.argv) > 1) else 2.0
+    Passed = True
+
+    print ('Throughput (' + str(Seconds) + ' sec, sample every ' + str(PERIOD + 1) + ' mSec per board)')
+    for Binary in [False, True]:
+        for Boards in [1, 4, 8]:
+            Received, Sent, Sec, Bad, Overruns, Errors = Throughput(Boards, Binary, Seconds)
+            Passed &= Check('%-6s %d boards: %7.0f samples/s, %d of %d samples, %d bad, %d overruns' %
+                            (Stream(Binary), Boards, Received / Sec, Received, Sent, Bad, Overruns),
+                            Received >= Sent - FRAME_SAMPLES * Boards and Bad == 0 and Overruns == 0)
+            print ('         timestamp error p50 / p99 / max %s mSec' % Percentiles(np.abs(Errors)))
+
+    print ('Latency per sample (mSec, p50 / p99 / max)')
+    for Delay in [0.0, 0.01]:
+        for Binary in [False, True]:
+            Latencies = Latency(Binary, Delay, Seconds)
+            Fill = FRAME_SAMPLES * (PERIOD + 1) if Binary else 0     #First sample of a frame waits for the rest of it
+            Passed &= Check('%-6s USB latency %2.0f mSec: %s' % (Stream(Binary), Delay * 1000, Percentiles(Latencies)),
+                            np.percentile(Latencies, 50) >= Delay * 1000 and np.percentile(Latencies, 99) < Delay * 1000 + Fill + 20)
+    sys.exit(0 if Passed else 1)
@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+"""
+bench_trigger - Triggered capture (DF_DAQ_Trigger): every mode against a
+direct, sample by sample reference, the same output whatever the batch sizes,
+the cost per sample, capture files that grow with the number of events and not
+with the run length, and a replay through the GUI (offscreen) with a trigger,
+checking the capture file holds exactly the windows around the events.
+
+Run from the repository root:  python benchmarks/bench_trigger.py [Samples]
+
+@author: DroidForge Engineering
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from harness import Check, RunCapture, RunGUI, SelectBoards
+
+from DF_DAQ_Trigger import DF_DAQ_Trigger, ParseTrigger
+from DF_DAQ_Capture import CaptureWriter, CaptureRecord, CaptureFile
+from DF_DAQ_Units import UNIT_SCALE
+from bench_replay import MakeCapture
+
+RATE = 200              #Samples/s
+COLUMNS = 2
+PRE = 20                #Samples
+POST = 40
+EVENTS = 10             #Spikes in the file size runs
+COST_BUDGET = 5000      #nSec per sample in batches of one plot tick (0.1% of a core at 200 Hz)
+GROWTH = 1.05           #Most the capture may grow for a 10 times longer run
+
+#Sample by sample version of the trigger: the rows kept and the events
+def Reference(Mode, Level, y, Column = None):
+    v = y if (Column == None) else y[:, [Column]]
+    Fires = []
+    for i in range(0, len(v)):
+        for c in range(0, v.shape[1]):
+            prev = v[i - 1, c] if (i > 0) else np.nan
+            if((Mode == 'level' and v[i, c] >= Level) or (Mode == 'rising' and prev < Level <= v[i, c]) or
+               (Mode == 'falling' and prev > Level >= v[i, c]) or (Mode == 'rate' and abs(v[i, c] - prev) * RATE >= Level)):
+                Fires.append(i)
+                break
+    Keep = np.zeros(len(v), dtype = bool)
+    Events = 0
+    End = 0
+    for f in Fires:
+        if(f >= End):
+            Events += 1
+        End = max(End, f + POST)
+        Keep[max(f - PRE, 0):f + POST] = True
+    return np.flatnonzero(Keep), Events
+
+#Triggers on the samples in batches of the given sizes, the rest in one batch
+def Batches(Trigger, y, Sizes):
+    x = np.arange(len(y))
+    Kept = []
+    i = 0
+    for n in list(Sizes) + [len(y)]:
+        Kept.append(Trigger.Process(y[i:i + n], x[i:i + n], y[i:i + n])[0])
+        i += n
+    return np.concatenate(Kept)
+
+#Capture file of a run of n samples with EVENTS spikes, only the windows saved
+def Run(fname, n, Batch):
+    y = np.random.randn(n, COLUMNS) * 0.01
+    y[np.linspace(n // 10, n - n // 10, EVENTS).astype(int), 0] = 5.0
+    Trigger = DF_DAQ_Trigger('level', 1.0, PRE, POST, Rate = RATE)
+    Writer = CaptureWriter(fname, {'Rate' : RATE, 'Units' : 'PSI'}, Record = CaptureRecord(COLUMNS))
+    x = np.arange(n)
+    Millis = np.zeros((n, COLUMNS), dtype = np.int64)
+    start = time.perf_counter()
+    for i in range(0, n, Batch):
+        Kept = Trigger.Process(y[i:i + Batch], x[i:i + Batch], x[i:i + Batch] * (10**9 // RATE), Millis[i:i + Batch], y[i:i + Batch])
+        if(len(Kept[0]) > 0):
+            Writer.Write(Sample = Kept[0], Time = Kept[1], DeviceTime = Kept[2], Value = Kept[3])
+    Seconds = time.perf_counter() - start
+    Writer.Close()
+    return Trigger, os.path.getsize(fname), Seconds / n * 1e9
+
+def Bench(app, form):
+    SelectBoards(app, form)
+    Scale = UNIT_SCALE.get(form.DataOutput.currentText(), 1.0)
+    form.DataTrigger.setText('rising %.17g pre %g post %g column 1' % (Level * Scale, PRE / RATE, POST / RATE))
+    form.fileUniqueStr = os.path.join(Folder, 'GUI.xlsx')
+    RunCapture(app, form)
+    Recorded = CaptureFile(os.path.join(Folder, 'GUI.dfc'))
+    Expected, Events = Reference('rising', Level, PSI, Column = 0)
+    return Check('GUI saved %d of %d samples in %d events (%s), as the reference' % (len(Recorded), len(PSI), form.Trigger.Events, Recorded.Info['Trigger']),
+                 form.Trigger.Events == Events and np.array_equal(Recorded.Records['Sample'], Expected) and
+                 np.array_equal(Recorded.Records['Value'], Source.Records['Value'][Expected]) and len(form.yPyramid) == 0)
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if (len(sys.argv) > 1) else 10**6
+    Passed = True
+
+    print ('Against the sample by sample reference (4000 samples, %d columns)' % COLUMNS)
+    t = np.arange(4000)
+    y = np.sin(t[:, None] / 60.0 + np.arange(COLUMNS)) + np.random.randn(4000, COLUMNS) * 0.02
+    y[[700, 2500, 2510], 1] += 3.0      #Spikes for the rate trigger
+    y[1000, 1] = np.nan
+    Sizes = np.random.randint(0, 80, 60)
+    for Mode, Level, Column in [('level', 0.95, None), ('rising', 0.5, 0), ('falling', -0.5, None), ('rate', 100.0, 1)]:
+        Expected, Events = Reference(Mode, Level, y, Column)
+        Trigger = DF_DAQ_Trigger(Mode, Level, PRE, POST, Column, RATE)
+        Kept = Batches(Trigger, y, Sizes)
+        Whole = Batches(DF_DAQ_Trigger(Mode, Level, PRE, POST, Column, RATE), y, [])
+        Passed &= Check('%-30s %4d events, %5d of %d samples kept, same in %d batches' % (str(Trigger), Events, len(Expected), len(y), len(Sizes) + 1),
+                        np.array_equal(Kept, Expected) and np.array_equal(Whole, Expected) and Trigger.Events == Events and Trigger.Kept == len(Expected))
+    Trigger = ParseTrigger('rising 2.5, pre 0.1, post 0.2, column 2', RATE, Scale = 2.5)
+    Passed &= Check('text form "%s"' % str(Trigger), Trigger.Level == 1.0 and Trigger.Pre == PRE and Trigger.Post == POST and Trigger.Column == 1 and
+                    ParseTrigger(' none ', RATE) == None)
+    for Text in ['sideways 1', 'rising', 'rising 1 after 2', 'rising 1 post 0', 'rising 1 column 0', 'rising 1 column 3', 'rising 1 column 1.5']:
+        try:
+            ParseTrigger(Text, RATE, Columns = COLUMNS)
+            Passed &= Check('"%s" refused' % Text, False)
+        except ValueError:
+            pass
+
+    print ('Capture file size (%d events, %d samples before and %d after each)' % (EVENTS, PRE, POST))
+    Folder = tempfile.mkdtemp()
+    Sizes = {}
+    for Samples in [n // 10, n]:
+        Trigger, Sizes[Samples], Cost = Run(os.path.join(Folder, 'Run.dfc'), Samples, RATE // 25)
+        Passed &= Check('%8d samples: %d events, %d kept, %d bytes, %.0f nSec per sample' % (Samples, Trigger.Events, Trigger.Kept, Sizes[Samples], Cost),
+                        Trigger.Events == EVENTS and Trigger.Kept == EVENTS * (PRE + POST) and Cost < COST_BUDGET)
+    Passed &= Check('10 times the run, %.3fx the file' % (Sizes[n] / Sizes[n // 10]), Sizes[n] < GROWTH * Sizes[n // 10])
+
+    print ('GUI (DF-DAQ.py --replay, as fast as possible)')
+    Source_fname = os.path.join(Folder, 'Source.dfc')
+    MakeCapture(Source_fname, 10.0)
+    Source = CaptureFile(Source_fname)
+    PSI = Source.Values('PSI')
+    Level = float(np.mean(PSI[:, 0]))
+    Passed &= RunGUI(Bench, ['--replay', Source_fname, '--speed', '0'])
+    sys.exit(0 if Passed else 1)
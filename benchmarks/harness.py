@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""
+harness - What the benchmarks share: the PASS/FAIL line, the GUI run that
+starts DF-DAQ.py offscreen and hands the window to a benchmark in place of the
+Qt event loop, and the board selection and test run of the GUI benchmarks.
+Not a benchmark itself (run_benchmarks only runs bench_*.py).
+
+    from harness import ROOT, Check, RunCapture, RunGUI, SelectBoards
+
+    def Bench(app, form):
+        SelectBoards(app, form)
+        RunCapture(app, form)
+        return Check('GUI ...', form.Start == False)
+
+    Passed &= RunGUI(Bench, ['--replay', fname, '--speed', '0'])
+
+@author: DroidForge Engineering
+"""
+
+import os
+import runpy
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+#==============================================================================
+# Input Parameters: Name (Str), Passed (Bool)
+# Output Returns: Passed (Bool)
+#
+# Description: Prints the result line, to the real stdout as the GUI runs with
+# its own messages hidden
+#==============================================================================
+def Check(Name, Passed):
+    print ('  ' + ('PASS' if Passed else 'FAIL') + ' - ' + Name, file = sys.__stdout__)
+    return Passed
+
+#==============================================================================
+# Input Parameters: app (QApplication), Seconds (Float)
+# Output Returns: none
+#
+# Description: Runs the Qt events (timers, redraws) for the given time
+#==============================================================================
+def Spin(app, Seconds):
+    end = time.perf_counter() + Seconds
+    while(time.perf_counter() < end):
+        app.processEvents()
+        time.sleep(0.005)
+
+#==============================================================================
+# Input Parameters: app (QApplication), form (DF-DAQ window)
+# Output Returns: none
+#
+# Description: Waits out the board search that follows the window and selects
+# every board (the last COM entry)
+#==============================================================================
+def SelectBoards(app, form):
+    Spin(app, 0.5)
+    form.COMDis.setCurrentIndex(form.COMDis.count() - 1)   #All boards
+    Spin(app, 0.2)
+
+#==============================================================================
+# Input Parameters: app (QApplication), form (DF-DAQ window), Seconds (Float,
+#                   None to wait for the test to stop itself)
+# Output Returns: Seconds (Float), how long the test ran
+#
+# Description: Starts a test with the settings already in the window and stops
+# it after Seconds. Without Seconds (replays) waits for it to stop itself, at
+# most a minute.
+#==============================================================================
+def RunCapture(app, form, Seconds = None):
+    start = time.perf_counter()
+    form.ToggleStartStop()
+    if(Seconds != None):
+        Spin(app, Seconds)
+        form.ToggleStartStop()
+    while(form.Start and time.perf_counter() - start < 60):
+        Spin(app, 0.05)
+    return time.perf_counter() - start
+
+#==============================================================================
+# Input Parameters: Bench (Function, Bench(app, form) -> Bool), Args (List of
+#                   Str, DF-DAQ.py command line)
+# Output Returns: Passed (Bool), what Bench returned
+#
+# Description: Runs DF-DAQ.py offscreen with Bench in place of the event loop,
+# the overwrite questions answered Yes and the app's own messages hidden
+#==============================================================================
+def RunGUI(Bench, Args = []):
+    from PyQt5.QtWidgets import QApplication, QMessageBox
+    Results = []
+    def Loop(app):
+        form = [widget for widget in app.topLevelWidgets() if hasattr(widget, 'update_plot_data')][0]
+        Results.append(Bench(app, form))
+        return 0
+    QMessageBox.question = staticmethod(lambda *args, **kwargs: QMessageBox.Yes)
+    QApplication.exec_ = Loop
+    os.chdir(ROOT)
+    sys.argv = ['DF-DAQ.py'] + list(Args)
+    sys.stdout = open(os.devnull, 'w')     #Hide the app's own messages
+    try:
+        runpy.run_path('DF-DAQ.py', run_name = '__main__')
+    except SystemExit:
+        pass
+    return len(Results) > 0 and bool(Results[0])
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+"""
+run_benchmarks - Runs every benchmark in this folder (bench_*.py) one after
+the other and lists which passed. Needs no hardware or display: the boards are
+emulated on pseudo terminals (DF_DAQ_Emulator, POSIX only) and the GUI runs
+offscreen. Each benchmark's own output is shown as it runs, then a summary.
+
+Run from the repository root:  python benchmarks/run_benchmarks.py [Name ...]
+
+Names pick benchmarks by name (Ex: throughput gui), default all of them.
+
+@author: DroidForge Engineering
+"""
+
+import glob
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+if __name__ == '__main__':
+    Benchmarks = sorted(glob.glob(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bench_*.py')))
+    if(len(sys.argv) > 1):
+        Benchmarks = [fname for fname in Benchmarks if any([name in os.path.basename(fname) for name in sys.argv[1:]])]
+    env = dict(os.environ, QT_QPA_PLATFORM = 'offscreen')
+
+    Results = []
+    for fname in Benchmarks:
+        name = os.path.splitext(os.path.basename(fname))[0]
+        print ('==== ' + name)
+        sys.stdout.flush()
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable, fname], cwd = ROOT, env = env)
+        Results.append((name, result.returncode == 0, time.perf_counter() - start))
+
+    print ('==== Summary')
+    for name, Passed, Seconds in Results:
+        print ('  %s - %s (%.1f sec)' % ('PASS' if Passed else 'FAIL', name, Seconds))
+    sys.exit(0 if all([Passed for name, Passed, Seconds in Results]) else 1)
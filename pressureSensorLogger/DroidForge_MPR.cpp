@@ -162,6 +162,20 @@ float Adafruit_MPRLS::readPressure(enum outputUnits outUnits) {
   return psi;
 }
 
+/**************************************************************************/
+/*!
+    @brief Read the zero corrected 24 bit pressure counts (no unit conversion)
+    @returns The counts on success, 0xFFFFFF on failure
+*/
+/**************************************************************************/
+uint32_t Adafruit_MPRLS::readCounts(void) {
+  uint32_t raw_counts = readData();
+  if (raw_counts == 0xFFFFFFFF) {
+    return 0xFFFFFF;
+  }
+  return (uint32_t)((int32_t)raw_counts - offsetError) & 0xFFFFFF;
+}
+
 /**************************************************************************/
 /*!
     @brief Zero the pressure
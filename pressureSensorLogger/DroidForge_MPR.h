@@ -81,6 +81,7 @@ public:
 
   uint8_t readStatus(void);
   float readPressure(enum outputUnits outUnits = HPA);
+  uint32_t readCounts(void);
   void autoZero(uint32_t dataPeriod);
 
 private:
@@ -13,15 +13,18 @@
 
 #define DEBUG false
 #define RESPOND true
-#define VERSION_NUMBER "0.0.1"
+#define VERSION_NUMBER "0.0.4"
 #define DEVICE_INFO "DF_pressureSensorLogger"
 #define DEVICE_TYPE "MPRSS0001PG00001C"
+#define NUM_CHANNELS 1 //sensors read every sample, must match [numChannels] in DEVICE_SETUP
 #define DEVICE_SETUP "P-PSI-1-50-10"
 #define HELP_STRING DEVICE_INFO " v" VERSION_NUMBER "\nCommand Interface:\n"\
                     "All commands are single characters. Line ending is ignored\n"\
-                    "'s' -> start\n"\
+                    "While streaming only 's', 'b', 'p', 'h', 'z', 'o' and 'u' work, replies are then '#'[command][reply] (Ex: #o10)\n"\
+                    "'s' -> start (streams [value],[millis] lines, one [value], per channel)\n"\
+                    "'b' -> start binary stream (raw counts in frames, see FRAME_*)\n"\
                     "'p' -> stop\n"\
-                    "'r' -> single read\n"\
+                    "'r' -> single read (one [value] per channel, comma separated)\n"\
                     "'h' or '?' -> this help page\n"\
                     "'i' -> DEVICE_INFO (" DEVICE_INFO ")\n"\
                     "'v' -> VERSION_NUMBER (" VERSION_NUMBER ")\n"\
@@ -50,12 +53,28 @@ Adafruit_MPRLS mpr = Adafruit_MPRLS(RESET_PIN, EOC_PIN, PSI_MIN, PSI_MAX, TRANSF
 
 #define DEFAULT_SAMPLE_PERIOD 500
 
+// Binary stream frame, all fields little endian:
+//  [0xA5][0x5A][seq:2][millis:4][channels:1][samples:1][counts:3 x samples x channels][checksum:1]
+// millis is the device time of the first sample, checksum is the 8 bit sum of
+// every byte after the sync bytes. A count of 0xFFFFFF marks a failed read.
+#define FRAME_SYNC_0 0xA5
+#define FRAME_SYNC_1 0x5A
+#define FRAME_CHANNELS NUM_CHANNELS
+#define FRAME_SAMPLES 8
+#define FRAME_HEADER 10
+#define FRAME_SIZE (FRAME_HEADER + 3 * FRAME_SAMPLES * FRAME_CHANNELS + 1)
+
 bool running = false;
 unsigned long start_time;
 enum outputUnits currentUnits = PSI;
 String unitStrings[NUM_UNITS];
 uint16_t sample_period = DEFAULT_SAMPLE_PERIOD;
 
+bool binaryMode = false;
+uint8_t frame[FRAME_SIZE];
+uint8_t frameSamples = 0;
+uint16_t frameSeq = 0;
+
 uint32_t singleReadSamplePeriod = 0;
 uint32_t timeSinceLastSingleRead = 0;
 uint32_t lastSingleReadTime = 0;
@@ -90,18 +109,77 @@ void setup() {
   start_time = millis();
 }
 
+// reads one channel, this board has a single sensor on channel 0
+uint32_t readChannelCounts(int channel){
+  return mpr.readCounts();
+}
+
+float readChannelPressure(int channel){
+  return mpr.readPressure(currentUnits);
+}
+
+// prints one value per channel, comma separated, without a line ending
+void printChannels(){
+  for(int c = 0; c<NUM_CHANNELS; c++){
+    if(c > 0){
+      Serial.print(",");
+    }
+    Serial.print(readChannelPressure(c), 4);
+  }
+}
+
+// adds one sample (the counts of every channel) to the binary frame, sends the
+// frame once it is full
+void addFrameSample(uint32_t *counts, uint32_t sampleTime){
+  if(frameSamples == 0){
+    frame[0] = FRAME_SYNC_0;
+    frame[1] = FRAME_SYNC_1;
+    frame[2] = frameSeq & 0xFF;
+    frame[3] = frameSeq >> 8;
+    for(int i = 0; i<4; i++){
+      frame[4 + i] = (sampleTime >> (8 * i)) & 0xFF;
+    }
+    frame[8] = FRAME_CHANNELS;
+    frame[9] = FRAME_SAMPLES;
+  }
+  uint8_t *p = &frame[FRAME_HEADER + 3 * FRAME_CHANNELS * frameSamples];
+  for(int c = 0; c<FRAME_CHANNELS; c++){
+    p[3 * c] = counts[c] & 0xFF;
+    p[3 * c + 1] = (counts[c] >> 8) & 0xFF;
+    p[3 * c + 2] = (counts[c] >> 16) & 0xFF;
+  }
+  frameSamples++;
+
+  if(frameSamples == FRAME_SAMPLES){
+    uint8_t checksum = 0;
+    for(int i = 2; i<FRAME_SIZE-1; i++){
+      checksum += frame[i];
+    }
+    frame[FRAME_SIZE-1] = checksum;
+    Serial.write(frame, FRAME_SIZE);
+    frameSamples = 0;
+    frameSeq++;
+  }
+}
+
 void loop() {
   if(millis()-start_time > sample_period){
     start_time = millis();
-    if(running){
+    if(running && binaryMode){
+      uint32_t counts[FRAME_CHANNELS];
+      for(int c = 0; c<FRAME_CHANNELS; c++){
+        counts[c] = readChannelCounts(c);
+      }
+      addFrameSample(counts, start_time);
+    }
+    else if(running){
       // put your main code here, to run repeatedly:
-      float pressure_psi = mpr.readPressure(currentUnits);
       if(DEBUG){
-        Serial.println("Pressure: " + String(pressure_psi, 5));
+        Serial.println("Pressure: " + String(readChannelPressure(0), 5));
       }else{
-        Serial.print(pressure_psi, 4);
+        printChannels();
         Serial.print(",");
-        Serial.println((char)13);
+        Serial.println(start_time); //device time of the sample (ms) so the host can find gaps
       }
     }
   }
@@ -111,9 +189,17 @@ void loop() {
     command = Serial.read();
     if(command == 's'){ //start data streaming
       running = true;
+      binaryMode = false;
+    }
+    else if(command == 'b'){ //start binary data streaming
+      running = true;
+      binaryMode = true;
+      frameSamples = 0;
+      frameSeq = 0;
     }
     else if(command == 'p'){ //stop data streaming
       running = false;
+      binaryMode = false;
     }
     else if(command == 'z'){
       if(singleReadSamplePeriod > 61000 || singleReadSamplePeriod == 0){
@@ -121,6 +207,42 @@ void loop() {
       }else{
         mpr.autoZero(singleReadSamplePeriod);
       }
+      if(running){
+        Serial.println("#z"); //acknowledge so the host knows when the zero is done
+      }
+    }
+    else if(command == 'o'){ //sample period, works while streaming
+      if(Serial.available()>1){
+        String command_data;
+        while(Serial.available()>0){
+          int inChar = Serial.read();
+          if(isDigit(inChar)){
+            command_data += (char)inChar;
+          }
+          if(inChar == '\n'){
+            uint16_t command_int = command_data.toInt();
+            if(command_int > 0 && command_int < 60000){
+              sample_period = command_int;
+            }
+          }
+        }
+      }
+      if(running){
+        Serial.print("#o"); //tag the reply so the host can tell it from the stream
+      }
+      Serial.println(sample_period);
+    }
+    else if(command == 'u'){ //units, works while streaming
+      if(Serial.available()){
+        char command_data = Serial.read()-'0';
+        if(command_data >= 0 && command_data < NUM_UNITS){
+          currentUnits = (enum outputUnits)command_data;
+        }
+      }
+      if(running){
+        Serial.print("#u");
+      }
+      Serial.println(unitStrings[currentUnits]);
     }
     else if(command == 'h' || command == '?'){
       running = false;
@@ -140,8 +262,8 @@ void loop() {
         Serial.println(DEVICE_TYPE);
       }
       else if(command == 'r'){
-        float pressure_psi = mpr.readPressure(currentUnits);
-        Serial.println(pressure_psi, 4);
+        printChannels();
+        Serial.println();
         if(lastSingleReadTime != 0){
           //calculate time since last single read
           timeSinceLastSingleRead = millis()-lastSingleReadTime;
@@ -159,33 +281,6 @@ void loop() {
         }
         lastSingleReadTime = millis();
       }
-      else if(command == 'o'){
-        if(Serial.available()>1){
-          String command_data;
-          while(Serial.available()>0){
-            int inChar = Serial.read();
-            if(isDigit(inChar)){
-              command_data += (char)inChar;
-            }
-            if(inChar == '\n'){
-              uint16_t command_int = command_data.toInt();
-              if(command_int > 0 && command_int < 60000){
-                sample_period = command_int;
-              }
-            }
-          }
-        }
-        Serial.println(sample_period);
-      }
-      else if(command == 'u'){
-        if(Serial.available()){
-          char command_data = Serial.read()-'0';
-          if(command_data >= 0 && command_data < NUM_UNITS){
-            currentUnits = (enum outputUnits)command_data;
-          }
-        }
-        Serial.println(unitStrings[currentUnits]);
-      }
     }
   }
 }